@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tweet generation throughput of src/agent.py against bench/fake_ollama.py,
+for different replica counts. Each fake daemon serves one chat at a time
+(OLLAMA_NUM_PARALLEL=1) with a fixed latency, so wall time should fall
+roughly linearly with the number of replicas.
+
+    python bench/agent_pipeline.py --replicas 1,2,4 --tweets 200 --delay 0.05
+
+Also times the old loop (one blocking request per tweet) for reference.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / "src"))
+import agent
+from prompts import Character, PromptBuilder
+from replicas import OllamaPool
+
+FAKE_SERVE_CMD = [sys.executable, str(Path(__file__).resolve().parent / "fake_ollama.py")]
+
+def sequential(pool, prompts, n):
+    # The old main(): block on each tweet in turn
+    start = time.perf_counter()
+    for _ in range(n):
+        pool.submit(agent.messages_for(prompts.build()), options=agent.OPTIONS).strip()[:280]
+    return n / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replicas", default="1,2,4", help="comma separated replica counts")
+    parser.add_argument("--tweets", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=0.05, help="fake generation latency (s)")
+    parser.add_argument("--base-port", type=int, default=12200)
+    args = parser.parse_args()
+
+    models_dir = tempfile.mkdtemp(prefix="fake_ollama_models_")
+    open(os.path.join(models_dir, "fake-" + agent.MODEL_NAME.replace(":", "_")), "w").close()
+    os.environ["FAKE_OLLAMA_CHAT_DELAY"] = str(args.delay)
+    os.environ["OLLAMA_NUM_PARALLEL"] = "1"
+    prompts = PromptBuilder(agent.PROMPT, Character(ROOT / agent.CHARACTER_JSON_PATH), seed=0)
+
+    print(f"{args.tweets} tweets, {args.delay * 1000:.0f}ms per generation, 1 chat at a time per replica")
+    print(f"{'replicas':>8} {'window':>6} {'tweets/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'wall s':>7}")
+    for n in [int(r) for r in args.replicas.split(",")]:
+        pool = OllamaPool(agent.MODEL_NAME, replicas=n, base_port=args.base_port, models_dir=models_dir,
+                          serve_cmd=FAKE_SERVE_CMD, startup_timeout=30, wait_for=n)
+        try:
+            if n == 1:
+                print(f"{'old loop':>8} {1:>6} {sequential(pool, prompts, min(args.tweets, 50)):>9.1f}")
+            window = 2 * n
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                latencies, errors = asyncio.run(agent.run(pool, prompts, args.tweets, window, store=False))
+            wall = time.perf_counter() - start
+            assert not errors and len(latencies) == args.tweets
+            print(f"{n:>8} {window:>6} {args.tweets / wall:>9.1f} {agent.percentile(latencies, 50) * 1000:>8.0f} "
+                  f"{agent.percentile(latencies, 95) * 1000:>8.0f} {wall:>7.2f}")
+        finally:
+            pool.close()
+        args.base_port += n
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+OllamaPool request throughput against bench/fake_ollama.py at 1/4/16/64
+concurrent prompts:
+
+    legacy       requests.post per call (new TCP connection each time) and a
+                 fresh ThreadPoolExecutor per batch, like the old pool.map
+    pool.map     blocking wrapper over the asyncio client
+    pool.amap    asyncio client, keep-alive connections per replica
+
+plus time-to-first-token for astream vs a whole-reply submit.
+
+    python bench/async_client.py --replicas 4 --prompts 512
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / "src"))
+from replicas import OllamaPool
+
+FAKE_SERVE_CMD = [sys.executable, str(Path(__file__).resolve().parent / "fake_ollama.py")]
+
+def legacy_map(pool, prompts, concurrency):
+    # The pre-asyncio data path: round-robin, no Session, executor per call
+    def chat(i_messages):
+        i, messages = i_messages
+        replica = pool.replicas[i % len(pool.replicas)]
+        payload = {"model": pool.model, "messages": messages, "stream": False, "keep_alive": "24h"}
+        r = requests.post(f"{replica.base}/api/chat", json=payload, timeout=600)
+        r.raise_for_status()
+        return r.json()["message"]["content"]
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        return list(ex.map(chat, enumerate(prompts)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replicas", type=int, default=4)
+    parser.add_argument("--prompts", type=int, default=512)
+    parser.add_argument("--levels", default="1,4,16,64")
+    parser.add_argument("--delay", type=float, default=0.005, help="fake chat latency (s)")
+    parser.add_argument("--base-port", type=int, default=11900)
+    args = parser.parse_args()
+
+    models_dir = tempfile.mkdtemp(prefix="fake_ollama_models_")
+    open(os.path.join(models_dir, "fake-fake-model"), "w").close()
+    os.environ["FAKE_OLLAMA_CHAT_DELAY"] = str(args.delay)
+    levels = [int(n) for n in args.levels.split(",")]
+    pool = OllamaPool("fake-model", replicas=args.replicas, base_port=args.base_port, models_dir=models_dir,
+                      serve_cmd=FAKE_SERVE_CMD, startup_timeout=30, wait_for=args.replicas,
+                      connections_per_replica=max(levels))
+    prompts = [[{"role": "user", "content": f"prompt {i}"}] for i in range(args.prompts)]
+
+    def measure(fn):
+        start = time.perf_counter()
+        results = fn()
+        assert len(results) == len(prompts)
+        return len(prompts) / (time.perf_counter() - start)
+
+    print(f"{args.prompts} prompts, {args.replicas} replicas, {args.delay * 1000:.0f}ms fake latency (prompts/s)")
+    print(f"{'concurrency':>11} {'legacy':>9} {'pool.map':>9} {'pool.amap':>9}")
+    for n in levels:
+        legacy = measure(lambda: legacy_map(pool, prompts, n))
+        sync = measure(lambda: pool.map(prompts, max_workers=n))
+        amap = measure(lambda: asyncio.run(pool.amap(prompts, concurrency=n)))
+        print(f"{n:>11} {legacy:>9.0f} {sync:>9.0f} {amap:>9.0f}")
+
+    pool.close()
+
+    # Streaming: a fake that takes 20ms per generated word
+    os.environ["FAKE_OLLAMA_TOKEN_DELAY"] = "0.02"
+    pool = OllamaPool("fake-model", replicas=1, base_port=args.base_port + args.replicas, models_dir=models_dir,
+                      serve_cmd=FAKE_SERVE_CMD, startup_timeout=30)
+    long_prompt = [{"role": "user", "content": " ".join(["mot"] * 30)}]
+
+    async def first_token():
+        start = time.perf_counter()
+        async for _ in pool.astream(long_prompt):
+            return time.perf_counter() - start
+    ttft = asyncio.run(first_token())
+    start = time.perf_counter()
+    pool.submit(long_prompt)
+    whole = time.perf_counter() - start
+    print(f"\nfirst token via astream {ttft * 1000:.0f}ms, whole reply via submit {whole * 1000:.0f}ms")
+    pool.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+The trainer -> generator checkpoint handoff in src/tune/checkpoints.py,
+with the model work replaced by sleeps and dummy files:
+
+    python bench/checkpoint_handoff.py --train-seconds 2 --generate-seconds 0.5 --mb 50
+
+A trainer process "trains" for --train-seconds, then publishes a checkpoint
+of --mb MB of random bytes plus its checksum. The generator loop, in this
+process, takes the shared lock each round, reads the newest checkpoint in
+full and checks it, then "generates" for --generate-seconds.
+
+Reports rounds per minute against the old single-process loop (one train
+plus one generate per round), how long after publishing each checkpoint
+was picked up, lock hold and wait times on both sides, and any torn or
+missing reads (there should be none).
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fixtures import percentile
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+from src.tune.checkpoints import checkpoint_lock, latest_checkpoint, publish
+
+def trainer(checkpoint_dir, args, stop, publish_ms):
+    parent = None
+    while not stop.is_set():
+        time.sleep(args.train_seconds)
+        def write(tmp):
+            data = os.urandom(args.mb << 20)
+            with open(os.path.join(tmp, "adapter_model.safetensors"), "wb") as f:
+                f.write(data)
+            with open(os.path.join(tmp, "trainer.json"), "w") as f:
+                json.dump({"sha256": hashlib.sha256(data).hexdigest(), "published": time.time()}, f)
+        start = time.perf_counter()
+        parent = publish(checkpoint_dir, write, parent, keep=args.keep)
+        publish_ms.append((time.perf_counter() - start) * 1000)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--train-seconds", type=float, default=2.0)
+    parser.add_argument("--generate-seconds", type=float, default=0.5)
+    parser.add_argument("--mb", type=int, default=50, help="checkpoint size")
+    parser.add_argument("--keep", type=int, default=3)
+    parser.add_argument("--duration", type=float, default=30.0)
+    args = parser.parse_args()
+
+    checkpoint_dir = tempfile.mkdtemp(prefix="handoff_")
+    manager = mp.Manager()
+    stop, publish_ms = manager.Event(), manager.list()
+    proc = mp.Process(target=trainer, args=(checkpoint_dir, args, stop, publish_ms))
+    proc.start()
+
+    rounds, torn, wait_ms, hold_ms, lag_ms = 0, 0, [], [], []
+    serving = None
+    end = time.monotonic() + args.duration
+    while time.monotonic() < end:
+        start = time.perf_counter()
+        with checkpoint_lock(checkpoint_dir, shared=True):
+            locked = time.perf_counter()
+            latest = latest_checkpoint(checkpoint_dir)
+            if latest and latest != serving:
+                serving = latest
+                try:
+                    with open(os.path.join(serving, "trainer.json")) as f:
+                        meta = json.load(f)
+                    with open(os.path.join(serving, "adapter_model.safetensors"), "rb") as f:
+                        ok = hashlib.sha256(f.read()).hexdigest() == meta["sha256"]
+                    lag_ms.append((time.time() - meta["published"]) * 1000)
+                except (OSError, ValueError, KeyError):
+                    ok = False
+                torn += not ok
+            hold_ms.append((time.perf_counter() - locked) * 1000)
+        wait_ms.append((locked - start) * 1000)
+        time.sleep(args.generate_seconds)
+        rounds += 1
+
+    stop.set()
+    proc.join()
+    minutes = args.duration / 60
+    serial = 60 / (args.train_seconds + args.generate_seconds)
+    print(f"{args.mb} MB checkpoints, train {args.train_seconds}s, generate {args.generate_seconds}s, "
+          f"{args.duration:.0f}s run")
+    print(f"generator rounds/min: decoupled {rounds / minutes:.1f}, single process {serial:.1f}")
+    print(f"checkpoints published {len(publish_ms)}, picked up {len(lag_ms)}, torn or missing reads {torn}")
+    for label, samples in [("trainer publish (write + rename)", list(publish_ms)),
+                           ("publish -> pickup", lag_ms),
+                           ("generator lock wait", wait_ms),
+                           ("generator lock hold", hold_ms)]:
+        if samples:
+            print(f"{label:<34} p50 {percentile(samples, 50):8.1f} ms  p99 {percentile(samples, 99):8.1f} ms")
+    if torn:
+        sys.exit("generator read a partial checkpoint")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+CPU generation with src/tune/cpu_infer.py on the 10 prompts of
+src/tune/3_infer.py, fp32 against int8 and int4 weights:
+
+    python bench/cpu_quant.py --hidden 1024 --layers 8 --new-tokens 64
+
+By default the model is a randomly initialised float32 Llama of the given
+size with a small BPE tokenizer trained on the prompts and
+data/character.json (nothing is downloaded); --model points at a real local
+model directory instead. Each mode runs in a fresh subprocess so peak RSS
+is its own.
+
+Generation is greedy and always --new-tokens long, so tokens/s compares
+like with like. Output drift against fp32 is measured teacher-forced on
+the fp32 outputs: mean KL(fp32 || quantized) of the next-token
+distributions and how often the top-1 token agrees, plus how many of the
+greedy outputs came out identical.
+"""
+
+import argparse
+import ast
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fixtures import random_llama
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+MODES = ["fp32", "int8", "int4"]
+
+def infer_prompts():
+    # The prompts list of 3_infer.py, read without running the script (it loads a model on import)
+    tree = ast.parse((ROOT / "src" / "tune" / "3_infer.py").read_text())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(t, "id", None) == "prompts" for t in node.targets):
+            return ast.literal_eval(node.value)
+    raise ValueError("no prompts list in src/tune/3_infer.py")
+
+def run_one(mode, source, work, new_tokens, threads):
+    # In the subprocess: load `mode`, generate for every prompt, compare with the fp32 reference
+    import torch
+    from src.tune.cpu_infer import chat_generate, chat_inputs, load_cpu_model, model_bytes
+    from src.tune.loader import peak_rss_mb
+    prompts = infer_prompts()
+    model, tok = load_cpu_model(source, mode, threads, cache_dir=str(Path(work) / "cache"))
+    greedy = dict(do_sample=False, max_new_tokens=new_tokens, min_new_tokens=new_tokens)
+    chat_generate(model, tok, prompts[0], **dict(greedy, max_new_tokens=4, min_new_tokens=4))  # warm-up
+
+    outputs, tokens, elapsed = [], 0, 0.0
+    for p in prompts:
+        start = time.perf_counter()
+        _, new = chat_generate(model, tok, p, **greedy)
+        elapsed += time.perf_counter() - start
+        tokens += len(new)
+        outputs.append(new.tolist())
+
+    # Teacher-forced next-token log-probs over the fp32 outputs
+    ref_path = Path(work) / "fp32.pt"
+    reference = outputs if mode == "fp32" else torch.load(ref_path)["outputs"]
+    logprobs = []
+    with torch.inference_mode():
+        for p, ref in zip(prompts, reference):
+            ids = chat_inputs(tok, p)["input_ids"]
+            seq = torch.cat([ids, torch.tensor([ref])], 1)
+            logits = model(seq).logits[0, ids.shape[1] - 1:-1].float()
+            logprobs.append(torch.log_softmax(logits, -1))
+
+    result = {"tokens_per_s": tokens / elapsed, "model_mb": model_bytes(model) / 1e6, "rss_peak": peak_rss_mb()}
+    if mode == "fp32":
+        torch.save({"outputs": outputs, "logprobs": logprobs}, ref_path)
+    else:
+        ref = torch.load(ref_path)["logprobs"]
+        kl = [torch.sum(r.exp() * (r - q), -1).mean().item() for r, q in zip(ref, logprobs)]
+        agree = [(r.argmax(-1) == q.argmax(-1)).float().mean().item() for r, q in zip(ref, logprobs)]
+        result.update(kl=sum(kl) / len(kl), top1=sum(agree) / len(agree),
+                      identical=sum(o == r for o, r in zip(outputs, reference)))
+    print(json.dumps(result))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="local model directory (default: a random Llama)")
+    parser.add_argument("--hidden", type=int, default=1024)
+    parser.add_argument("--layers", type=int, default=8)
+    parser.add_argument("--new-tokens", type=int, default=64)
+    parser.add_argument("--threads", type=int, help="default: physical cores")
+    parser.add_argument("--run", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        mode, source, work = args.run
+        return run_one(mode, source, work, args.new_tokens, args.threads)
+
+    try:
+        import torch
+        import transformers
+    except ImportError:
+        sys.exit("torch and transformers are needed: pip install torch transformers")
+
+    prompts = infer_prompts()
+    work = Path(tempfile.mkdtemp(prefix="cpu_quant_"))
+    source = args.model
+    if source is None:
+        source = str(work / "source")
+        random_llama(source, prompts + [(ROOT / "data" / "character.json").read_text()], args.hidden, args.layers)
+    print(f"{source}: {len(prompts)} prompts from 3_infer.py, {args.new_tokens} greedy tokens each\n")
+
+    print(f"{'weights':<8} {'tokens/s':>9} {'weights MB':>11} {'peak RSS':>10} {'KL vs fp32':>11} "
+          f"{'top-1 agree':>12} {'identical':>10}")
+    for mode in MODES:
+        cmd = [sys.executable, __file__, "--new-tokens", str(args.new_tokens), "--run", mode, source, str(work)]
+        if args.threads:
+            cmd[2:2] = ["--threads", str(args.threads)]
+        out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        drift = (f"{r['kl']:>11.4f} {r['top1']:>11.1%} {r['identical']:>6}/{len(prompts)}"
+                 if mode != "fp32" else f"{'-':>11} {'-':>12} {'-':>10}")
+        print(f"{mode:<8} {r['tokens_per_s']:>9.1f} {r['model_mb']:>11.0f} {r['rss_peak']:>7.0f} MB {drift}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: per-request database overhead of the pooled, request-scoped
+connection versus the old open-a-connection-per-call behaviour.
+
+    python bench/db_pool.py --requests 2000
+"""
+
+import argparse
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from fixtures import load_app, populate, login, percentile, AGENT_USERNAME
+
+def legacy_connection_factory(app):
+    """The pre-pool get_db_connection(): fresh connection + PRAGMAs per call"""
+    def get_db_connection():
+        conn = sqlite3.connect(app.DB_PATH, timeout=app.app.config['DATABASE_TIMEOUT'])
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA cache_size=10000')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+    return get_db_connection
+
+def time_calls(fn, n):
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+def report(label, samples):
+    mean = sum(samples) / len(samples)
+    print(f"{label:<34} mean {mean:9.1f}us  p50 {percentile(samples, 50):9.1f}us  p99 {percentile(samples, 99):9.1f}us")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--engagements", type=int, default=20000)
+    args = parser.parse_args()
+
+    db_path = Path(tempfile.mkdtemp(prefix="clanker_bench_")) / "tweets.db"
+    app = load_app(db_path)
+    populate(app, posts=args.posts, engagements=args.engagements)
+
+    pooled = app.get_db_connection
+    legacy = legacy_connection_factory(app)
+
+    def checkout(get_conn):
+        def run():
+            conn = get_conn()
+            conn.execute('SELECT 1').fetchone()
+            conn.close()
+        return run
+
+    print(f"Connection checkout + SELECT 1 ({args.requests} iterations)")
+    report("  before: connect + 4 PRAGMAs", time_calls(checkout(legacy), args.requests))
+    report("  after:  pooled", time_calls(checkout(pooled), args.requests))
+
+    client = login(app.app.test_client(), AGENT_USERNAME)
+    print(f"\nGET / as a logged-in user ({args.requests} requests)")
+    for label, get_conn in (("  before: connect + 4 PRAGMAs", legacy), ("  after:  pooled", pooled)):
+        app.get_db_connection = get_conn
+        client.get('/')  # warm up templates and the statement cache
+        report(label, time_calls(lambda: client.get('/'), args.requests))
+    app.get_db_connection = pooled
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: N likes as N POST /api/engagements/ calls versus one
+POST /api/engagements/batch call.
+
+    python bench/engagements_batch.py --count 500
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from fixtures import load_app, populate, login
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=500)
+    parser.add_argument("--posts", type=int, default=5000)
+    args = parser.parse_args()
+
+    db_path = Path(tempfile.mkdtemp(prefix="clanker_bench_")) / "tweets.db"
+    app = load_app(db_path)
+    populate(app, posts=args.posts, engagements=0)
+    app.app.config['ENGAGEMENT_BATCH_MAX'] = max(args.count, app.app.config['ENGAGEMENT_BATCH_MAX'])
+
+    client = app.app.test_client()
+    client.post('/api/users/', json={'username': 'bench', 'password': 'password'})
+    login(client, 'bench')
+
+    start = time.perf_counter()
+    for post_id in range(1, args.count + 1):
+        assert client.post('/api/engagements/', json={'post_id': post_id, 'type': 'like'}).status_code == 201
+    single = time.perf_counter() - start
+
+    batch = [{'post_id': post_id, 'type': 'like'} for post_id in range(args.count + 1, 2 * args.count + 1)]
+    start = time.perf_counter()
+    response = client.post('/api/engagements/batch', json=batch)
+    batched = time.perf_counter() - start
+    assert response.get_json()['created'] == args.count
+
+    print(f"{args.count} likes")
+    print(f"  one request each: {single * 1000:8.1f}ms  ({args.count / single:8.0f} engagements/s)")
+    print(f"  one batch:        {batched * 1000:8.1f}ms  ({args.count / batched:8.0f} engagements/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Stand-in for `ollama serve`, for exercising src/replicas.py without a GPU or
+model downloads:
+
+    OllamaPool(model, serve_cmd=[sys.executable, "bench/fake_ollama.py"])
+
+Reads OLLAMA_HOST (host:port), OLLAMA_MODELS and OLLAMA_NUM_PARALLEL (chats
+served at once; unlimited if unset) like the real daemon and implements the endpoints the pool uses: /api/version, /api/tags, /api/pull,
+/api/generate and /api/chat. A pull writes a marker file into the models
+directory and appends to fake-pulls.log there, so callers can check how many
+times a model was downloaded. Timings are set with environment variables
+(seconds):
+
+    FAKE_OLLAMA_STARTUP_DELAY   before the port is bound
+    FAKE_OLLAMA_PULL_DELAY      per /api/pull
+    FAKE_OLLAMA_LOAD_DELAY      first /api/generate or /api/chat (model load)
+    FAKE_OLLAMA_CHAT_DELAY      per /api/chat
+    FAKE_OLLAMA_TOKEN_DELAY     per generated word (streamed or not)
+    FAKE_OLLAMA_PORT_DELAYS     extra per-chat delay on some ports, e.g. "11601=0.5,11602=0.1"
+
+FAKE_OLLAMA_FAIL_PORTS (e.g. "11603") makes /api/chat return 500 on those
+ports, for exercising failover and circuit breaking.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def delay(name):
+    return float(os.environ.get(name, 0))
+
+MODELS_DIR = os.environ.get("OLLAMA_MODELS", ".")
+LOAD_LOCK = threading.Lock()
+LOADED = set()
+PARALLEL = int(os.environ.get("OLLAMA_NUM_PARALLEL") or 0)
+SLOTS = threading.BoundedSemaphore(PARALLEL) if PARALLEL > 0 else None
+
+def port_delay(port):
+    for item in os.environ.get("FAKE_OLLAMA_PORT_DELAYS", "").split(","):
+        name, _, seconds = item.partition("=")
+        if name.strip() == str(port):
+            return float(seconds)
+    return 0.0
+
+def failing(port):
+    return str(port) in os.environ.get("FAKE_OLLAMA_FAIL_PORTS", "").split(",")
+
+def marker(model):
+    return os.path.join(MODELS_DIR, "fake-" + re.sub(r"[^\w.-]", "_", model))
+
+def installed(model):
+    return os.path.exists(marker(model))
+
+def load(model):
+    with LOAD_LOCK:
+        if model not in LOADED:
+            time.sleep(delay("FAKE_OLLAMA_LOAD_DELAY"))
+            LOADED.add(model)
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # Headers and body go out as separate writes
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def stream_reply(self, model, reply):
+        # NDJSON over chunked transfer encoding, one word per line, like the real daemon
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            time.sleep(delay("FAKE_OLLAMA_TOKEN_DELAY"))
+            piece = word if i == len(words) - 1 else word + " "
+            self.write_chunk({"model": model, "message": {"role": "assistant", "content": piece}, "done": False})
+        self.write_chunk({"model": model, "message": {"role": "assistant", "content": ""}, "done": True})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def write_chunk(self, body):
+        data = json.dumps(body).encode() + b"\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def chat(self, model, port, body):
+        time.sleep(delay("FAKE_OLLAMA_CHAT_DELAY") + port_delay(port))
+        prompt = body.get("messages", [{}])[-1].get("content", "")
+        reply = f"echo from :{port}: {prompt}"
+        if body.get("stream") is True:
+            self.stream_reply(model, reply)
+        else:
+            time.sleep(delay("FAKE_OLLAMA_TOKEN_DELAY") * len(reply.split(" ")))
+            self.send_json(200, {"model": model, "message": {"role": "assistant", "content": reply}, "done": True})
+
+    def do_GET(self):
+        if self.path == "/":
+            self.send_json(200, "Ollama is running")
+        elif self.path == "/api/version":
+            self.send_json(200, {"version": "0.0.0-fake"})
+        elif self.path == "/api/tags":
+            models = [name[len("fake-"):] for name in os.listdir(MODELS_DIR)
+                      if name.startswith("fake-") and not name.endswith(".log")]
+            self.send_json(200, {"models": [{"name": m, "model": m} for m in models]})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        body = self.read_json()
+        model = body.get("model") or body.get("name")
+
+        if self.path == "/api/pull":
+            time.sleep(delay("FAKE_OLLAMA_PULL_DELAY"))
+            open(marker(model), "w").close()
+            with open(os.path.join(MODELS_DIR, "fake-pulls.log"), "a") as log:
+                log.write(f"{model} {os.getpid()}\n")
+            self.send_json(200, {"status": "success"})
+        elif self.path in ("/api/generate", "/api/chat"):
+            if not installed(model):
+                self.send_json(404, {"error": f"model '{model}' not found"})
+                return
+            load(model)
+            if self.path == "/api/generate":
+                self.send_json(200, {"model": model, "response": "", "done": True})
+                return
+            port = self.server.server_port
+            if failing(port):
+                self.send_json(500, {"error": "injected failure"})
+                return
+            if SLOTS:
+                SLOTS.acquire()
+            try:
+                self.chat(model, port, body)
+            finally:
+                if SLOTS:
+                    SLOTS.release()
+        else:
+            self.send_json(404, {"error": "not found"})
+
+def main():
+    host, _, port = os.environ.get("OLLAMA_HOST", "127.0.0.1:11434").rpartition(":")
+    time.sleep(delay("FAKE_OLLAMA_STARTUP_DELAY"))
+    ThreadingHTTPServer.request_queue_size = 128  # Default listen backlog of 5 drops bursts of new connections
+    ThreadingHTTPServer((host or "127.0.0.1", int(port)), Handler).serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Shared helpers for the benchmarks: load the Clanker app against a scratch
+database and fill it with synthetic posts, users and engagements, or save a
+small random model for the src/tune benchmarks.
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+BLOG_DIR = Path(__file__).resolve().parent.parent / "blog"
+AGENT_USERNAME = "AverageFrench"
+
+def load_app(db_path):
+    """Import blog/app.py with CLANKER_DB_PATH pointed at db_path and init the schema"""
+    os.environ["CLANKER_DB_PATH"] = str(db_path)
+    if str(BLOG_DIR) not in sys.path:
+        sys.path.insert(0, str(BLOG_DIR))
+    import app
+    app.init_db()
+    return app
+
+def populate(app, posts=5000, users=50, engagements=20000, seed=0):
+    """Fill the database with synthetic data shaped like production.
+
+    The agent account owns most posts; every engagement also gets the
+    notification row the app would have created for it.
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(app.DB_PATH)
+    cur = conn.cursor()
+
+    usernames = [AGENT_USERNAME] + [f"user{i}" for i in range(users - 1)]
+    cur.executemany(
+        "INSERT OR IGNORE INTO users (username, password_hash) VALUES (?, ?)",
+        [(name, app.hash_password("password")) for name in usernames]
+    )
+    user_ids = {name: row_id for row_id, name in cur.execute("SELECT id, username FROM users")}
+
+    now = int(time.time())
+    rows = []
+    for i in range(posts):
+        author = AGENT_USERNAME if rng.random() < 0.8 else rng.choice(usernames)
+        ts = now - (posts - i) * 6
+        rows.append((f"post {i} " + "la vie " * rng.randint(1, 8), author, author.lower(), str(ts), ts))
+    cur.executemany("INSERT INTO posts (text, user, user_lc, timestamp, ts) VALUES (?, ?, ?, ?, ?)", rows)
+    post_authors = dict(cur.execute("SELECT id, user FROM posts"))
+    post_ids = list(post_authors)
+
+    seen = set()
+    engagement_rows, notif_rows = [], []
+    for i in range(engagements):
+        created_at = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(now - (engagements - i)))
+        user_id = user_ids[rng.choice(usernames)]
+        post_id = rng.choice(post_ids)
+        typ = rng.choices(["like", "reply", "clanked"], weights=[6, 3, 1])[0]
+        if (user_id, post_id, typ) in seen:
+            continue
+        seen.add((user_id, post_id, typ))
+        content = f"reply {len(seen)}" if typ == "reply" else None
+        engagement_rows.append((user_id, post_id, typ, content, created_at))
+        owner = user_ids.get(post_authors[post_id])
+        if owner and owner != user_id:
+            notif_rows.append((typ, post_id, owner, created_at))
+    cur.executemany(
+        "INSERT INTO new_engagements (user_id, post_id, type, content, created_at) VALUES (?, ?, ?, ?, ?)",
+        engagement_rows
+    )
+    cur.executemany("INSERT INTO notifs (typ, obj_id, user_id, created_at) VALUES (?, ?, ?, ?)", notif_rows)
+    conn.commit()
+
+    app.rebuild_post_stats(conn)
+    conn.close()
+    return usernames
+
+def login(client, username, password="password"):
+    """Log a Flask test client in"""
+    client.post("/login", data={"username": username, "password": password})
+    return client
+
+CHAT_TEMPLATE = ("{% for m in messages %}<|{{ m.role }}|>{{ m.content }}<|end|>{% endfor %}"
+                 "{% if add_generation_prompt %}<|assistant|>{% endif %}")
+
+def random_llama(path, corpus, hidden=1024, layers=8, vocab_size=2000):
+    """Save a randomly initialised float32 Llama with a byte-level BPE tokenizer trained on corpus (a list of str)
+
+    Nothing is downloaded; the tokenizer has pad and eos tokens and a chat template.
+    """
+    from tokenizers import Tokenizer, models, pre_tokenizers, decoders, trainers
+    from transformers import LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+    specials = ["<|pad|>", "<|end|>", "<|user|>", "<|assistant|>"]
+    bpe = Tokenizer(models.BPE())
+    bpe.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    bpe.decoder = decoders.ByteLevel()
+    bpe.train_from_iterator(corpus, trainers.BpeTrainer(vocab_size=vocab_size, special_tokens=specials,
+                                                        initial_alphabet=pre_tokenizers.ByteLevel.alphabet()))
+    tok = PreTrainedTokenizerFast(tokenizer_object=bpe, pad_token="<|pad|>", eos_token="<|end|>",
+                                  additional_special_tokens=specials[2:])
+    tok.chat_template = CHAT_TEMPLATE
+    config = LlamaConfig(vocab_size=len(tok), hidden_size=hidden, intermediate_size=hidden * 11 // 4,
+                         num_hidden_layers=layers, num_attention_heads=16, num_key_value_heads=16,
+                         pad_token_id=tok.pad_token_id, eos_token_id=tok.eos_token_id)
+    LlamaForCausalLM(config).save_pretrained(path, safe_serialization=True)
+    tok.save_pretrained(path)
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
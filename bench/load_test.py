@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Load test: run blog/wsgi.py under gunicorn with different worker counts and
+report requests/sec and latency percentiles for the feed and engagement
+endpoints.
+
+    python bench/load_test.py --workers 1,2,4 --threads 8 --concurrency 16 --duration 10
+
+Each scenario runs `concurrency` client threads, each with its own keep-alive
+connection (and its own logged-in user where a session is needed):
+
+    feed (logged out)  GET /                (served from the response cache)
+    feed (logged in)   GET /                (full query + render)
+    posts api          GET /api/posts/
+    engagements        POST /api/engagements/ like, then DELETE it
+"""
+
+import argparse
+import http.client
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+from fixtures import BLOG_DIR, load_app, populate, percentile
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(db_path, port, workers, threads):
+    env = dict(os.environ,
+               CLANKER_DB_PATH=str(db_path),
+               CLANKER_BIND=f"127.0.0.1:{port}",
+               CLANKER_WORKERS=str(workers),
+               CLANKER_THREADS=str(threads),
+               FLASK_ENV="production")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:application"],
+        cwd=BLOG_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited: {server.stderr.read().decode()[-2000:]}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/api/posts/?limit=1")
+            conn.getresponse().read()
+            conn.close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("gunicorn didn't start within 30s")
+
+def stop_server(server):
+    server.terminate()
+    try:
+        server.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+def login(port, username):
+    """Log in over HTTP and return the session cookie"""
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    body = urlencode({"username": username, "password": "password"})
+    conn.request("POST", "/login", body, {"Content-Type": "application/x-www-form-urlencoded"})
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    cookie = response.getheader("Set-Cookie", "")
+    return cookie.split(";", 1)[0]
+
+class Client:
+    """One keep-alive connection, timing every request"""
+
+    def __init__(self, port, cookie=None):
+        self.port = port
+        self.headers = {"Cookie": cookie} if cookie else {}
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        self.samples = []
+        self.errors = 0
+
+    def request(self, method, path, body=None, headers=None):
+        start = time.perf_counter()
+        try:
+            self.conn.request(method, path, body, {**self.headers, **(headers or {})})
+            response = self.conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.errors += 1
+            self.conn.close()
+            self.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+            return None, None
+        self.samples.append((time.perf_counter() - start) * 1000)
+        if response.status >= 500:
+            self.errors += 1
+        return response.status, data
+
+def feed(client, rng):
+    client.request("GET", "/")
+
+def posts_api(client, rng):
+    client.request("GET", "/api/posts/")
+
+def engagements(client, rng, post_count):
+    body = f'{{"post_id": {rng.randint(1, post_count)}, "type": "like"}}'
+    status, data = client.request("POST", "/api/engagements/", body, {"Content-Type": "application/json"})
+    if status == 201:
+        engagement_id = data.split(b'"id":', 1)[1].split(b",", 1)[0].strip()
+        client.request("DELETE", f"/api/engagements/{int(engagement_id)}")
+
+def run_scenario(port, action, cookies, concurrency, duration):
+    clients = [Client(port, cookies[i] if cookies else None) for i in range(concurrency)]
+    stop = time.monotonic() + duration
+
+    def worker(client, seed):
+        rng = random.Random(seed)
+        while time.monotonic() < stop:
+            action(client, rng)
+
+    threads = [threading.Thread(target=worker, args=(client, i)) for i, client in enumerate(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    samples = [s for client in clients for s in client.samples]
+    errors = sum(client.errors for client in clients)
+    return len(samples) / elapsed, percentile(samples, 50), percentile(samples, 99), errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="comma separated worker counts")
+    parser.add_argument("--threads", type=int, default=8, help="threads per worker")
+    parser.add_argument("--concurrency", type=int, default=16, help="client threads")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per scenario")
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--engagements", type=int, default=20000)
+    args = parser.parse_args()
+
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        sys.exit("gunicorn is not installed: pip install -r blog/requirements.txt")
+
+    db_path = Path(tempfile.mkdtemp(prefix="clanker_load_")) / "tweets.db"
+    app = load_app(db_path)
+    usernames = populate(app, posts=args.posts, users=max(50, args.concurrency + 1), engagements=args.engagements)
+    app.db_pool.close()
+
+    scenarios = [
+        ("feed (logged out)", feed, False),
+        ("feed (logged in)", feed, True),
+        ("posts api", posts_api, False),
+        ("engagements", lambda client, rng: engagements(client, rng, args.posts), True),
+    ]
+
+    print(f"{args.concurrency} clients, {args.duration:g}s per scenario, {args.threads} threads per worker")
+    print(f"{'workers':>7}  {'scenario':<18} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for workers in [int(w) for w in args.workers.split(",")]:
+        port = free_port()
+        server = start_server(db_path, port, workers, args.threads)
+        try:
+            cookies = [login(port, name) for name in usernames[1:args.concurrency + 1]]
+            for label, action, needs_session in scenarios:
+                rps, p50, p99, errors = run_scenario(
+                    port, action, cookies if needs_session else None, args.concurrency, args.duration
+                )
+                print(f"{workers:>7}  {label:<18} {rps:>9.0f} {p50:>8.2f} {p99:>8.2f} {errors:>6}")
+        finally:
+            stop_server(server)
+
+if __name__ == "__main__":
+    main()
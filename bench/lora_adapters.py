@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+src/tune/adapters.py on CPU with a tiny randomly initialised Llama: cost of
+saving a generation's adapter, loading a snapshot next to the trainable
+adapter, and switching between resident adapters, against reloading the
+whole model from disk.
+
+    python bench/lora_adapters.py --hidden 256 --layers 4 --adapters 10
+
+Also checks that a switched-in snapshot gives the same logits as a model
+freshly loaded with that adapter, and that switching back to the trainable
+adapter restores its output. Needs torch, transformers and peft; nothing
+is downloaded.
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+def dir_size(path):
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file())
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hidden", type=int, default=256)
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--rank", type=int, default=8)
+    parser.add_argument("--adapters", type=int, default=10, help="generations to train and save")
+    parser.add_argument("--threads", type=int, help="torch intra-op threads")
+    args = parser.parse_args()
+
+    try:
+        import torch
+        from transformers import LlamaConfig, LlamaForCausalLM
+        from peft import PeftModel
+    except ImportError:
+        sys.exit("torch, transformers and peft are needed: pip install torch transformers peft")
+    from src.tune.adapters import TRAINABLE, AdapterSwitcher, attach_lora
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+    config = LlamaConfig(vocab_size=2000, hidden_size=args.hidden, intermediate_size=args.hidden * 2,
+                         num_hidden_layers=args.layers, num_attention_heads=4, num_key_value_heads=4,
+                         max_position_embeddings=256)
+    work = Path(tempfile.mkdtemp(prefix="lora_"))
+    base_dir = work / "base"
+    LlamaForCausalLM(config).save_pretrained(base_dir, safe_serialization=True)
+
+    def load_base():
+        return LlamaForCausalLM.from_pretrained(base_dir).eval()
+
+    _, reload_ms = timed(load_base)
+    model = attach_lora(load_base(), r=args.rank)
+    trainable = sum(p.numel() for p in model.parameters() if p.requires_grad)
+    total = sum(p.numel() for p in model.parameters())
+    print(f"Llama {args.layers}x{args.hidden}, {total / 1e6:.1f}M parameters, "
+          f"{trainable / 1e3:.0f}k trainable (rank {args.rank}), {torch.get_num_threads()} threads")
+
+    opt = torch.optim.AdamW([p for p in model.parameters() if p.requires_grad], lr=1e-2)
+    batch = torch.randint(0, config.vocab_size, (4, 32))
+    probe = torch.randint(0, config.vocab_size, (1, 16))
+    paths, save_ms = [], []
+    for generation in range(args.adapters):
+        model.train()
+        model(batch, labels=batch).loss.backward()
+        opt.step()
+        opt.zero_grad(set_to_none=True)
+        model.eval()
+        path = work / f"gen-{generation:06d}"
+        _, ms = timed(lambda: model.save_pretrained(path, selected_adapters=[TRAINABLE]))
+        paths.append(str(path))
+        save_ms.append(ms)
+
+    with torch.inference_mode():
+        trained_logits = model(probe).logits
+        switcher = AdapterSwitcher(model, max_loaded=len(paths))
+        load_ms = [timed(lambda: switcher.use(p))[1] for p in paths]
+        swap_ms = [timed(lambda: switcher.use(p))[1] for p in paths]
+        back_ms = timed(lambda: switcher.use(None))[1]
+        restored = (model(probe).logits - trained_logits).abs().max().item()
+
+        check = paths[len(paths) // 2]
+        with switcher.using(check):
+            switched = model(probe).logits
+        fresh = PeftModel.from_pretrained(load_base(), check).eval()
+        drift = (switched - fresh(probe).logits).abs().max().item()
+
+    print(f"\nadapter on disk {dir_size(paths[0]) / 1e3:.0f} kB, base model {dir_size(base_dir) / 1e6:.1f} MB")
+    print(f"{'operation':<34} {'ms':>8}")
+    for label, ms in [("reload whole model from disk", reload_ms),
+                      ("save a generation's adapter", sum(save_ms) / len(save_ms)),
+                      ("load a snapshot + switch to it", sum(load_ms) / len(load_ms)),
+                      ("switch between resident adapters", sum(swap_ms) / len(swap_ms)),
+                      ("switch back to the trainable one", back_ms)]:
+        print(f"{label:<34} {ms:>8.2f}")
+    print(f"\nmax |logit diff| switched vs freshly loaded {drift:.2e}, trainable before vs after {restored:.2e}")
+    if drift > 1e-4 or restored > 1e-4:
+        sys.exit("adapter switching changed the model's output")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Model load time and peak RSS on CPU: from_pretrained as the tune scripts
+did it, the old 2_ft.py double load (from_pretrained, then from_config +
+load_state_dict), and src/tune/loader.py from its memory-mapped cache.
+
+    python bench/model_load.py --hidden 1024 --layers 8 --dtype float16
+
+By default the source is a randomly initialised float32 Llama of the given
+size saved to a temp dir (nothing is downloaded); --model points at a real
+local model directory instead. Each load runs in a fresh subprocess so
+peak RSS is its own, and is followed by one forward pass, since mapped
+weights are only read from disk when first used.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+MODES = ["from_pretrained", "double load (old 2_ft.py)", "loader.py mmap cache"]
+
+def run_one(mode, source, cache_dir, dtype_name):
+    # In the subprocess: load one way, then one forward pass; prints a JSON line
+    import torch
+    from transformers import AutoModelForCausalLM
+    from src.tune.loader import ensure_cache, load_dir, peak_rss_mb
+    dtype = getattr(torch, dtype_name)
+    start = time.perf_counter()
+    if mode == MODES[0]:
+        model = AutoModelForCausalLM.from_pretrained(source, torch_dtype=dtype)
+    elif mode == MODES[1]:
+        base = AutoModelForCausalLM.from_pretrained(source, torch_dtype=dtype)
+        model = AutoModelForCausalLM.from_config(base.config).to(dtype=dtype)
+        model.load_state_dict(base.state_dict(), strict=True)
+        del base
+    else:
+        model = load_dir(ensure_cache(source, dtype, cache_dir), dtype)
+    loaded = time.perf_counter() - start
+    rss_loaded = peak_rss_mb()
+    with torch.inference_mode():
+        model.eval()(torch.randint(0, model.config.vocab_size, (1, 32)))
+    print(json.dumps({"load": loaded, "forward": time.perf_counter() - start - loaded,
+                      "rss_loaded": rss_loaded, "rss_peak": peak_rss_mb()}))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="local model directory (default: a random Llama)")
+    parser.add_argument("--hidden", type=int, default=1024)
+    parser.add_argument("--layers", type=int, default=8)
+    parser.add_argument("--dtype", default="float16", choices=["float16", "bfloat16", "float32"])
+    parser.add_argument("--run", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        mode, source, cache_dir = args.run
+        return run_one(mode, source, cache_dir, args.dtype)
+
+    try:
+        import torch
+        from transformers import LlamaConfig, LlamaForCausalLM
+    except ImportError:
+        sys.exit("torch and transformers are needed: pip install torch transformers")
+    from src.tune.loader import ensure_cache
+
+    work = Path(tempfile.mkdtemp(prefix="model_load_"))
+    source = args.model
+    if source is None:
+        source = str(work / "source")
+        config = LlamaConfig(vocab_size=32000, hidden_size=args.hidden, intermediate_size=args.hidden * 11 // 4,
+                             num_hidden_layers=args.layers, num_attention_heads=16, num_key_value_heads=16)
+        LlamaForCausalLM(config).save_pretrained(source, safe_serialization=True)
+    cache_dir = str(work / "cache")
+    start = time.perf_counter()
+    path = ensure_cache(source, getattr(torch, args.dtype), cache_dir)
+    size = sum(f.stat().st_size for f in path.glob("*.safetensors"))
+    print(f"{source}: {size / 1e6:.0f} MB as {args.dtype}, one-time conversion {time.perf_counter() - start:.1f}s\n")
+
+    print(f"{'load path':<28} {'load s':>7} {'forward s':>9} {'peak RSS load':>14} {'+ forward':>10}")
+    for mode in MODES:
+        out = subprocess.run([sys.executable, __file__, "--dtype", args.dtype, "--run", mode, source, cache_dir],
+                             capture_output=True, text=True, check=True).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f"{mode:<28} {r['load']:>7.2f} {r['forward']:>9.2f} {r['rss_loaded']:>11.0f} MB {r['rss_peak']:>7.0f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Benchmark and manual regression check for get_aggregated_notifications().
+
+This is not a test: the repo has no test suite, so nothing runs it
+automatically. Run it by hand after changing the notifications query.
+
+Builds a fixture database with thousands of notifications, then compares the
+set-based implementation in blog/app.py against the original per-notification
+query loop (kept below as legacy_aggregated_notifications). The two must
+return the same notifications; the only intended difference is that
+like_count is now the post's real like count instead of len(likers) capped
+at 5. Exits non-zero on any mismatch.
+
+    python bench/notifications.py --engagements 20000
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fixtures import load_app, populate, percentile, AGENT_USERNAME
+
+def legacy_aggregated_notifications(conn, user_id):
+    """The N+1 implementation this replaced, for comparison"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT n.id, n.typ, n.obj_id, n.created_at, p.text, p.user, u.display_name, u.profile_image
+        FROM notifs n
+        JOIN posts p ON n.obj_id = p.id
+        JOIN users u ON u.username = p.user_lc COLLATE NOCASE
+        WHERE n.user_id = ?
+        ORDER BY n.created_at DESC
+        LIMIT 100
+    ''', (user_id,))
+
+    notifications = []
+    for row in cursor.fetchall():
+        notification = {
+            'id': row[0], 'type': row[1], 'post_id': row[2], 'created_at': row[3],
+            'post_text': row[4], 'post_user': row[5],
+            'post_user_display_name': row[6] or row[5], 'post_user_profile_image': row[7]
+        }
+        if row[1] == 'reply':
+            cursor.execute('''
+                SELECT e.id, e.content, e.user_id FROM new_engagements e
+                WHERE e.post_id = ? AND e.type = 'reply'
+                ORDER BY e.created_at DESC, e.id DESC LIMIT 1
+            ''', (row[2],))
+            reply_data = cursor.fetchone()
+            if reply_data:
+                notification['reply_id'] = reply_data[0]
+                notification['reply_content'] = reply_data[1]
+                notification['reply_user_id'] = reply_data[2]
+        notifications.append(notification)
+
+    post_likes = {}
+    for notif in notifications:
+        if notif['type'] == 'like':
+            post_id = notif['post_id']
+            if post_id not in post_likes:
+                post_likes[post_id] = {key: notif[key] for key in (
+                    'post_id', 'post_text', 'post_user', 'post_user_display_name',
+                    'post_user_profile_image', 'created_at')}
+            cursor.execute('''
+                SELECT u.username, u.display_name, u.profile_image FROM new_engagements e
+                JOIN users u ON e.user_id = u.id
+                WHERE e.post_id = ? AND e.type = 'like'
+                ORDER BY e.created_at DESC, e.id DESC LIMIT 5
+            ''', (post_id,))
+            likers = [{'username': r[0], 'display_name': r[1] or r[0], 'profile_image': r[2]}
+                      for r in cursor.fetchall()]
+            post_likes[post_id]['likers'] = likers
+            post_likes[post_id]['like_count'] = len(likers)
+
+    aggregated = [dict(data, type='aggregated_likes') for data in post_likes.values() if data['like_count'] > 0]
+    aggregated += [notif for notif in notifications if notif['type'] != 'like']
+    aggregated.sort(key=lambda x: x['created_at'], reverse=True)
+    return aggregated[:50]
+
+def true_like_count(conn, post_id):
+    return conn.execute(
+        "SELECT COUNT(*) FROM new_engagements WHERE post_id = ? AND type = 'like'", (post_id,)
+    ).fetchone()[0]
+
+def check(app, conn, user_id):
+    """Return a list of mismatches between the new and legacy output"""
+    with app.app.app_context():
+        new = app.get_aggregated_notifications(user_id)
+    old = legacy_aggregated_notifications(conn, user_id)
+
+    errors = []
+    if len(new) != len(old):
+        errors.append(f"user {user_id}: {len(new)} notifications, expected {len(old)}")
+    for i, (a, b) in enumerate(zip(new, old)):
+        if a.get('type') == 'aggregated_likes':
+            expected = true_like_count(conn, a['post_id'])
+            if a['like_count'] != expected:
+                errors.append(f"user {user_id} #{i}: like_count {a['like_count']}, expected {expected}")
+            if len(a['likers']) != min(expected, 5):
+                errors.append(f"user {user_id} #{i}: {len(a['likers'])} likers for {expected} likes")
+            a = {k: v for k, v in a.items() if k != 'like_count'}
+            b = {k: v for k, v in b.items() if k != 'like_count'}
+        if a != b:
+            errors.append(f"user {user_id} #{i}: {a} != {b}")
+    return errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--engagements", type=int, default=20000)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    db_path = Path(tempfile.mkdtemp(prefix="clanker_bench_")) / "tweets.db"
+    app = load_app(db_path)
+    populate(app, posts=args.posts, engagements=args.engagements)
+
+    conn = app.sqlite3.connect(app.DB_PATH)
+    notif_total = conn.execute("SELECT COUNT(*) FROM notifs").fetchone()[0]
+    user_ids = [row[0] for row in conn.execute("SELECT DISTINCT user_id FROM notifs")]
+    print(f"Fixture: {args.posts} posts, {notif_total} notifications across {len(user_ids)} users")
+
+    errors = []
+    for user_id in user_ids:
+        errors += check(app, conn, user_id)
+    if errors:
+        print("\n".join(errors[:20]))
+        print(f"FAILED: {len(errors)} mismatches")
+        sys.exit(1)
+    print(f"Output matches the legacy implementation for all {len(user_ids)} users")
+
+    agent_id = conn.execute("SELECT id FROM users WHERE username = ?", (AGENT_USERNAME,)).fetchone()[0]
+    for label, fn in (
+        ("legacy (N+1)", lambda: legacy_aggregated_notifications(conn, agent_id)),
+        ("set-based", lambda: app.get_aggregated_notifications(agent_id)),
+    ):
+        samples = []
+        with app.app.app_context():
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                fn()
+                samples.append((time.perf_counter() - start) * 1000)
+        print(f"{label:<14} p50 {percentile(samples, 50):7.2f}ms  p99 {percentile(samples, 99):7.2f}ms")
+
+if __name__ == "__main__":
+    main()
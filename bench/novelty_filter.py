@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+src/novelty.py on the real posts table (data/tweets.db by default, copied
+first) plus synthetic posts up to --scale:
+
+    python bench/novelty_filter.py --scale 50000
+
+Reports index build / reload / incremental sync times, µs per check and
+how often it rejects exact reposts, lightly edited reposts and fresh text.
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fixtures import percentile
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / "src"))
+from novelty import NoveltyIndex
+
+def edit(text, rng):
+    # A light rewording: drop or duplicate a word, change case, add punctuation
+    words = text.split()
+    if len(words) > 3:
+        i = rng.randrange(len(words))
+        if rng.random() < 0.5:
+            del words[i]
+        else:
+            words.insert(i, words[i])
+    out = " ".join(words)
+    return (out.upper() if rng.random() < 0.2 else out) + rng.choice(["", ".", " lol", "..."])
+
+def fresh(vocab, rng):
+    return " ".join(rng.choice(vocab) for _ in range(rng.randint(6, 30)))
+
+def timed_checks(index, texts):
+    samples, rejected = [], 0
+    for text in texts:
+        start = time.perf_counter()
+        novel = index.is_novel(text)
+        samples.append((time.perf_counter() - start) * 1e6)
+        rejected += not novel
+    return sum(samples) / len(samples), percentile(samples, 99), rejected / len(texts)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=str(ROOT / "data" / "tweets.db"))
+    parser.add_argument("--scale", type=int, default=50000, help="total posts after adding synthetic ones")
+    parser.add_argument("--checks", type=int, default=1000)
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    work = Path(tempfile.mkdtemp(prefix="novelty_"))
+    db_path = work / "tweets.db"
+    if os.path.exists(args.db):
+        shutil.copy(args.db, db_path)
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("CREATE TABLE IF NOT EXISTS posts (id INTEGER PRIMARY KEY AUTOINCREMENT, text TEXT)")
+    real = [r[0] for r in conn.execute("SELECT text FROM posts WHERE text IS NOT NULL AND length(text) > 20")]
+    vocab = sorted({w for t in real for w in t.split()}) or ["la", "nuit", "cigarette", "amour", "metro", "pluie"]
+    extra = max(0, args.scale - len(real))
+    conn.executemany("INSERT INTO posts (text) VALUES (?)", [(fresh(vocab, rng),) for _ in range(extra)])
+    conn.commit()
+    total = conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+    print(f"{total} posts ({len(real)} real, {extra} synthetic)")
+
+    index_path = str(db_path) + ".novelty"
+    start = time.perf_counter()
+    index = NoveltyIndex.open(index_path, db_path)
+    print(f"build from scratch      {time.perf_counter() - start:7.2f}s  ({len(index)} entries, "
+          f"{os.path.getsize(index_path) / 1e6:.1f} MB on disk)")
+
+    start = time.perf_counter()
+    index = NoveltyIndex.open(index_path, db_path)
+    print(f"reload from disk        {time.perf_counter() - start:7.2f}s")
+
+    conn.executemany("INSERT INTO posts (text) VALUES (?)", [(fresh(vocab, rng),) for _ in range(100)])
+    conn.commit()
+    start = time.perf_counter()
+    index = NoveltyIndex.open(index_path, db_path)
+    print(f"reload + sync 100 new   {time.perf_counter() - start:7.2f}s  ({len(index)} entries)")
+    conn.close()
+
+    sources = real or [fresh(vocab, rng) for _ in range(100)]
+    cases = [
+        ("exact repost", [rng.choice(sources) for _ in range(args.checks)]),
+        ("edited repost", [edit(rng.choice(sources), rng) for _ in range(args.checks)]),
+        ("fresh text", [fresh(vocab, rng) for _ in range(args.checks)]),
+    ]
+    print(f"\n{'candidates':<14} {'mean µs':>8} {'p99 µs':>8} {'rejected':>9}")
+    for label, texts in cases:
+        mean, p99, rejected = timed_checks(index, texts)
+        print(f"{label:<14} {mean:>8.0f} {p99:>8.0f} {rejected:>8.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Sampling phase of src/tune/4_online.py on CPU with a tiny randomly
+initialised model: the old loop (ten generate() calls of batch 1, each
+re-tokenizing the prompt) vs src/tune/sampling.py with and without reuse
+of the prompt's KV cache. The sample_batch() modes are what the loop does
+now: one prompt per strategy from a single character draw, differing only
+from the style line on, with and without sharing the common prefix's KV.
+
+    python bench/online_sampling.py --samples 10 --new-tokens 64
+
+First checks that reusing the prefix KV changes nothing: with greedy
+decoding, sample_completions() and sample_batch() must return the same
+completions with reuse_prefix on and off, for the bare model and for a
+PeftModel with one adapter and with two random adapters mixed in a batch
+(needs peft). Exits non-zero on any mismatch.
+
+Every mode generates exactly --new-tokens tokens per sample (min_new_tokens)
+so tokens/s compare like for like. Needs torch and transformers. By default
+the model is a random Llama with a tokenizer trained on the prompts
+(bench/fixtures.py, nothing is downloaded); --model takes a config and
+tokenizer from the Hugging Face hub instead.
+"""
+
+import argparse
+import copy
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fixtures import random_llama
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+sys.path.append(str(ROOT / "src"))
+
+def check_prefix_reuse(model, tokenizer, prompt, strategy_prompts, new_tokens):
+    """Mismatches between greedy completions with and without prefix KV reuse"""
+    from src.tune.sampling import sample_batch, sample_completions
+    greedy = dict(do_sample=False, max_new_tokens=new_tokens, min_new_tokens=new_tokens)
+    errors = []
+
+    def compare(label, sample):
+        plain, reused = sample(False), sample(True)
+        errors.extend(f"{label} #{i}: {a!r} != {b!r}" for i, (a, b) in enumerate(zip(plain, reused)) if a != b)
+        print(f"  {label:<40} {'ok' if plain == reused else 'MISMATCH'}")
+
+    # Greedy generate() refuses num_return_sequences > 1, which the plain path uses; top_k=1 sampling is greedy
+    compare("sample_completions", lambda reuse: sample_completions(
+        model, tokenizer, prompt, 3, "cpu", reuse_prefix=reuse, **dict(greedy, do_sample=True, top_k=1))[0])
+    compare("sample_batch", lambda reuse: sample_batch(
+        model, tokenizer, strategy_prompts, "cpu", reuse_prefix=reuse, **greedy)[0])
+    try:
+        from peft import get_peft_model
+        from src.tune.adapters import lora_config
+    except ImportError:
+        print("  peft is not installed: adapter checks skipped")
+        return errors
+    # Random (not zero) LoRA weights, so the two adapters really give different prefix KVs
+    peft_model = get_peft_model(copy.deepcopy(model), lora_config(init_lora_weights=False), adapter_name="a")
+    peft_model.add_adapter("b", lora_config(init_lora_weights=False))
+    peft_model.eval()
+    for label, names in [("sample_batch, one adapter", ["a"] * len(strategy_prompts)),
+                         ("sample_batch, two adapters mixed", ["a", "b"] * (len(strategy_prompts) // 2)
+                          + ["a"] * (len(strategy_prompts) % 2))]:
+        compare(label, lambda reuse: sample_batch(peft_model, tokenizer, strategy_prompts, "cpu",
+                                                  adapter_names=names, reuse_prefix=reuse, **greedy)[0])
+    return errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="hub config + tokenizer to use, weights random (default: a local random Llama)")
+    parser.add_argument("--hidden", type=int, default=256)
+    parser.add_argument("--layers", type=int, default=2)
+    parser.add_argument("--samples", type=int, default=10)
+    parser.add_argument("--new-tokens", type=int, default=64)
+    parser.add_argument("--threads", type=int, help="torch intra-op threads")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    try:
+        import torch
+        from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer
+    except ImportError:
+        sys.exit("torch and transformers are needed: pip install torch transformers")
+    from prompts import Character, PromptBuilder
+    from src.tune.sampling import sample_batch, sample_completions
+    import agent
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+    prompt = PromptBuilder(agent.PROMPT, Character(ROOT / agent.CHARACTER_JSON_PATH), seed=0).build()
+    source = args.model
+    if source is None:
+        source = tempfile.mkdtemp(prefix="online_sampling_")
+        random_llama(source, [prompt, (ROOT / agent.CHARACTER_JSON_PATH).read_text()], args.hidden, args.layers)
+    tokenizer = AutoTokenizer.from_pretrained(source)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    model = AutoModelForCausalLM.from_config(AutoConfig.from_pretrained(source)).eval()
+    # As in 4_online.py: the "- No questions." rule becomes a per-strategy style line
+    styles = ["- A small observation. No questions.", "- A tiny poem in short broken lines. No questions.",
+              "- End on a question to the reader.", "- A small private confession. No questions."]
+    strategy_prompts = PromptBuilder(agent.PROMPT.replace("- No questions.", "{{style}}"),
+                                     Character(ROOT / agent.CHARACTER_JSON_PATH), seed=0).variants(
+        [{"style": styles[i % len(styles)]} for i in range(args.samples)])
+    gen = dict(do_sample=True, temperature=0.9, top_p=0.9, repetition_penalty=1.1,
+               max_new_tokens=args.new_tokens, min_new_tokens=args.new_tokens)
+    n = args.samples
+
+    def serial():
+        # What 4_online.py did before
+        start = time.perf_counter()
+        tokens = 0
+        for _ in range(n):
+            inputs = tokenizer(prompt, return_tensors="pt", truncation=True, max_length=512)
+            with torch.no_grad():
+                out = model.generate(inputs.input_ids, attention_mask=inputs.attention_mask,
+                                     pad_token_id=tokenizer.eos_token_id, **gen)
+            full = tokenizer.decode(out[0], skip_special_tokens=True)
+            full[len(prompt):].strip() if full.startswith(prompt) else full.strip()
+            tokens += out.shape[1] - inputs.input_ids.shape[1]
+        return tokens, time.perf_counter() - start
+
+    def batched(reuse_prefix):
+        _, stats = sample_completions(model, tokenizer, prompt, n, "cpu", reuse_prefix=reuse_prefix, **gen)
+        return stats["new_tokens"], stats["seconds"]
+
+    def strategies(reuse_prefix):
+        _, stats = sample_batch(model, tokenizer, strategy_prompts, "cpu", reuse_prefix=reuse_prefix, **gen)
+        return stats["new_tokens"], stats["seconds"]
+
+    print("Prefix KV reuse, greedy completions with it vs without:")
+    errors = check_prefix_reuse(model, tokenizer, prompt, strategy_prompts, min(args.new_tokens, 16))
+    if errors:
+        print("\n".join(errors[:10]))
+        sys.exit(f"FAILED: {len(errors)} completions differ with the prefix KV reused")
+
+    prompt_tokens = len(tokenizer(prompt).input_ids)
+    print(f"\n{args.model or 'random Llama'} (random weights), {torch.get_num_threads()} threads, prompt {prompt_tokens} tokens, "
+          f"{n} samples x {args.new_tokens} new tokens")
+    print(f"{'mode':<28} {'seconds':>8} {'tokens/s':>9}")
+    for label, fn in [("10x generate(), batch 1", serial),
+                      ("one generate(), batch n", lambda: batched(False)),
+                      ("one generate() + prompt KV", lambda: batched(True)),
+                      ("strategy prompts, batch n", lambda: strategies(False)),
+                      ("strategy prompts + prefix KV", lambda: strategies(True))]:
+        fn()  # Warm-up
+        runs = [fn() for _ in range(args.repeat)]
+        tokens, seconds = min(runs, key=lambda r: r[1])
+        print(f"{label:<28} {seconds:>8.3f} {tokens / seconds:>9.0f}")
+
+if __name__ == "__main__":
+    main()
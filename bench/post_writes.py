@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Writing generated posts while the blog is under load: the old per-post
+connect/INSERT/COMMIT (agent.store_post, 4_online.py) vs src/post_sink.py.
+
+    python bench/post_writes.py --rate 500 --duration 10 --concurrency 16
+
+The blog runs under gunicorn (as in bench/load_test.py) with clients
+liking/unliking posts, while one thread produces `rate` posts per second.
+Reports how long the producer was blocked per post, "database is locked"
+errors on either side, and the web side's throughput and p99.
+"""
+
+import argparse
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from fixtures import load_app, populate, percentile
+from load_test import engagements, free_port, login, run_scenario, start_server, stop_server
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / "src"))
+from post_sink import PostSink
+
+def per_post(db_path):
+    # What agent.store_post / 4_online.py did for every tweet
+    def write(text):
+        conn = sqlite3.connect(str(db_path))
+        now = int(time.time())
+        conn.execute("INSERT INTO posts (text, user, user_lc, timestamp, ts) VALUES (?, ?, ?, ?, ?)",
+                     (text, "AverageFrench", "averagefrench", str(now), now))
+        conn.commit()
+        conn.close()
+    return write, lambda: None
+
+def buffered(db_path):
+    sink = PostSink(db_path, user="AverageFrench")
+    return sink.add, sink.close
+
+def produce(write, rate, duration, samples, errors):
+    interval = 1.0 / rate
+    start = time.monotonic()
+    i = 0
+    while time.monotonic() - start < duration:
+        t = time.perf_counter()
+        try:
+            write(f"generated post {i}")
+        except sqlite3.OperationalError:
+            errors.append(i)
+        samples.append((time.perf_counter() - t) * 1000)
+        i += 1
+        time.sleep(max(0.0, start + i * interval - time.monotonic()))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=500, help="posts generated per second")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=16, help="web clients")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--posts", type=int, default=5000)
+    args = parser.parse_args()
+
+    db_path = Path(tempfile.mkdtemp(prefix="clanker_sink_")) / "tweets.db"
+    app = load_app(db_path)
+    usernames = populate(app, posts=args.posts, users=args.concurrency + 1, engagements=args.posts)
+    app.db_pool.close()
+
+    port = free_port()
+    server = start_server(db_path, port, args.workers, 8)
+    try:
+        cookies = [login(port, name) for name in usernames[1:args.concurrency + 1]]
+        print(f"{args.rate:.0f} posts/s for {args.duration:g}s alongside {args.concurrency} web clients "
+              f"({args.workers} gunicorn workers)")
+        print(f"{'writer':<9} {'posts':>6} {'stored':>6} {'p50 ms':>7} {'p99 ms':>7} {'max ms':>7} {'locked':>6}"
+              f" {'web req/s':>9} {'web p99':>8} {'web err':>7}")
+        for label, make in [("per-post", per_post), ("PostSink", buffered)]:
+            before = sqlite3.connect(str(db_path)).execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+            write, finish = make(db_path)
+            samples, errors = [], []
+            producer = threading.Thread(target=produce, args=(write, args.rate, args.duration, samples, errors))
+            producer.start()
+            rps, _, p99, web_errors = run_scenario(
+                port, lambda client, rng: engagements(client, rng, args.posts), cookies,
+                args.concurrency, args.duration
+            )
+            producer.join()
+            finish()
+            stored = sqlite3.connect(str(db_path)).execute("SELECT COUNT(*) FROM posts").fetchone()[0] - before
+            print(f"{label:<9} {len(samples):>6} {stored:>6} {percentile(samples, 50):>7.3f} "
+                  f"{percentile(samples, 99):>7.3f} {max(samples):>7.1f} {len(errors):>6}"
+                  f" {rps:>9.0f} {p99:>8.1f} {web_errors:>7}")
+    finally:
+        stop_server(server)
+
+if __name__ == "__main__":
+    main()
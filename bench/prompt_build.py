@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Prompt construction cost: the old per-tweet path (re-read and parse
+character.json, mustache() with one str.replace pass per key) vs
+src/prompts.py (character cached by mtime, template compiled to segments).
+
+    python bench/prompt_build.py --prompts 10000
+
+Also checks that compiled templates render exactly like mustache(), that a
+seed reproduces the same prompt set, and that editing the file reloads it.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / "src"))
+import agent
+from prompts import Character, PromptBuilder, Template
+
+def mustache(template, data):
+    for k, v in data.items():
+        template = template.replace("{{" + k + "}}", str(v))
+    return template
+
+def pick(items, k=1):
+    items = list(items or [])
+    if not items or k <= 0: return []
+    return random.sample(items, min(k, len(items)))
+
+def old_prompt(path):
+    # generate_post() before src/prompts.py, minus the model call
+    char = json.loads(Path(path).read_text(encoding="utf-8"))
+    name = char.get("name") or char.get("id") or "agent"
+    return mustache(agent.PROMPT, {
+        "agentName": name,
+        "twitterUserName": char.get("twitter", name),
+        "bio": " • ".join(pick(char.get("bio"), k=3)),
+        "lore": " • ".join(pick(char.get("lore"), k=3)),
+        "recentPosts": "\n".join(f"- {p}" for p in pick(char.get("postExamples"), k=5)),
+        "adjective": random.choice(char.get("adjectives", ["laconic", "direct", "teasing"])),
+        "topic": random.choice(char.get("topics", ["cigarettes", "romance", "nighttime"])),
+    })
+
+def per_prompt_us(fn, n):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompts", type=int, default=10000)
+    args = parser.parse_args()
+    n = args.prompts
+
+    path = Path(tempfile.mkdtemp(prefix="prompts_")) / "character.json"
+    shutil.copy(ROOT / agent.CHARACTER_JSON_PATH, path)
+    builder = PromptBuilder(agent.PROMPT, Character(path), seed=0)
+
+    data = builder.variables(builder.character.get())
+    assert Template(agent.PROMPT).render(data) == mustache(agent.PROMPT, data)
+    assert Template("{{a}} {{missing}}").render({"a": 1}) == mustache("{{a}} {{missing}}", {"a": 1})
+    assert PromptBuilder(agent.PROMPT, Character(path), seed=42).batch(50) == \
+        PromptBuilder(agent.PROMPT, Character(path), seed=42).batch(50)
+
+    template = Template(agent.PROMPT)
+    print(f"render only, µs: mustache() {per_prompt_us(lambda: [mustache(agent.PROMPT, data) for _ in range(n)], n):.2f}"
+          f"  Template.render() {per_prompt_us(lambda: [template.render(data) for _ in range(n)], n):.2f}")
+    print(f"{n} prompts, µs per prompt")
+    print(f"  old (read json + mustache)  {per_prompt_us(lambda: [old_prompt(path) for _ in range(n)], n):8.1f}")
+    print(f"  mustache, cached character  "
+          f"{per_prompt_us(lambda: [mustache(agent.PROMPT, builder.variables(builder.character.get())) for _ in range(n)], n):8.1f}")
+    print(f"  PromptBuilder.build()       {per_prompt_us(lambda: [builder.build() for _ in range(n)], n):8.1f}")
+    print(f"  PromptBuilder.batch({n})  {per_prompt_us(lambda: builder.batch(n), n):8.1f}")
+
+    char = json.loads(path.read_text(encoding="utf-8"))
+    char["topics"] = ["the metro"]
+    path.write_text(json.dumps(char), encoding="utf-8")
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 1_000_000))
+    assert all("about the metro" in p for p in builder.batch(20)), "character edit not picked up"
+    path.write_text("{ not json", encoding="utf-8")
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 2_000_000))
+    assert all("about the metro" in p for p in builder.batch(20)), "bad edit should keep the last good character"
+    print(f"reloads on edit: ok ({builder.character.reloads} loads)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+OllamaPool load balancing and fault handling against bench/fake_ollama.py.
+
+    python bench/replica_balancing.py --replicas 4 --prompts 64
+
+1. One replica is much slower than the rest: batch time and per-request
+   p50/p99 for pool.map, least-loaded vs plain round-robin.
+2. One replica returns 500s: the batch still completes and the replica is
+   ejected by the circuit breaker.
+3. One `ollama serve` process is killed: the monitor respawns it.
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / "src"))
+from replicas import OllamaPool
+from fixtures import percentile
+
+FAKE_SERVE_CMD = [sys.executable, str(Path(__file__).resolve().parent / "fake_ollama.py")]
+
+class RoundRobinPool(OllamaPool):
+    """The old selection policy, for comparison"""
+
+    def _acquire(self, exclude=()):
+        with self._changed:
+            if not hasattr(self, "_rr"):
+                self._rr = itertools.cycle(self.replicas)
+            for _ in range(len(self.replicas)):
+                r = next(self._rr)
+                if r.ready and r not in exclude:
+                    r.inflight += 1
+                    return r
+            raise RuntimeError("No Ollama replica is ready")
+
+def make_pool(cls, args, models_dir, **kwargs):
+    return cls("fake-model", replicas=args.replicas, base_port=args.base_port, models_dir=models_dir,
+               serve_cmd=FAKE_SERVE_CMD, startup_timeout=30, wait_for=args.replicas, **kwargs)
+
+def timed_map(pool, prompts, workers):
+    latencies = []
+    lock = threading.Lock()
+    def one(messages):
+        start = time.perf_counter()
+        out = pool.submit(messages)
+        with lock:
+            latencies.append((time.perf_counter() - start) * 1000)
+        return out
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        list(ex.map(one, prompts))
+    return time.perf_counter() - start, latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replicas", type=int, default=4)
+    parser.add_argument("--prompts", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=8, help="concurrent requests")
+    parser.add_argument("--base-port", type=int, default=11700)
+    parser.add_argument("--delay", type=float, default=0.05, help="normal chat latency (s)")
+    parser.add_argument("--slow", type=float, default=0.5, help="extra latency on the slow replica (s)")
+    args = parser.parse_args()
+
+    models_dir = tempfile.mkdtemp(prefix="fake_ollama_models_")
+    open(os.path.join(models_dir, "fake-fake-model"), "w").close()  # Already "pulled"
+    prompts = [[{"role": "user", "content": f"prompt {i}"}] for i in range(args.prompts)]
+    slow_port = args.base_port + 1
+
+    print(f"1. Replica :{slow_port} is {args.slow * 1000:.0f}ms slower; {args.prompts} prompts, {args.workers} at a time")
+    os.environ["FAKE_OLLAMA_CHAT_DELAY"] = str(args.delay)
+    os.environ["FAKE_OLLAMA_PORT_DELAYS"] = f"{slow_port}={args.slow}"
+    for label, cls in (("round-robin", RoundRobinPool), ("least-loaded", OllamaPool)):
+        pool = make_pool(cls, args, models_dir)
+        elapsed, latencies = timed_map(pool, prompts, args.workers)
+        counts = " ".join(f":{s['port']}={s['requests']}" for s in pool.stats())
+        pool.close()
+        print(f"  {label:<13} batch {elapsed:6.2f}s  p50 {percentile(latencies, 50):6.0f}ms  "
+              f"p99 {percentile(latencies, 99):6.0f}ms  requests {counts}")
+    del os.environ["FAKE_OLLAMA_PORT_DELAYS"]
+
+    fail_port = args.base_port + 2
+    print(f"\n2. Replica :{fail_port} returns 500 for every chat")
+    os.environ["FAKE_OLLAMA_FAIL_PORTS"] = str(fail_port)
+    pool = make_pool(OllamaPool, args, models_dir, min_backoff=30)
+    elapsed, latencies = timed_map(pool, prompts, args.workers)
+    print(f"  {len(latencies)}/{len(prompts)} prompts answered in {elapsed:.2f}s")
+    for s in pool.stats():
+        print(f"  {s}")
+    pool.close()
+    del os.environ["FAKE_OLLAMA_FAIL_PORTS"]
+
+    print("\n3. Killing one ollama serve process")
+    pool = make_pool(OllamaPool, args, models_dir, probe_interval=0.2)
+    victim = pool.replicas[0]
+    killed = victim.proc
+    killed.kill()
+    killed.wait()
+    start = time.monotonic()
+    while not (victim.ready and victim.proc is not killed) and time.monotonic() - start < 10:
+        pool.submit(prompts[0])  # Traffic keeps flowing to the others meanwhile
+        time.sleep(0.05)
+    print(f"  :{victim.port} back to {victim.state} after {time.monotonic() - start:.2f}s")
+    pool.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+OllamaPool startup against bench/fake_ollama.py: time until the first replica
+serves, time until all are warm, and how many times the model was pulled.
+
+    python bench/replica_startup.py --replicas 4 --pull 2 --load 1
+
+With the old sequential startup this took about replicas x (pull + load).
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / "src"))
+from replicas import OllamaPool
+
+FAKE_SERVE_CMD = [sys.executable, str(Path(__file__).resolve().parent / "fake_ollama.py")]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replicas", type=int, default=4)
+    parser.add_argument("--base-port", type=int, default=11600)
+    parser.add_argument("--boot", type=float, default=0.3, help="fake daemon boot time (s)")
+    parser.add_argument("--pull", type=float, default=2.0, help="fake pull time (s)")
+    parser.add_argument("--load", type=float, default=1.0, help="fake model load time (s)")
+    args = parser.parse_args()
+
+    os.environ["FAKE_OLLAMA_STARTUP_DELAY"] = str(args.boot)
+    os.environ["FAKE_OLLAMA_PULL_DELAY"] = str(args.pull)
+    os.environ["FAKE_OLLAMA_LOAD_DELAY"] = str(args.load)
+    models_dir = tempfile.mkdtemp(prefix="fake_ollama_models_")
+
+    for run in ("cold (model not on disk)", "warm (model already pulled)"):
+        start = time.monotonic()
+        pool = OllamaPool("fake-model", replicas=args.replicas, base_port=args.base_port,
+                          models_dir=models_dir, serve_cmd=FAKE_SERVE_CMD, startup_timeout=60)
+        first = time.monotonic() - start
+        reply = pool.submit([{"role": "user", "content": "hi"}])
+        pool.wait_ready()
+        every = time.monotonic() - start
+        ready = len(pool.ready_replicas())
+        pool.close()
+
+        pulls = len(open(os.path.join(models_dir, "fake-pulls.log")).read().splitlines())
+        pull = args.pull if run.startswith("cold") else 0
+        print(f"{run}: first ready {first:.2f}s, {ready} ready {every:.2f}s, pulls so far {pulls}, reply {reply!r}")
+        print(f"  old sequential startup: ~{args.replicas * (args.boot + pull + args.load):.2f}s")
+
+    # Startup deadline: daemons that boot slower than the deadline fail fast
+    os.environ["FAKE_OLLAMA_STARTUP_DELAY"] = "5"
+    start = time.monotonic()
+    try:
+        OllamaPool("fake-model", replicas=2, base_port=args.base_port, models_dir=models_dir,
+                   serve_cmd=FAKE_SERVE_CMD, startup_timeout=1)
+    except RuntimeError as e:
+        print(f"deadline 1s: raised after {time.monotonic() - start:.2f}s: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: logged-out page views with and without the response cache,
+plus a conditional (If-None-Match) revalidation.
+
+    python bench/response_cache.py --requests 2000
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from fixtures import load_app, populate, percentile, AGENT_USERNAME
+
+def time_calls(fn, n):
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+def report(label, samples):
+    mean = sum(samples) / len(samples)
+    print(f"{label:<28} mean {mean:9.1f}us  p50 {percentile(samples, 50):9.1f}us  p99 {percentile(samples, 99):9.1f}us")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--engagements", type=int, default=20000)
+    args = parser.parse_args()
+
+    db_path = Path(tempfile.mkdtemp(prefix="clanker_bench_")) / "tweets.db"
+    app = load_app(db_path)
+    populate(app, posts=args.posts, engagements=args.engagements)
+    client = app.app.test_client()
+
+    for path in ("/", f"/u/{AGENT_USERNAME}", "/t/1"):
+        print(f"GET {path} logged out ({args.requests} requests)")
+
+        app.app.config['RESPONSE_CACHE_ENABLED'] = False
+        client.get(path)  # warm up templates and the statement cache
+        report("  uncached", time_calls(lambda: client.get(path), args.requests))
+
+        app.app.config['RESPONSE_CACHE_ENABLED'] = True
+        etag = client.get(path).headers['ETag']
+        report("  cached", time_calls(lambda: client.get(path), args.requests))
+        report("  cached, 304", time_calls(lambda: client.get(path, headers={'If-None-Match': etag}), args.requests))
+        print()
+
+    print("Cache stats:", app.response_cache.stats())
+
+if __name__ == "__main__":
+    main()
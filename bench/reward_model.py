@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+src/reward.py: training and scoring cost, and whether best-of-N picks better
+posts, on synthetic engagement with a known cause.
+
+    python bench/reward_model.py --candidates 1000
+
+Post texts come from data/tweets.db (synthetic if it's missing). A hidden
+per-word effect decides each post's expected engagement; likes, replies and
+clanks are sampled from it into a scratch blog database. The model never
+sees the hidden effects, only the engagement rows.
+"""
+
+import argparse
+import math
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fixtures import load_app
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / "src"))
+from reward import RewardModel
+
+def poisson(rng, lam):
+    # Knuth; fine for the small rates used here
+    limit, k, p = math.exp(-lam), 0, 1.0
+    while True:
+        p *= rng.random()
+        if p <= limit:
+            return k
+        k += 1
+
+def load_texts(rng, n):
+    path = ROOT / "data" / "tweets.db"
+    texts = []
+    if path.exists():
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        texts = [r[0] for r in conn.execute("SELECT text FROM posts WHERE length(text) > 20")]
+        conn.close()
+    words = sorted({w for t in texts for w in t.lower().split()}) or \
+        [f"mot{i}" for i in range(2000)]
+    while len(texts) < n:
+        texts.append(" ".join(rng.choice(words) for _ in range(rng.randint(5, 25))))
+    rng.shuffle(texts)
+    return texts[:n], words
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=3000, help="posts with engagement to train on")
+    parser.add_argument("--candidates", type=int, default=1000, help="candidates to score")
+    parser.add_argument("--best-of", type=int, default=4)
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    texts, vocab = load_texts(rng, args.posts + args.candidates)
+    train_texts, candidates = texts[:args.posts], texts[args.posts:]
+    effect = {w: rng.gauss(0, 1) for w in rng.sample(vocab, max(len(vocab) // 10, 1))}
+    def quality(text):
+        return sum(effect.get(w, 0.0) for w in text.lower().split())
+
+    db_path = Path(tempfile.mkdtemp(prefix="reward_")) / "tweets.db"
+    app = load_app(db_path)
+    conn = sqlite3.connect(str(db_path))
+    old = int(time.time()) - 86400
+    conn.executemany("INSERT INTO posts (text, user, user_lc, timestamp, ts) VALUES (?, ?, ?, ?, ?)",
+                     [(t, "AverageFrench", "averagefrench", str(old), old) for t in train_texts])
+    post_ids = [r[0] for r in conn.execute("SELECT id FROM posts ORDER BY id")]
+    user = iter(range(1, 10**9))
+    def engage(pairs):
+        rows = []
+        for post_id, text in pairs:
+            q = quality(text)
+            for typ, lam in (("like", math.exp(0.5 + 0.8 * q)), ("reply", math.exp(-0.5 + 0.8 * q)),
+                             ("clanked", math.exp(-1.0 - 0.8 * q))):
+                rows += [(next(user), post_id, typ) for _ in range(poisson(rng, min(lam, 50)))]
+        conn.executemany("INSERT INTO new_engagements (user_id, post_id, type) VALUES (?, ?, ?)", rows)
+        conn.commit()
+        return len(rows)
+    engagements = engage(zip(post_ids, train_texts))
+    print(f"{len(train_texts)} posts, {engagements} engagements, {len(vocab)} words ({len(effect)} with an effect)")
+
+    model_path = str(db_path) + ".reward"
+    start = time.perf_counter()
+    model = RewardModel.open(model_path, db_path, user="averagefrench")
+    print(f"cold train (3 epochs)          {time.perf_counter() - start:7.2f}s")
+    start = time.perf_counter()
+    model.train(model.examples.values(), epochs=5)
+    print(f"5 more epochs over all posts   {time.perf_counter() - start:7.2f}s")
+    model.save()
+
+    sample = rng.sample(list(zip(post_ids, train_texts)), 100)
+    added = engage(sample)
+    start = time.perf_counter()
+    model = RewardModel.open(model_path, db_path, user="averagefrench")
+    print(f"reload + refresh ({added} new engagements on 100 posts) {time.perf_counter() - start:.3f}s")
+
+    start = time.perf_counter()
+    scores = model.score_many(candidates)
+    elapsed = time.perf_counter() - start
+    print(f"scoring                        {elapsed / len(candidates) * 1000 * 1000:7.1f} ms per 1k candidates")
+
+    truth = [quality(t) for t in candidates]
+    pairs = [(i, j) for i, j in (rng.sample(range(len(candidates)), 2) for _ in range(20000)) if truth[i] != truth[j]]
+    agree = sum((scores[i] > scores[j]) == (truth[i] > truth[j]) for i, j in pairs) / len(pairs)
+    print(f"held-out pairwise ranking accuracy {agree:.1%} (50% = chance)")
+
+    n = args.best_of
+    groups = [rng.sample(range(len(candidates)), n) for _ in range(2000)]
+    random_pick = sum(truth[g[0]] for g in groups) / len(groups)
+    best_pick = sum(truth[max(g, key=lambda i: scores[i])] for g in groups) / len(groups)
+    oracle = sum(max(truth[i] for i in g) for g in groups) / len(groups)
+    print(f"hidden quality of the kept post, best-of-{n}: random {random_pick:+.2f}, "
+          f"model {best_pick:+.2f}, oracle {oracle:+.2f}")
+    conn.close()
+    app.db_pool.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+src/bandit.py against simulated strategies with known engagement rates, on
+a scratch blog database:
+
+    python bench/strategy_bandit.py --rounds 200 --posts 10
+
+Each round the bandit allocates --posts posts between the arms, the posts
+are written with their strategy, and each gets net positive engagement
+with its arm's hidden probability. Reports how traffic shifts to the best
+arm, engaged posts vs splitting evenly and vs always using the best arm,
+and what refresh() costs as the table grows.
+"""
+
+import argparse
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fixtures import load_app
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / "src"))
+from bandit import StrategyBandit
+
+RATES = {"observations": 0.30, "poetry": 0.40, "questions": 0.20, "confessions": 0.35, "observations-5gen": 0.25}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--posts", type=int, default=10, help="posts per round")
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    db_path = Path(tempfile.mkdtemp(prefix="bandit_")) / "tweets.db"
+    app = load_app(db_path)
+    conn = sqlite3.connect(str(db_path))
+    bandit = StrategyBandit(RATES, user="averagefrench", min_age=0, horizon=10**9, seed=0)
+    best = max(RATES, key=RATES.get)
+
+    engaged, best_share, refresh_ms = 0, [], []
+    now = int(time.time()) - 60
+    for r in range(args.rounds):
+        start = time.perf_counter()
+        bandit.refresh(db_path)
+        refresh_ms.append((time.perf_counter() - start) * 1000)
+        allocation = bandit.allocate(args.posts)
+        best_share.append(allocation[best] / args.posts)
+        for arm, n in allocation.items():
+            for _ in range(n):
+                cur = conn.execute("INSERT INTO posts (text, user, user_lc, timestamp, ts, strategy) "
+                                   "VALUES (?, 'AverageFrench', 'averagefrench', ?, ?, ?)",
+                                   (f"round {r} {arm}", str(now), now, arm))
+                if rng.random() < RATES[arm]:
+                    engaged += 1
+                    conn.execute("INSERT INTO post_stats (post_id, like_count) VALUES (?, 1)", (cur.lastrowid,))
+        conn.commit()
+
+    total = args.rounds * args.posts
+    uniform = total * sum(RATES.values()) / len(RATES)
+    oracle = total * RATES[best]
+    print(f"{len(RATES)} arms, best {best} ({RATES[best]:.0%}), {args.rounds} rounds x {args.posts} posts")
+    tenth = max(args.rounds // 10, 1)
+    for label, chunk in [("first 10% of rounds", best_share[:tenth]), ("last 10% of rounds", best_share[-tenth:])]:
+        print(f"traffic to the best arm, {label:<20} {sum(chunk) / len(chunk):6.1%}")
+    print(f"engaged posts: bandit {engaged}, even split {uniform:.0f}, always best {oracle:.0f}")
+    print(f"refresh() over {total} tagged posts: mean {sum(refresh_ms) / len(refresh_ms):.2f} ms, "
+          f"last {refresh_ms[-1]:.2f} ms")
+    print("\n" + "\n".join(f"{arm:<20} {posts:5d} posts {wins:5d} engaged  posterior mean {mean:.3f}"
+                           for arm, (posts, wins, mean) in bandit.stats().items()))
+    conn.close()
+    app.db_pool.close()
+
+if __name__ == "__main__":
+    main()
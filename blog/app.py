@@ -1,11 +1,18 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash, abort, make_response, g, has_app_context
 import sqlite3
 import hashlib
 import os
 import time
-from datetime import datetime
 import json
+import queue
+import random
+from datetime import datetime
+from functools import wraps
+from urllib.parse import urlencode
 from config import config
+from db import ConnectionPool
+from events import EventHub
+from cache import MemoryCache, ResponseCache
 
 app = Flask(__name__)
 
@@ -61,20 +68,70 @@ def format_time(timestamp):
 # Database configuration
 DB_PATH = app.config['DB_PATH']
 
+# Per-process connection pool. PRAGMAs run once when a connection is opened;
+# WAL mode (for parallel readers alongside a writer) is set by init_db().
+db_pool = ConnectionPool(
+    DB_PATH,
+    max_size=app.config['DATABASE_POOL_SIZE'],
+    timeout=app.config['DATABASE_TIMEOUT'],
+    cached_statements=app.config['DATABASE_CACHED_STATEMENTS'],
+    pragmas=app.config['DATABASE_PRAGMAS']
+)
+
+# Change feed behind /api/stream. Writes made here poke it; writes from other
+# processes (the agent, 4_online.py) are noticed through PRAGMA data_version.
+event_hub = EventHub(
+    DB_PATH,
+    poll_interval=app.config['EVENTS_POLL_INTERVAL'],
+    timeout=app.config['DATABASE_TIMEOUT']
+)
+
+# Rendered pages for logged-out visitors. Write paths below invalidate it
+# directly; writes from other processes (e.g. the agent's bulk inserts)
+# invalidate it through the event hub's 'changed' events.
+response_cache = ResponseCache(
+    MemoryCache(max_entries=app.config['RESPONSE_CACHE_MAX_ENTRIES']),
+    ttl=app.config['RESPONSE_CACHE_TTL']
+)
+
+def invalidate_on_change(event, data):
+    if event == 'changed':
+        response_cache.invalidate()
+
+event_hub.add_listener(invalidate_on_change)
+
 def get_db_connection():
-    """Get database connection with WAL mode enabled for parallel writes"""
-    conn = sqlite3.connect(DB_PATH, timeout=app.config['DATABASE_TIMEOUT'])
-    conn.execute('PRAGMA journal_mode=WAL')
-    conn.execute('PRAGMA synchronous=NORMAL')
-    conn.execute('PRAGMA cache_size=10000')
-    conn.execute('PRAGMA temp_store=MEMORY')
-    return conn
+    """Get a pooled database connection.
+    
+    Within a request every call returns the same connection, which goes back
+    to the pool (with uncommitted work rolled back) when the request ends;
+    close() on it only discards uncommitted work. Outside a request, close()
+    returns the connection to the pool.
+    """
+    if not has_app_context():
+        return db_pool.acquire()
+    
+    if 'db' not in g:
+        g.db = db_pool.acquire()
+        g.db.pinned = True
+    return g.db
+
+@app.teardown_appcontext
+def release_db_connection(exception):
+    """Return the request's connection to the pool"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        db_pool.release(conn)
 
 def init_db():
     """Initialize database tables if they don't exist"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
+    # WAL is a property of the database file, so switch it once here rather
+    # than on every connection (switching needs the database to itself)
+    cursor.execute('PRAGMA journal_mode=WAL')
+    
     # Create users table if it doesn't exist
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -90,6 +147,18 @@ def init_db():
         )
     ''')
     
+    # Create posts table if it doesn't exist (normally created by the agent)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS posts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT,
+            user TEXT,
+            timestamp TEXT,
+            ts INTEGER,
+            user_lc TEXT
+        )
+    ''')
+    
     # Create new engagements table for likes and replies
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS new_engagements (
@@ -105,6 +174,12 @@ def init_db():
         )
     ''')
     
+    # Also serves the newest-first per-post lookups in get_aggregated_notifications(); it
+    # replaces the narrower idx_new_engagements_post (post_id, type)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_new_engagements_post_recent '
+                   'ON new_engagements (post_id, type, created_at)')
+    cursor.execute('DROP INDEX IF EXISTS idx_new_engagements_post')
+    
     # Create notifications table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS notifs (
@@ -118,6 +193,8 @@ def init_db():
         )
     ''')
     
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_notifs_user ON notifs (user_id, created_at)')
+    
     # Add new columns to existing users table if they don't exist
     try:
         cursor.execute('ALTER TABLE users ADD COLUMN display_name TEXT')
@@ -155,9 +232,206 @@ def init_db():
     except sqlite3.OperationalError:
         pass  # Index already exists
     
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_username_nocase ON users (username COLLATE NOCASE)')
+
+    # Integer epoch timestamp for posts. Legacy writers only set the TEXT
+    # timestamp column, so a trigger fills ts in for them.
+    try:
+        cursor.execute('ALTER TABLE posts ADD COLUMN ts INTEGER')
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+    
+    # Databases migrated before agent rows were told apart have an older
+    # trigger, and their agent rows' ts was shifted by the UTC offset as if
+    # it were local time. Put those back once and replace the trigger.
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_posts_ts'")
+    row = cursor.fetchone()
+    if row and 'NEW.user IS NULL' not in row[0]:
+        cursor.execute('DROP TRIGGER trg_posts_ts')
+        cursor.execute('''
+            UPDATE posts SET ts = CAST(strftime('%s', timestamp) AS INTEGER)
+            WHERE user IS NULL AND timestamp GLOB '[0-9][0-9][0-9][0-9]-*'
+              AND ts = CAST(strftime('%s', timestamp, 'utc') AS INTEGER)
+        ''')
+    
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_posts_ts AFTER INSERT ON posts
+        WHEN NEW.ts IS NULL
+        BEGIN
+            UPDATE posts
+            SET ts = COALESCE({TIMESTAMP_TO_EPOCH_SQL.format(col='NEW.timestamp', user='NEW.user')}, CAST(strftime('%s', 'now') AS INTEGER))
+            WHERE id = NEW.id;
+        END
+    ''')
+    
+    # Lowercased author for case insensitive lookups. Joins to users compare it
+    # with COLLATE NOCASE so they can use idx_users_username_nocase.
+    try:
+        cursor.execute('ALTER TABLE posts ADD COLUMN user_lc TEXT')
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+    
+    # The first version of this trigger left user_lc NULL for userless (agent)
+    # rows, unlike the backfill. Replace it; the backfill below fills the rows
+    # it missed.
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_posts_user_lc'")
+    row = cursor.fetchone()
+    if row and 'COALESCE' not in row[0]:
+        cursor.execute('DROP TRIGGER trg_posts_user_lc')
+    
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_posts_user_lc AFTER INSERT ON posts
+        WHEN NEW.user_lc IS NULL
+        BEGIN
+            UPDATE posts SET user_lc = LOWER(COALESCE(NEW.user, '')) WHERE id = NEW.id;
+        END
+    ''')
+    
+    # Which posting strategy (bandit arm) generated a post; NULL for everything else
+    try:
+        cursor.execute('ALTER TABLE posts ADD COLUMN strategy TEXT')
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+    
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_posts_ts ON posts (ts)')
+    cursor.execute('DROP INDEX IF EXISTS idx_posts_user_ts')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_posts_user_lc_ts ON posts (user_lc, ts)')
+    
     conn.commit()
+    backfill_posts(conn, 'ts', f"COALESCE({TIMESTAMP_TO_EPOCH_SQL.format(col='timestamp', user='user')}, 0)")
+    backfill_posts(conn, 'user_lc', "LOWER(COALESCE(user, ''))")
+    
+    # Create materialized engagement counters, backfilled on first creation.
+    # They're only kept in step by writes through this app; anything that
+    # writes new_engagements directly (a script, a restored backup) leaves
+    # them stale. Startup compares their totals with new_engagements and
+    # rebuilds on a mismatch; `flask rebuild-stats` forces a rebuild.
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'post_stats'")
+    post_stats_exists = cursor.fetchone() is not None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS post_stats (
+            post_id INTEGER PRIMARY KEY,
+            like_count INTEGER NOT NULL DEFAULT 0,
+            reply_count INTEGER NOT NULL DEFAULT 0,
+            clanked_count INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (post_id) REFERENCES posts (id)
+        )
+    ''')
+
+    conn.commit()
+
+    if not post_stats_exists:
+        rebuild_post_stats(conn)
+    elif post_stats_drifted(conn):
+        print('post_stats totals differ from new_engagements; rebuilding')
+        rebuild_post_stats(conn)
+
     conn.close()
 
+# Converts a posts.timestamp value (with the row's user) to epoch seconds.
+# Three formats have been written:
+# - epoch integers stored as text, by everything since posts.ts was added;
+# - naive UTC ISO strings from the old src/agent.py
+#   (datetime.utcnow().isoformat()), which posted without a user;
+# - naive local-time ISO strings from the blog and the old 4_online.py
+#   (datetime.now().isoformat()), always with a user.
+# Local-time strings are read in the timezone of the process running the
+# migration (SQLite's 'utc' modifier follows TZ), which is assumed to be the
+# one the blog wrote them in; run it with that TZ set when migrating a
+# database copied from another machine.
+TIMESTAMP_TO_EPOCH_SQL = '''(CASE
+    WHEN {col} <> '' AND {col} NOT GLOB '*[^0-9]*' THEN CAST({col} AS INTEGER)
+    WHEN {user} IS NULL THEN CAST(strftime('%s', {col}) AS INTEGER)
+    ELSE CAST(strftime('%s', {col}, 'utc') AS INTEGER)
+END)'''
+
+def backfill_posts(conn, column, expression, batch_size=1000):
+    """Fill a derived posts column wherever it is still NULL.
+    
+    Runs in small batches, committing after each one, so the agent and other
+    writers are never locked out for long while a large table is migrated.
+    The expression must never evaluate to NULL.
+    """
+    cursor = conn.cursor()
+    total = 0
+    while True:
+        cursor.execute(f'''
+            UPDATE posts
+            SET {column} = {expression}
+            WHERE id IN (SELECT id FROM posts WHERE {column} IS NULL LIMIT ?)
+        ''', (batch_size,))
+        conn.commit()
+        if cursor.rowcount == 0:
+            return total
+        total += cursor.rowcount
+
+# Engagement type -> post_stats counter column
+POST_STATS_COLUMNS = {
+    'like': 'like_count',
+    'reply': 'reply_count',
+    'clanked': 'clanked_count'
+}
+
+def rebuild_post_stats(conn):
+    """Recompute post_stats from new_engagements in a single transaction"""
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM post_stats')
+    cursor.execute('''
+        INSERT INTO post_stats (post_id, like_count, reply_count, clanked_count)
+        SELECT post_id,
+               SUM(type = 'like'),
+               SUM(type = 'reply'),
+               SUM(type = 'clanked')
+        FROM new_engagements
+        GROUP BY post_id
+    ''')
+    conn.commit()
+    return cursor.rowcount
+
+def post_stats_drifted(conn):
+    """Whether post_stats' per-type totals differ from new_engagements.
+    
+    Compares totals only, so a per-post error that cancels out elsewhere
+    goes unnoticed; it catches rows added or removed behind the app's back.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT COALESCE(SUM(like_count), 0), COALESCE(SUM(reply_count), 0), COALESCE(SUM(clanked_count), 0)
+        FROM post_stats
+    ''')
+    counters = cursor.fetchone()
+    cursor.execute('''
+        SELECT COALESCE(SUM(type = 'like'), 0), COALESCE(SUM(type = 'reply'), 0), COALESCE(SUM(type = 'clanked'), 0)
+        FROM new_engagements
+    ''')
+    return counters != cursor.fetchone()
+
+def update_post_stats(cursor, post_id, engagement_type, delta):
+    """Adjust a post's engagement counter inside the caller's transaction"""
+    update_post_stats_many(cursor, [(post_id, engagement_type)], delta)
+
+def update_post_stats_many(cursor, engagements, delta):
+    """Adjust counters for many (post_id, engagement_type) pairs inside the caller's transaction"""
+    by_type = {}
+    for post_id, engagement_type in engagements:
+        by_type.setdefault(engagement_type, []).append((post_id, delta, delta))
+    
+    for engagement_type, params in by_type.items():
+        column = POST_STATS_COLUMNS[engagement_type]
+        cursor.executemany(f'''
+            INSERT INTO post_stats (post_id, {column}) VALUES (?, MAX(?, 0))
+            ON CONFLICT (post_id) DO UPDATE SET {column} = MAX({column} + ?, 0)
+        ''', params)
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Backfill or rebuild the post_stats table from new_engagements"""
+    init_db()
+    conn = get_db_connection()
+    rows = rebuild_post_stats(conn)
+    conn.close()
+    print(f'Rebuilt post_stats for {rows} posts')
+
 def hash_password(password):
     """Hash password using SHA-256"""
     return hashlib.sha256(password.encode()).hexdigest()
@@ -166,26 +440,179 @@ def verify_password(password, password_hash):
     """Verify password against hash"""
     return hash_password(password) == password_hash
 
-def create_notification(user_id, typ, obj_id):
-    """Create a notification for a user"""
-    conn = get_db_connection()
+def encode_cursor(ts, post_id):
+    """Encode a (ts, id) feed position as a ?before= cursor"""
+    return f'{ts}_{post_id}'
+
+def decode_cursor(cursor):
+    """Decode a ?before= cursor into a (ts, id) tuple"""
+    ts, _, post_id = cursor.rpartition('_')
+    if not ts.isdigit() or not post_id.isdigit():
+        raise ValueError(f'Invalid cursor: {cursor}')
+    return int(ts), int(post_id)
+
+def get_page_args():
+    """Read the keyset cursor and page size from the query string"""
+    before = None
+    if request.args.get('before'):
+        try:
+            before = decode_cursor(request.args['before'])
+        except ValueError:
+            abort(400, 'Invalid cursor')
+    
+    limit = request.args.get('limit', app.config['FEED_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, app.config['FEED_MAX_PAGE_SIZE']))
+    return before, limit
+
+def paginate(rows, limit):
+    """Trim a LIMIT limit + 1 result to one page and build the next cursor.
+    
+    Rows must start with (id, text, ts, ...).
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1][2], rows[-1][0])
+
+def render_feed(template, partial, next_cursor, **context):
+    """Render a feed page, or only its posts when fetched for infinite scroll"""
+    if request.args.get('partial'):
+        response = make_response(render_template(partial, **context))
+    else:
+        response = make_response(render_template(template, next_cursor=next_cursor, **context))
+    response.headers['X-Next-Cursor'] = next_cursor or ''
+    return response
+
+def cache_anonymous(view):
+    """Serve logged-out GETs of a page from response_cache, with ETag/304 support"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not app.config['RESPONSE_CACHE_ENABLED'] or 'user_id' in session or '_flashes' in session:
+            return view(*args, **kwargs)
+        
+        event_hub.start()  # Its watcher invalidates on writes from other processes
+        generation = response_cache.generation
+        args_key = urlencode(sorted(request.args.items(multi=True)))
+        key = response_cache.key(generation, request.path, args_key)
+        
+        cached = response_cache.get(key)
+        if cached is None:
+            response = make_response(view(*args, **kwargs))
+            # Only cache plain 200 pages that didn't flash a message
+            if response.status_code != 200 or '_flashes' in session:
+                return response
+            response.add_etag()
+            headers = {'Content-Type': response.headers['Content-Type']}
+            if 'X-Next-Cursor' in response.headers:
+                headers['X-Next-Cursor'] = response.headers['X-Next-Cursor']
+            response_cache.set(key, (response.get_data(), headers, response.get_etag()[0]))
+            response.headers['X-Cache'] = 'MISS'
+        else:
+            body, headers, etag = cached
+            response = app.response_class(body, headers=headers)
+            response.set_etag(etag)
+            response.headers['X-Cache'] = 'HIT'
+        
+        return response.make_conditional(request)
+    return wrapper
+
+def sql_placeholders(values):
+    """Build a "?, ?, ?" placeholder list for an IN (...) clause"""
+    return ', '.join('?' * len(values))
+
+def validate_engagement(item):
+    """Check one engagement from a request body; returns (engagement, error)"""
+    if not isinstance(item, dict):
+        return None, 'Engagement must be an object'
+    
+    post_id = item.get('post_id')
+    engagement_type = item.get('type')
+    if not post_id or not engagement_type:
+        return None, 'post_id and type required'
+    
+    if engagement_type not in POST_STATS_COLUMNS:
+        return None, 'Invalid engagement type'
+    
+    try:
+        post_id = int(post_id)
+    except (TypeError, ValueError):
+        return None, 'Invalid post_id'
+    
+    return {'post_id': post_id, 'type': engagement_type, 'content': item.get('content')}, None
+
+def add_engagements(conn, user_id, engagements):
+    """Write validated engagements, their counters and notifications in one transaction.
+    
+    Returns a (status, body) pair per engagement, in order: 201 with the new
+    id, 404 if the post doesn't exist, or 409 if the user already has that
+    engagement (in the database or earlier in the same batch). Failed items
+    don't stop the rest from being written.
+    """
     cursor = conn.cursor()
+    post_ids = sorted({e['post_id'] for e in engagements})
     
-    # Get the post owner's user_id
-    cursor.execute('SELECT user FROM posts WHERE id = ?', (obj_id,))
-    post = cursor.fetchone()
-    if post:
-        # Get the post owner's user_id from username
-        cursor.execute('SELECT id FROM users WHERE username = ?', (post[0],))
-        post_owner = cursor.fetchone()
-        if post_owner and post_owner[0] != user_id:  # Don't notify yourself
-            cursor.execute('''
-                INSERT INTO notifs (typ, obj_id, user_id) 
+    # Take the write lock up front so the duplicate check and the inserts see the same data
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        # Post owners for notifications (None when the author has no account)
+        cursor.execute(f'''
+            SELECT p.id, u.id FROM posts p
+            LEFT JOIN users u ON u.username = p.user_lc COLLATE NOCASE
+            WHERE p.id IN ({sql_placeholders(post_ids)})
+        ''', post_ids)
+        owners = dict(cursor.fetchall())
+        
+        cursor.execute(f'''
+            SELECT post_id, type FROM new_engagements
+            WHERE user_id = ? AND post_id IN ({sql_placeholders(post_ids)})
+        ''', (user_id, *post_ids))
+        seen = set(cursor.fetchall())
+        
+        results = []
+        accepted = []
+        for engagement in engagements:
+            key = (engagement['post_id'], engagement['type'])
+            if engagement['post_id'] not in owners:
+                results.append((404, {'error': 'Post not found'}))
+            elif key in seen:
+                results.append((409, {'error': 'Engagement already exists'}))
+            else:
+                seen.add(key)
+                accepted.append(engagement)
+                results.append(None)
+        
+        ids = {}
+        if accepted:
+            cursor.executemany('''
+                INSERT INTO new_engagements (user_id, post_id, type, content)
+                VALUES (?, ?, ?, ?)
+            ''', [(user_id, e['post_id'], e['type'], e['content']) for e in accepted])
+            
+            update_post_stats_many(cursor, [(e['post_id'], e['type']) for e in accepted], 1)
+            
+            # Notify post owners, but don't notify yourself
+            cursor.executemany('''
+                INSERT INTO notifs (typ, obj_id, user_id)
                 VALUES (?, ?, ?)
-            ''', (typ, obj_id, post_owner[0]))
-            conn.commit()
-    
-    conn.close()
+            ''', [(e['type'], e['post_id'], owners[e['post_id']]) for e in accepted
+                  if owners[e['post_id']] not in (None, user_id)])
+            
+            accepted_post_ids = sorted({e['post_id'] for e in accepted})
+            cursor.execute(f'''
+                SELECT post_id, type, id FROM new_engagements
+                WHERE user_id = ? AND post_id IN ({sql_placeholders(accepted_post_ids)})
+            ''', (user_id, *accepted_post_ids))
+            ids = {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+        
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    
+    return [
+        result or (201, {'id': ids[(e['post_id'], e['type'])], 'post_id': e['post_id'], 'type': e['type']})
+        for e, result in zip(engagements, results)
+    ]
 
 def get_unread_notification_count(user_id):
     """Get count of unread notifications for a user"""
@@ -203,6 +630,24 @@ def get_unread_notification_count(user_id):
     conn.close()
     return count
 
+def latest_engagements(cursor, post_ids, engagement_type, limit):
+    """(post_id, id, content, user_id) of the newest `limit` engagements of one type on each post, newest first"""
+    if not post_ids:
+        return []
+    cursor.execute(f'''
+        SELECT e.post_id, e.id, e.content, e.user_id
+        FROM posts p
+        JOIN new_engagements e ON e.id IN (
+            SELECT x.id FROM new_engagements x
+            WHERE x.post_id = p.id AND x.type = ?
+            ORDER BY x.created_at DESC, x.id DESC
+            LIMIT ?
+        )
+        WHERE p.id IN ({sql_placeholders(post_ids)})
+        ORDER BY e.post_id, e.created_at DESC, e.id DESC
+    ''', [engagement_type, limit] + post_ids)
+    return cursor.fetchall()
+
 def get_aggregated_notifications(user_id):
     """Get aggregated notifications for a user"""
     conn = get_db_connection()
@@ -211,18 +656,22 @@ def get_aggregated_notifications(user_id):
     try:
         # Get all notifications with user details
         cursor.execute('''
-            SELECT n.id, n.typ, n.obj_id, n.created_at, p.text, p.user, u.display_name, u.profile_image
+            SELECT n.id, n.typ, n.obj_id, n.created_at, p.text, p.user, u.display_name, u.profile_image,
+                   COALESCE(s.like_count, 0)
             FROM notifs n
             JOIN posts p ON n.obj_id = p.id
-            JOIN users u ON p.user = u.username
+            JOIN users u ON u.username = p.user_lc COLLATE NOCASE
+            LEFT JOIN post_stats s ON s.post_id = p.id
             WHERE n.user_id = ?
             ORDER BY n.created_at DESC
             LIMIT 100
         ''', (user_id,))
         
         notifications = []
+        like_counts = {}
         for row in cursor.fetchall():
-            notification = {
+            like_counts[row[2]] = row[8]
+            notifications.append({
                 'id': row[0],
                 'type': row[1],
                 'post_id': row[2],
@@ -231,63 +680,66 @@ def get_aggregated_notifications(user_id):
                 'post_user': row[5],
                 'post_user_display_name': row[6] or row[5],
                 'post_user_profile_image': row[7]
+            })
+        
+        # Like counts come from post_stats above; fetch only the latest reply and
+        # the 5 most recent likers per post, each a short walk of the
+        # (post_id, type, created_at) index
+        reply_post_ids = list({n['post_id'] for n in notifications if n['type'] == 'reply'})
+        like_post_ids = list({n['post_id'] for n in notifications if n['type'] == 'like'})
+        latest_replies = {}
+        for post_id, engagement_id, content, engagement_user_id in latest_engagements(
+                cursor, reply_post_ids, 'reply', 1):
+            latest_replies[post_id] = {
+                'reply_id': engagement_id,
+                'reply_content': content,
+                'reply_user_id': engagement_user_id
             }
-            
-            # For replies, get the actual reply content and ID
-            if row[1] == 'reply':
-                cursor.execute('''
-                    SELECT e.id, e.content, e.user_id
-                    FROM new_engagements e
-                    WHERE e.post_id = ? AND e.type = 'reply'
-                    ORDER BY e.created_at DESC
-                    LIMIT 1
-                ''', (row[2],))
-                reply_data = cursor.fetchone()
-                if reply_data:
-                    notification['reply_id'] = reply_data[0]
-                    notification['reply_content'] = reply_data[1]
-                    notification['reply_user_id'] = reply_data[2]
-            
-            notifications.append(notification)
+        liker_ids_by_post = {}
+        for post_id, _, _, engagement_user_id in latest_engagements(cursor, like_post_ids, 'like', 5):
+            liker_ids_by_post.setdefault(post_id, []).append(engagement_user_id)
+        
+        # Get liker details for all posts at once
+        likers = {}
+        liker_ids = list({uid for ids in liker_ids_by_post.values() for uid in ids})
+        if liker_ids:
+            cursor.execute(f'''
+                SELECT id, username, display_name, profile_image
+                FROM users WHERE id IN ({sql_placeholders(liker_ids)})
+            ''', liker_ids)
+            for row in cursor.fetchall():
+                likers[row[0]] = {
+                    'username': row[1],
+                    'display_name': row[2] or row[1],
+                    'profile_image': row[3]
+                }
+        likers_by_post = {
+            post_id: [likers[uid] for uid in ids if uid in likers]
+            for post_id, ids in liker_ids_by_post.items()
+        }
+        
+        # For replies, attach the actual reply content and ID
+        for notif in notifications:
+            if notif['type'] == 'reply':
+                notif.update(latest_replies.get(notif['post_id'], {}))
         
         # Aggregate likes by post
         aggregated = []
         post_likes = {}
         
         for notif in notifications:
-            if notif['type'] == 'like':
+            if notif['type'] == 'like' and notif['post_id'] not in post_likes:
                 post_id = notif['post_id']
-                if post_id not in post_likes:
-                    post_likes[post_id] = {
-                        'post_id': post_id,
-                        'post_text': notif['post_text'],
-                        'post_user': notif['post_user'],
-                        'post_user_display_name': notif['post_user_display_name'],
-                        'post_user_profile_image': notif['post_user_profile_image'],
-                        'likers': [],
-                        'created_at': notif['created_at']
-                    }
-                
-                # Get liker details
-                cursor.execute('''
-                    SELECT u.username, u.display_name, u.profile_image
-                    FROM new_engagements e
-                    JOIN users u ON e.user_id = u.id
-                    WHERE e.post_id = ? AND e.type = 'like'
-                    ORDER BY e.created_at DESC
-                    LIMIT 5
-                ''', (post_id,))
-                
-                likers = []
-                for liker_row in cursor.fetchall():
-                    likers.append({
-                        'username': liker_row[0],
-                        'display_name': liker_row[1] or liker_row[0],
-                        'profile_image': liker_row[2]
-                    })
-                
-                post_likes[post_id]['likers'] = likers
-                post_likes[post_id]['like_count'] = len(likers)
+                post_likes[post_id] = {
+                    'post_id': post_id,
+                    'post_text': notif['post_text'],
+                    'post_user': notif['post_user'],
+                    'post_user_display_name': notif['post_user_display_name'],
+                    'post_user_profile_image': notif['post_user_profile_image'],
+                    'likers': likers_by_post.get(post_id, []),
+                    'like_count': like_counts.get(post_id, 0),
+                    'created_at': notif['created_at']
+                }
         
         # Convert aggregated likes to notifications
         for post_data in post_likes.values():
@@ -321,59 +773,50 @@ def get_aggregated_notifications(user_id):
         conn.close()
 
 @app.route('/')
+@cache_anonymous
 def home():
     """Home page showing recent posts"""
+    before, limit = get_page_args()
+    
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Get recent posts with user info and engagement counts
-    if session.get('user_id'):
-        cursor.execute('''
-            SELECT 
-                p.id, p.text, p.timestamp,
-                p.user,
-                u.display_name,
-                u.profile_image,
-                u.is_clanker,
-                COUNT(DISTINCT CASE WHEN e.type = 'like' THEN e.id END) as like_count,
-                COUNT(DISTINCT CASE WHEN e.type = 'reply' THEN e.id END) as reply_count,
-                COUNT(DISTINCT CASE WHEN e.type = 'clanked' THEN e.id END) as clanked_count,
-                CASE WHEN user_like.id IS NOT NULL THEN 1 ELSE 0 END as user_liked,
-                CASE WHEN user_clanked.id IS NOT NULL THEN 1 ELSE 0 END as user_clanked
-            FROM posts p
-            LEFT JOIN users u ON LOWER(p.user) = LOWER(u.username)
-            LEFT JOIN new_engagements e ON p.id = e.post_id
-            LEFT JOIN new_engagements user_like ON p.id = user_like.post_id 
-                AND user_like.user_id = ? AND user_like.type = 'like'
-            LEFT JOIN new_engagements user_clanked ON p.id = user_clanked.post_id 
-                AND user_clanked.user_id = ? AND user_clanked.type = 'clanked'
-            GROUP BY p.id
-            ORDER BY p.timestamp DESC
-            LIMIT 20
-        ''', (session['user_id'], session['user_id']))
-    else:
-        cursor.execute('''
-            SELECT 
-                p.id, p.text, p.timestamp,
-                p.user,
-                u.display_name,
-                u.profile_image,
-                u.is_clanker,
-                COUNT(DISTINCT CASE WHEN e.type = 'like' THEN e.id END) as like_count,
-                COUNT(DISTINCT CASE WHEN e.type = 'reply' THEN e.id END) as reply_count,
-                COUNT(DISTINCT CASE WHEN e.type = 'clanked' THEN e.id END) as clanked_count,
-                0 as user_liked,
-                0 as user_clanked
-            FROM posts p
-            LEFT JOIN users u ON LOWER(p.user) = LOWER(u.username)
-            LEFT JOIN new_engagements e ON p.id = e.post_id
-            GROUP BY p.id
-            ORDER BY p.timestamp DESC
-            LIMIT 20
-        ''')
+    # Get a page of recent posts with user info and engagement counts. The page
+    # is picked first so counters and like status are only looked up for it.
+    user_id = session.get('user_id')
+    where, params = '', ()
+    if before:
+        where, params = 'WHERE (ts, id) < (?, ?)', before
+    
+    cursor.execute(f'''
+        SELECT 
+            p.id, p.text, p.ts,
+            p.user,
+            u.display_name,
+            u.profile_image,
+            u.is_clanker,
+            COALESCE(s.like_count, 0) as like_count,
+            COALESCE(s.reply_count, 0) as reply_count,
+            COALESCE(s.clanked_count, 0) as clanked_count,
+            EXISTS (SELECT 1 FROM new_engagements e
+                    WHERE e.post_id = p.id AND e.user_id = ? AND e.type = 'like') as user_liked,
+            EXISTS (SELECT 1 FROM new_engagements e
+                    WHERE e.post_id = p.id AND e.user_id = ? AND e.type = 'clanked') as user_clanked
+        FROM (
+            SELECT id, text, ts, user, user_lc FROM posts
+            {where}
+            ORDER BY ts DESC, id DESC
+            LIMIT ?
+        ) p
+        LEFT JOIN users u ON u.username = p.user_lc COLLATE NOCASE
+        LEFT JOIN post_stats s ON s.post_id = p.id
+        ORDER BY p.ts DESC, p.id DESC
+    ''', (user_id, user_id, *params, limit + 1))
+    
+    rows, next_cursor = paginate(cursor.fetchall(), limit)
     
     posts = []
-    for row in cursor.fetchall():
+    for row in rows:
         posts.append({
             'id': row[0],
             'content': row[1],
@@ -393,14 +836,18 @@ def home():
     
     # Get notification count for logged in user
     notification_count = 0
-    if session.get('user_id'):
+    if session.get('user_id') and not request.args.get('partial'):
         notification_count = get_unread_notification_count(session['user_id'])
     
-    return render_template('home.html', posts=posts, notification_count=notification_count)
+    return render_feed('home.html', 'home_posts.html', next_cursor,
+                       posts=posts, notification_count=notification_count)
 
 @app.route('/u/<username>')
+@cache_anonymous
 def user_profile(username):
     """User profile page showing their posts"""
+    before, limit = get_page_args()
+    
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -427,40 +874,30 @@ def user_profile(username):
         'is_clanker': bool(user[7])
     }
     
-    # Get user's posts with engagement counts and like status (case insensitive)
-    if session.get('user_id'):
-        cursor.execute('''
-            SELECT 
-                p.id, p.text, p.timestamp,
-                COUNT(DISTINCT CASE WHEN e.type = 'like' THEN e.id END) as like_count,
-                COUNT(DISTINCT CASE WHEN e.type = 'reply' THEN e.id END) as reply_count,
-                COUNT(DISTINCT CASE WHEN e.type = 'clanked' THEN e.id END) as clanked_count,
-                CASE WHEN user_like.id IS NOT NULL THEN 1 ELSE 0 END as user_liked
-            FROM posts p
-            LEFT JOIN new_engagements e ON p.id = e.post_id
-            LEFT JOIN new_engagements user_like ON p.id = user_like.post_id 
-                AND user_like.user_id = ? AND user_like.type = 'like'
-            WHERE UPPER(p.user) = UPPER(?)
-            GROUP BY p.id
-            ORDER BY p.timestamp DESC
-        ''', (session['user_id'], username))
-    else:
-        cursor.execute('''
-            SELECT 
-                p.id, p.text, p.timestamp,
-                COUNT(DISTINCT CASE WHEN e.type = 'like' THEN e.id END) as like_count,
-                COUNT(DISTINCT CASE WHEN e.type = 'reply' THEN e.id END) as reply_count,
-                COUNT(DISTINCT CASE WHEN e.type = 'clanked' THEN e.id END) as clanked_count,
-                0 as user_liked
-            FROM posts p
-            LEFT JOIN new_engagements e ON p.id = e.post_id
-            WHERE UPPER(p.user) = UPPER(?)
-            GROUP BY p.id
-            ORDER BY p.timestamp DESC
-        ''', (username,))
+    # Get a page of the user's posts with engagement counts and like status (case insensitive)
+    where, params = '', ()
+    if before:
+        where, params = 'AND (p.ts, p.id) < (?, ?)', before
+    
+    cursor.execute(f'''
+        SELECT 
+            p.id, p.text, p.ts,
+            COALESCE(s.like_count, 0) as like_count,
+            COALESCE(s.reply_count, 0) as reply_count,
+            COALESCE(s.clanked_count, 0) as clanked_count,
+            EXISTS (SELECT 1 FROM new_engagements e
+                    WHERE e.post_id = p.id AND e.user_id = ? AND e.type = 'like') as user_liked
+        FROM posts p
+        LEFT JOIN post_stats s ON s.post_id = p.id
+        WHERE p.user_lc = LOWER(?) {where}
+        ORDER BY p.ts DESC, p.id DESC
+        LIMIT ?
+    ''', (session.get('user_id'), username, *params, limit + 1))
+    
+    rows, next_cursor = paginate(cursor.fetchall(), limit)
     
     posts = []
-    for row in cursor.fetchall():
+    for row in rows:
         posts.append({
             'id': row[0],
             'content': row[1],
@@ -472,11 +909,18 @@ def user_profile(username):
             'is_clanker': user_data['is_clanker']  # Use the user's clanker status for all their posts
         })
     
+    # Total post count for the profile header (only needed on the first render)
+    if not request.args.get('partial'):
+        cursor.execute('SELECT COUNT(*) FROM posts WHERE user_lc = LOWER(?)', (username,))
+        user_data['post_count'] = cursor.fetchone()[0]
+    
     conn.close()
     
-    return render_template('profile.html', user=user_data, posts=posts)
+    return render_feed('profile.html', 'profile_posts.html', next_cursor,
+                       user=user_data, posts=posts)
 
 @app.route('/t/<int:post_id>')
+@cache_anonymous
 def post_detail(post_id):
     """Individual post page with replies"""
     conn = get_db_connection()
@@ -485,11 +929,11 @@ def post_detail(post_id):
     # Get post details with user info and like status
     if session.get('user_id'):
         cursor.execute('''
-            SELECT p.id, p.text, p.timestamp, p.user, u.display_name, u.profile_image, u.is_clanker,
+            SELECT p.id, p.text, p.ts, p.user, u.display_name, u.profile_image, u.is_clanker,
                    CASE WHEN user_like.id IS NOT NULL THEN 1 ELSE 0 END as user_liked,
                    CASE WHEN user_clanked.id IS NOT NULL THEN 1 ELSE 0 END as user_clanked
             FROM posts p
-            LEFT JOIN users u ON LOWER(p.user) = LOWER(u.username)
+            LEFT JOIN users u ON u.username = p.user_lc COLLATE NOCASE
             LEFT JOIN new_engagements user_like ON p.id = user_like.post_id 
                 AND user_like.user_id = ? AND user_like.type = 'like'
             LEFT JOIN new_engagements user_clanked ON p.id = user_clanked.post_id 
@@ -498,10 +942,10 @@ def post_detail(post_id):
         ''', (session['user_id'], session['user_id'], post_id))
     else:
         cursor.execute('''
-            SELECT p.id, p.text, p.timestamp, p.user, u.display_name, u.profile_image, u.is_clanker,
+            SELECT p.id, p.text, p.ts, p.user, u.display_name, u.profile_image, u.is_clanker,
                    0 as user_liked, 0 as user_clanked
             FROM posts p
-            LEFT JOIN users u ON LOWER(p.user) = LOWER(u.username)
+            LEFT JOIN users u ON u.username = p.user_lc COLLATE NOCASE
             WHERE p.id = ?
         ''', (post_id,))
     
@@ -531,18 +975,11 @@ def post_detail(post_id):
     
     # Get like and clanked counts
     cursor.execute('''
-        SELECT COUNT(*) FROM new_engagements 
-        WHERE post_id = ? AND type = 'like'
-    ''', (post_id,))
-    
-    like_count = cursor.fetchone()[0]
-    
-    cursor.execute('''
-        SELECT COUNT(*) FROM new_engagements 
-        WHERE post_id = ? AND type = 'clanked'
+        SELECT like_count, clanked_count FROM post_stats
+        WHERE post_id = ?
     ''', (post_id,))
     
-    clanked_count = cursor.fetchone()[0]
+    like_count, clanked_count = cursor.fetchone() or (0, 0)
     
     conn.close()
     
@@ -588,6 +1025,7 @@ def register():
             cursor.execute('INSERT INTO users (username, password_hash) VALUES (?, ?)', 
                          (username, password_hash))
             conn.commit()
+            response_cache.invalidate()
             flash('Registration successful! Please login.')
             return redirect(url_for('login'))
         except sqlite3.IntegrityError:
@@ -658,6 +1096,7 @@ def edit_profile():
         ''', (display_name, bio, profile_image, session['user_id']))
         
         conn.commit()
+        response_cache.invalidate()
         conn.close()
         
         flash('Profile updated successfully!')
@@ -719,6 +1158,7 @@ def clear_notifications():
             WHERE id = ?
         ''', (max_id, session['user_id']))
         conn.commit()
+        event_hub.publish('notifications', {'user_ids': [session['user_id']]})
     
     conn.close()
     return jsonify({'success': True})
@@ -732,6 +1172,67 @@ def api_notification_count():
     count = get_unread_notification_count(session['user_id'])
     return jsonify({'count': count})
 
+def sse_event(event, data):
+    """Format one server-sent event"""
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+@app.route('/api/stream')
+def api_stream():
+    """Server-sent events: new posts for everyone, unread counts for the logged in user"""
+    user_id = session.get('user_id')
+    keepalive = app.config['EVENTS_KEEPALIVE']
+    
+    # Each stream holds this thread until it ends; past the per-process limit
+    # the client gets only a longer retry delay and reconnects later.
+    subscription = event_hub.subscribe(limit=app.config['EVENTS_MAX_STREAMS'])
+    if subscription is None:
+        response = app.response_class(f"retry: {app.config['EVENTS_BUSY_RETRY']}\n\n",
+                                      mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    # Streams end after a jittered lifetime, so threads free up and reconnects don't bunch up
+    deadline = time.monotonic() + app.config['EVENTS_MAX_AGE'] * random.uniform(0.8, 1.0)
+    
+    # The generator runs after the request context is gone, so every count
+    # below checks a connection out of the pool and returns it straight away
+    # instead of pinning one for the life of the stream.
+    def stream():
+        try:
+            yield f"retry: {app.config['EVENTS_RETRY']}\n\n"
+            if user_id:
+                yield sse_event('notifications', {'count': get_unread_notification_count(user_id)})
+            
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    event, data = subscription.get(timeout=min(keepalive, remaining))
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                
+                if event == 'posts':
+                    yield sse_event('posts', {'count': data['count']})
+                elif event == 'notifications' and user_id in data['user_ids']:
+                    yield sse_event('notifications', {'count': get_unread_notification_count(user_id)})
+        finally:
+            event_hub.unsubscribe(subscription)
+    
+    response = app.response_class(stream(), mimetype='text/event-stream')
+    # Also covers a client that goes away before the body is started
+    response.call_on_close(lambda: event_hub.unsubscribe(subscription))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer the stream
+    return response
+
+@app.route('/api/cache-stats')
+def api_cache_stats():
+    """Response cache hit/miss counters (debug mode only)"""
+    if not app.config['DEBUG']:
+        abort(404)
+    return jsonify(response_cache.stats())
+
 @app.route('/api/toggle-clanker', methods=['POST'])
 def api_toggle_clanker():
     """Toggle clanker status for current user"""
@@ -754,6 +1255,7 @@ def api_toggle_clanker():
         new_status = not current_status[0]
         cursor.execute('UPDATE users SET is_clanker = ? WHERE id = ?', (new_status, session['user_id']))
         conn.commit()
+        response_cache.invalidate()
         
         conn.close()
         return jsonify({'is_clanker': new_status})
@@ -785,11 +1287,14 @@ def create_post():
     username = session.get('username')
     
     # Insert into existing posts table
-    cursor.execute('INSERT INTO posts (text, user, timestamp) VALUES (?, ?, ?)', 
-                  (content, username, datetime.now().isoformat()))
+    now = int(time.time())
+    cursor.execute('INSERT INTO posts (text, user, user_lc, timestamp, ts) VALUES (?, ?, LOWER(?), ?, ?)', 
+                  (content, username, username, str(now), now))
     conn.commit()
+    response_cache.invalidate()
     post_id = cursor.lastrowid
     conn.close()
+    event_hub.poke()
     
     flash('Post created successfully!')
     return redirect(url_for('home'))
@@ -824,6 +1329,7 @@ def api_users():
             cursor.execute('INSERT INTO users (username, password_hash) VALUES (?, ?)', 
                          (username, password_hash))
             conn.commit()
+            response_cache.invalidate()
             user_id = cursor.lastrowid
             conn.close()
             return jsonify({'id': user_id, 'username': username}), 201
@@ -835,17 +1341,32 @@ def api_users():
 def api_posts():
     """API endpoint for posts CRUD"""
     if request.method == 'GET':
+        before, limit = get_page_args()
+        where, params = '', ()
+        if before:
+            where, params = 'WHERE (p.ts, p.id) < (?, ?)', before
+        
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT p.id, p.text, p.timestamp, p.user
+        cursor.execute(f'''
+            SELECT p.id, p.text, p.ts, p.user
             FROM posts p
-            ORDER BY p.timestamp DESC
-        ''')
-        posts = [{'id': row[0], 'content': row[1], 'created_at': row[2], 'username': row[3]} 
-                for row in cursor.fetchall()]
+            {where}
+            ORDER BY p.ts DESC, p.id DESC
+            LIMIT ?
+        ''', (*params, limit + 1))
+        rows, next_cursor = paginate(cursor.fetchall(), limit)
+        # created_at keeps the naive local ISO format the API has always returned;
+        # ts is the same instant as epoch seconds
+        posts = [{'id': row[0], 'content': row[1], 'created_at': datetime.fromtimestamp(row[2]).isoformat(),
+                  'ts': row[2], 'username': row[3]}
+                for row in rows]
         conn.close()
-        return jsonify(posts)
+        
+        # The body stays a plain array; the next page is advertised in a header
+        response = jsonify(posts)
+        response.headers['X-Next-Cursor'] = next_cursor or ''
+        return response
     
     elif request.method == 'POST':
         if 'user_id' not in session:
@@ -859,11 +1380,14 @@ def api_posts():
         
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute('INSERT INTO posts (text, user, timestamp) VALUES (?, ?, ?)', 
-                      (content, session['username'], datetime.now().isoformat()))
+        now = int(time.time())
+        cursor.execute('INSERT INTO posts (text, user, user_lc, timestamp, ts) VALUES (?, ?, LOWER(?), ?, ?)', 
+                      (content, session['username'], session['username'], str(now), now))
         conn.commit()
+        response_cache.invalidate()
         post_id = cursor.lastrowid
         conn.close()
+        event_hub.poke()
         
         return jsonify({'id': post_id, 'content': content}), 201
 
@@ -894,36 +1418,59 @@ def api_engagements():
         if 'user_id' not in session:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        data = request.get_json()
-        post_id = data.get('post_id')
-        engagement_type = data.get('type')
-        content = data.get('content')
+        engagement, error = validate_engagement(request.get_json())
+        if error:
+            return jsonify({'error': error}), 400
         
-        if not post_id or not engagement_type:
-            return jsonify({'error': 'post_id and type required'}), 400
+        conn = get_db_connection()
+        status, body = add_engagements(conn, session['user_id'], [engagement])[0]
+        conn.close()
         
-        if engagement_type not in ['like', 'reply', 'clanked']:
-            return jsonify({'error': 'Invalid engagement type'}), 400
+        if status != 201:
+            return jsonify(body), status
         
+        event_hub.poke()  # Post owner may have a new notification
+        response_cache.invalidate()
+        return jsonify({'id': body['id'], 'type': body['type']}), 201
+
+@app.route('/api/engagements/batch', methods=['POST'])
+def api_engagements_batch():
+    """Create many engagements in one transaction, with a result per item"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('engagements')
+    if not isinstance(data, list) or not data:
+        return jsonify({'error': 'Expected a non-empty array of engagements'}), 400
+    
+    max_batch = app.config['ENGAGEMENT_BATCH_MAX']
+    if len(data) > max_batch:
+        return jsonify({'error': f'At most {max_batch} engagements per batch'}), 400
+    
+    results = [None] * len(data)
+    valid = []
+    for index, item in enumerate(data):
+        engagement, error = validate_engagement(item)
+        if error:
+            results[index] = {'status': 400, 'error': error}
+        else:
+            valid.append((index, engagement))
+    
+    if valid:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute('''
-                INSERT INTO new_engagements (user_id, post_id, type, content)
-                VALUES (?, ?, ?, ?)
-            ''', (session['user_id'], post_id, engagement_type, content))
-            conn.commit()
-            engagement_id = cursor.lastrowid
-            conn.close()
-            
-            # Create notification for the post owner
-            create_notification(session['user_id'], engagement_type, post_id)
-            
-            return jsonify({'id': engagement_id, 'type': engagement_type}), 201
-        except sqlite3.IntegrityError:
-            conn.close()
-            return jsonify({'error': 'Engagement already exists'}), 409
+        written = add_engagements(conn, session['user_id'], [e for _, e in valid])
+        conn.close()
+        for (index, _), (status, body) in zip(valid, written):
+            results[index] = {'status': status, **body}
+    
+    created = sum(1 for result in results if result['status'] == 201)
+    if created:
+        event_hub.poke()
+        response_cache.invalidate()
+    
+    return jsonify({'created': created, 'results': results})
 
 @app.route('/api/engagements/<int:engagement_id>', methods=['DELETE'])
 def api_delete_engagement(engagement_id):
@@ -935,7 +1482,7 @@ def api_delete_engagement(engagement_id):
     cursor = conn.cursor()
     
     # Check if user owns this engagement
-    cursor.execute('SELECT user_id FROM new_engagements WHERE id = ?', (engagement_id,))
+    cursor.execute('SELECT user_id, post_id, type FROM new_engagements WHERE id = ?', (engagement_id,))
     engagement = cursor.fetchone()
     
     if not engagement:
@@ -947,7 +1494,9 @@ def api_delete_engagement(engagement_id):
         return jsonify({'error': 'Not authorized'}), 403
     
     cursor.execute('DELETE FROM new_engagements WHERE id = ?', (engagement_id,))
+    update_post_stats(cursor, engagement[1], engagement[2], -1)
     conn.commit()
+    response_cache.invalidate()
     conn.close()
     
     return jsonify({'success': True})
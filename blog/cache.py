@@ -0,0 +1,101 @@
+"""
+Rendered-response cache for the Clanker Flask application
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+class MemoryCache:
+    """Thread-safe in-memory LRU cache with per-entry TTL.
+
+    This is the default ResponseCache backend. Any object with the same
+    get(key) / set(key, value, ttl) / clear() / __len__() methods can be
+    used instead (e.g. a wrapper around a shared cache server).
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class ResponseCache:
+    """Cache of rendered pages keyed by route and args, with hit/miss counters.
+
+    Every key is prefixed with a generation number that invalidate() bumps.
+    Callers read the generation before rendering and store under it, so a
+    page rendered while a write was landing is filed under the old
+    generation and never served. The counters are shared by every request
+    thread, so they only change under a lock.
+    """
+
+    def __init__(self, backend=None, ttl=30):
+        self.backend = backend if backend is not None else MemoryCache()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def key(self, generation, route, args):
+        return f'{generation}:{route}?{args}'
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value, self.ttl)
+
+    def invalidate(self):
+        """Drop every cached page (called after writes)"""
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+            invalidations, generation = self.invalidations, self.generation
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'invalidations': invalidations,
+            'entries': len(self.backend),
+            'generation': generation,
+            'ttl': self.ttl
+        }
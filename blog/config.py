@@ -3,7 +3,7 @@ import os
 class Config:
     """Base configuration class"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key-change-in-production'
-    DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'tweets.db')
+    DB_PATH = os.environ.get('CLANKER_DB_PATH') or os.path.join(os.path.dirname(__file__), '..', 'data', 'tweets.db')
     
     # Flask settings
     DEBUG = False
@@ -11,6 +11,39 @@ class Config:
     
     # Database settings
     DATABASE_TIMEOUT = 20.0
+    DATABASE_POOL_SIZE = 16
+    DATABASE_CACHED_STATEMENTS = 256
+    # Run on every new connection. journal_mode=WAL is persistent in the
+    # database file, so init_db() sets it once instead; synchronous=NORMAL is
+    # durable across processes in WAL mode (only a power loss can drop the
+    # last commits).
+    DATABASE_PRAGMAS = ['synchronous=NORMAL', 'cache_size=10000', 'temp_store=MEMORY']
+    
+    # Feed pagination settings
+    FEED_PAGE_SIZE = 20
+    FEED_MAX_PAGE_SIZE = 100
+    
+    # Most engagements accepted by one POST /api/engagements/batch
+    ENGAGEMENT_BATCH_MAX = 500
+    
+    # Live updates (/api/stream) settings
+    EVENTS_POLL_INTERVAL = 1.0  # Seconds between PRAGMA data_version checks
+    EVENTS_KEEPALIVE = 15.0  # Seconds between SSE keepalive comments
+    # An open stream holds a server thread for its whole life, so each process
+    # serves at most EVENTS_MAX_STREAMS at once (half of gunicorn's threads by
+    # default, leaving the rest for page views) and ends each one after about
+    # EVENTS_MAX_AGE seconds; the browser reconnects after EVENTS_RETRY ms, or
+    # EVENTS_BUSY_RETRY ms when it was turned away at the limit.
+    EVENTS_MAX_STREAMS = int(os.environ.get('CLANKER_MAX_STREAMS')
+                             or max(int(os.environ.get('CLANKER_THREADS', 8)) // 2, 1))
+    EVENTS_MAX_AGE = 300.0
+    EVENTS_RETRY = 5000
+    EVENTS_BUSY_RETRY = 30000
+    
+    # Response cache for logged-out page views
+    RESPONSE_CACHE_ENABLED = True
+    RESPONSE_CACHE_TTL = 30  # Seconds
+    RESPONSE_CACHE_MAX_ENTRIES = 1024
     
     # Session settings
     SESSION_COOKIE_SECURE = False
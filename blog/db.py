@@ -0,0 +1,121 @@
+"""
+SQLite connection pooling for the Clanker Flask application
+"""
+
+import os
+import sqlite3
+import threading
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection that returns itself to its pool instead of closing"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = None
+        self.pinned = False  # Held by a request until teardown
+        self.checked_out = False
+
+    def close(self):
+        """Discard uncommitted work and hand the connection back to the pool.
+
+        Request-scoped (pinned) connections stay checked out so later
+        get_db_connection() calls in the same request can reuse them.
+        """
+        if self.in_transaction:
+            self.rollback()
+        if not self.pinned:
+            self.pool.release(self)
+
+    def discard(self):
+        """Really close the underlying sqlite3 connection"""
+        sqlite3.Connection.close(self)
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections for one process.
+
+    Connections are opened lazily, configured with the PRAGMAs once, and
+    reused LIFO so the most recently used (warmest) connection is handed out
+    first. At most max_size connections exist at a time; acquire() blocks for
+    up to timeout seconds when all of them are in use.
+
+    Flask's threaded server spawns a thread per request, so connections are
+    shared between threads (check_same_thread=False) rather than cached per
+    thread; each one is only ever used by a single thread at a time.
+    """
+
+    def __init__(self, db_path, max_size=16, timeout=20.0, cached_statements=256, pragmas=()):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self.pragmas = list(pragmas)
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._idle = []
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+            factory=PooledConnection
+        )
+        for pragma in self.pragmas:
+            conn.execute(f'PRAGMA {pragma}')
+        conn.pool = self
+        return conn
+
+    def acquire(self):
+        """Check out a connection, opening a new one if none are idle"""
+        if self._pid != os.getpid():
+            # Forked (e.g. a prefork server worker): never share the parent's connections
+            self._reset()
+
+        if not self._slots.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError('Timed out waiting for a pooled database connection')
+
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                self._slots.release()
+                raise
+
+        conn.checked_out = True
+        return conn
+
+    def release(self, conn):
+        """Roll back anything uncommitted and return a connection to the pool"""
+        if not conn.checked_out or conn.pool is not self:
+            return
+        conn.checked_out = False
+        conn.pinned = False
+
+        if self._pid != os.getpid():
+            return  # Belongs to a pool generation from before a fork
+
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.discard()
+        else:
+            with self._lock:
+                self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Close all idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.discard()
@@ -0,0 +1,158 @@
+"""
+In-process change feed for the Clanker Flask application.
+
+Writers in this process publish to the hub (or poke it after a commit), and
+a single watcher thread picks up writes from other processes, such as the
+agent and the online trainer, by checking SQLite's PRAGMA data_version.
+Subscribers (one per open /api/stream) just block on a queue, so idle
+clients cost no database queries. Listeners (e.g. the response cache) are
+called for every event, plus a 'changed' event on any committed write.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+
+class EventHub:
+    """Fan-out of 'posts' and 'notifications' change events to subscribers.
+
+    The watcher keeps high-water marks on posts.id and notifs.id and, when
+    the database changes, publishes:
+
+        ('posts', {'count': <new posts>, 'latest_id': <max post id>})
+        ('notifications', {'user_ids': [<users with new notifications>]})
+
+    Listeners additionally get ('changed', {'data_version': ...}) for every
+    committed write by another connection. The watcher only runs while
+    someone is subscribed or listening.
+    """
+
+    def __init__(self, db_path, poll_interval=1.0, timeout=20.0, max_queue=100):
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.max_queue = max_queue
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._subscribers = set()
+        self._listeners = []
+        self._thread = None
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            # Forked: the parent's watcher thread didn't come with us, but its listeners did
+            listeners = self._listeners
+            self._reset()
+            self._listeners = listeners
+
+    def start(self):
+        """Make sure the watcher is running in this process if anyone needs it"""
+        self._check_fork()
+        with self._lock:
+            if self._subscribers or self._listeners:
+                self._ensure_watcher()
+
+    def subscribe(self, limit=None):
+        """Register a new subscriber and return its event queue, or None if `limit` are already subscribed"""
+        self._check_fork()
+        subscription = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            if limit is not None and len(self._subscribers) >= limit:
+                return None
+            self._subscribers.add(subscription)
+            self._ensure_watcher()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def add_listener(self, callback):
+        """Call callback(event, data) for every event.
+
+        Listeners keep the watcher running once start() (or a subscribe())
+        has launched it; registering one doesn't start it, so this is safe
+        to call at import time before the database exists.
+        """
+        self._check_fork()
+        with self._lock:
+            self._listeners.append(callback)
+
+    def publish(self, event, data):
+        """Deliver an event to every subscriber and listener"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        self._notify_listeners(event, data)
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait((event, data))
+            except queue.Full:
+                pass  # Client isn't reading; it will catch up on the next event
+
+    def _notify_listeners(self, event, data):
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback(event, data)
+            except Exception as e:
+                print(f"Event listener failed on {event}: {e}")
+
+    def poke(self):
+        """Ask the watcher to check for changes now instead of at its next poll"""
+        self._wake.set()
+
+    def _ensure_watcher(self):
+        # Caller holds self._lock
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name='event-hub-watcher', daemon=True)
+            self._thread.start()
+
+    def _watch(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+        try:
+            last_version = conn.execute('PRAGMA data_version').fetchone()[0]
+            last_post_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM posts').fetchone()[0]
+            last_notif_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM notifs').fetchone()[0]
+
+            while True:
+                with self._lock:
+                    if not self._subscribers and not self._listeners:
+                        self._thread = None
+                        return
+
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+                # data_version only moves when another connection commits, so
+                # an unchanged value means there is nothing to look at
+                version = conn.execute('PRAGMA data_version').fetchone()[0]
+                if version == last_version:
+                    continue
+                last_version = version
+                self._notify_listeners('changed', {'data_version': version})
+
+                count, latest_id = conn.execute(
+                    'SELECT COUNT(*), MAX(id) FROM posts WHERE id > ?', (last_post_id,)
+                ).fetchone()
+                if count:
+                    last_post_id = latest_id
+                    self.publish('posts', {'count': count, 'latest_id': latest_id})
+
+                rows = conn.execute(
+                    'SELECT user_id, MAX(id) FROM notifs WHERE id > ? GROUP BY user_id', (last_notif_id,)
+                ).fetchall()
+                if rows:
+                    last_notif_id = max(row[1] for row in rows)
+                    self.publish('notifications', {'user_ids': [row[0] for row in rows]})
+        except Exception as e:
+            print(f"Event hub watcher stopped: {e}")
+            with self._lock:
+                self._thread = None
+        finally:
+            conn.close()
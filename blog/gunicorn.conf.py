@@ -0,0 +1,30 @@
+"""
+Gunicorn settings for Clanker in production:
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Tune with CLANKER_WORKERS / CLANKER_THREADS. Workers are separate processes
+(each with its own connection pool, event hub and response cache); SQLite in
+WAL mode lets them all read concurrently while writes are serialized by
+the database lock, so extra workers mostly help the read-heavy feed. Every
+open /api/stream holds one worker thread, so each worker serves at most
+CLANKER_MAX_STREAMS of them (default: half of CLANKER_THREADS) and ends
+each after EVENTS_MAX_AGE; past that limit clients are told to retry later
+and page views keep the remaining threads. Only logged-in pages open one.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('CLANKER_BIND', '0.0.0.0:8080')
+workers = int(os.environ.get('CLANKER_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('CLANKER_THREADS', 8))
+worker_class = 'gthread'
+
+# Import the app (and run init_db()) once in the master, then fork
+preload_app = True
+
+timeout = 30
+graceful_timeout = 10
+keepalive = 5
+accesslog = os.environ.get('CLANKER_ACCESS_LOG')
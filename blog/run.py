@@ -4,7 +4,7 @@ Run script for the Clanker Flask application
 """
 
 import os
-from app import app
+from app import app, init_db
 
 if __name__ == '__main__':
     # Get environment from FLASK_ENV, default to development
@@ -14,6 +14,8 @@ if __name__ == '__main__':
         print("Starting Clanker in PRODUCTION mode")
         print("Server: http://localhost:8080")
         print("Hot reload: DISABLED")
+        print("Single process dev server; for multiple workers use:")
+        print("  gunicorn -c gunicorn.conf.py wsgi:application")
     else:
         print("Starting Clanker in DEVELOPMENT mode")
         print("Server: http://localhost:8080")
@@ -21,6 +23,8 @@ if __name__ == '__main__':
     
     print("Press Ctrl+C to stop the server")
     
+    init_db()
+    
     # Use configuration from app
     app.run(
         host='0.0.0.0', 
@@ -10,8 +10,8 @@ python -c "import app; app.init_db(); print('Database ready')"
 echo "Starting Flask application on http://localhost:8080"
 echo "Environment: Development (Hot Reload Enabled)"
 echo ""
-echo "To run in production mode:"
-echo "  FLASK_ENV=production python run.py"
+echo "To run in production mode (multi-worker):"
+echo "  gunicorn -c gunicorn.conf.py wsgi:application"
 echo ""
 echo "Press Ctrl+C to stop the server"
 python run.py
@@ -330,39 +330,137 @@ window.app = {
             }, 1000);
         },
         
+        // Show the unread count on the notifications nav link
+        setNotificationCount: function(count) {
+            const currentBadge = document.querySelector('.notification-badge');
+            const navLink = document.querySelector('a[href="/notifications"]');
+            
+            if (count > 0) {
+                if (currentBadge) {
+                    currentBadge.textContent = count;
+                    currentBadge.style.display = 'inline-block';
+                } else if (navLink) {
+                    // Create new badge if it doesn't exist
+                    const newBadge = document.createElement('span');
+                    newBadge.className = 'notification-badge';
+                    newBadge.textContent = count;
+                    navLink.appendChild(newBadge);
+                }
+            } else {
+                // Hide badge if no notifications
+                if (currentBadge) {
+                    currentBadge.style.display = 'none';
+                }
+            }
+        },
+        
         // Refresh notifications in background
         refreshNotifications: async function() {
             try {
                 const response = await fetch('/api/notification-count');
                 if (response.ok) {
                     const data = await response.json();
-                    const count = data.count;
-                    
-                    // Update notification badge
-                    const currentBadge = document.querySelector('.notification-badge');
-                    const navLink = document.querySelector('a[href="/notifications"]');
-                    
-                    if (count > 0) {
-                        if (currentBadge) {
-                            currentBadge.textContent = count;
-                            currentBadge.style.display = 'inline-block';
-                        } else if (navLink) {
-                            // Create new badge if it doesn't exist
-                            const newBadge = document.createElement('span');
-                            newBadge.className = 'notification-badge';
-                            newBadge.textContent = count;
-                            navLink.appendChild(newBadge);
-                        }
-                    } else {
-                        // Hide badge if no notifications
-                        if (currentBadge) {
-                            currentBadge.style.display = 'none';
-                        }
-                    }
+                    this.setNotificationCount(data.count);
                 }
             } catch (error) {
                 console.error('Error refreshing notifications:', error);
             }
+        },
+        
+        // Subscribe to /api/stream for unread counts and, on the feed, new posts
+        startLiveUpdates: function(options = {}) {
+            if (!window.EventSource) {
+                // No server-sent events: fall back to polling the count
+                setInterval(() => this.refreshNotifications(), 5000);
+                return;
+            }
+            
+            const source = new EventSource('/api/stream');
+            source.addEventListener('notifications', (event) => {
+                this.setNotificationCount(JSON.parse(event.data).count);
+            });
+            if (options.newPosts) {
+                source.addEventListener('posts', (event) => {
+                    this.showNewPostsBanner(JSON.parse(event.data).count);
+                });
+            }
+        },
+        
+        // "N new posts" banner at the top of the feed; clicking it reloads the first page
+        showNewPostsBanner: function(count) {
+            const feed = document.getElementById('posts');
+            if (!feed) return;
+            
+            let banner = document.querySelector('.new-posts-banner');
+            if (!banner) {
+                banner = document.createElement('button');
+                banner.className = 'new-posts-banner';
+                banner.dataset.count = '0';
+                banner.addEventListener('click', () => {
+                    window.location.href = window.location.pathname;
+                });
+                feed.before(banner);
+            }
+            
+            const total = parseInt(banner.dataset.count) + count;
+            banner.dataset.count = total;
+            banner.textContent = `Show ${total} new post${total === 1 ? '' : 's'}`;
+        },
+        
+        // Infinite scroll: load the next page of posts when the end of the feed is near
+        setupInfiniteScroll: function() {
+            const feed = document.getElementById('posts');
+            if (!feed || !feed.dataset.nextCursor || !('IntersectionObserver' in window)) return;
+            
+            const sentinel = document.createElement('div');
+            sentinel.className = 'feed-sentinel';
+            feed.after(sentinel);
+            
+            let loading = false;
+            const observer = new IntersectionObserver(async (entries) => {
+                if (!entries[0].isIntersecting || loading) return;
+                
+                loading = true;
+                const hasMore = await this.loadMorePosts(feed);
+                loading = false;
+                
+                if (hasMore) {
+                    // Re-observe so a short page that leaves the sentinel visible loads again
+                    observer.unobserve(sentinel);
+                    observer.observe(sentinel);
+                } else {
+                    observer.disconnect();
+                    sentinel.remove();
+                }
+            }, { rootMargin: '600px' });
+            
+            observer.observe(sentinel);
+        },
+        
+        // Fetch the next page of posts as HTML and append it to the feed
+        loadMorePosts: async function(feed) {
+            const params = new URLSearchParams(window.location.search);
+            params.set('before', feed.dataset.nextCursor);
+            params.set('partial', '1');
+            
+            try {
+                const response = await fetch(`${window.location.pathname}?${params}`);
+                if (!response.ok) return false;
+                
+                const page = document.createElement('div');
+                page.innerHTML = await response.text();
+                page.querySelectorAll('.post-content').forEach(element => {
+                    this.processMentions(element);
+                });
+                feed.append(...page.children);
+                
+                feed.dataset.nextCursor = response.headers.get('X-Next-Cursor') || '';
+                updateTimestamps();
+                return Boolean(feed.dataset.nextCursor);
+            } catch (error) {
+                console.error('Error loading more posts:', error);
+                return false;
+            }
         }
 };
 
@@ -370,7 +468,8 @@ console.log('Script completed, window.app created:', window.app);
 
 // Global utility functions
 function formatTime(timestamp) {
-    const date = new Date(timestamp);
+    // Posts carry epoch seconds; replies and notifications carry date strings
+    const date = /^\d+$/.test(timestamp) ? new Date(parseInt(timestamp) * 1000) : new Date(timestamp);
     const now = new Date();
     const diff = now - date;
     
@@ -409,6 +508,10 @@ document.addEventListener('DOMContentLoaded', function() {
     if (window.app && window.app.processAllMentions) {
         window.app.processAllMentions();
     }
+    
+    if (window.app && window.app.setupInfiniteScroll) {
+        window.app.setupInfiniteScroll();
+    }
 });
 
 // Scroll position management
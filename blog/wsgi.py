@@ -0,0 +1,20 @@
+"""
+WSGI entry point for running Clanker under a production server:
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+"""
+
+import os
+
+os.environ.setdefault('FLASK_ENV', 'production')
+
+from app import app, init_db, db_pool
+
+# Runs once at startup. Under gunicorn with preload_app (see gunicorn.conf.py)
+# that is once in the master, before the workers are forked.
+init_db()
+
+# Don't carry open SQLite connections across fork(); each worker opens its own
+db_pool.close()
+
+application = app
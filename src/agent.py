@@ -1,11 +1,18 @@
 #!/usr/bin/env python3
-import sqlite3, json, random, pathlib, textwrap, time
-from datetime import datetime
-from ollama import chat
+import sqlite3, time, asyncio, argparse
+from replicas import OllamaPool
+from post_sink import PostSink
+from prompts import Character, PromptBuilder
+from novelty import NoveltyIndex
+from reward import RewardModel, top_k
 
 DB_PATH = "data/tweets.db"
+NOVELTY_INDEX_PATH = DB_PATH + ".novelty"
+REWARD_MODEL_PATH = DB_PATH + ".reward"
+REWARD_REFRESH_INTERVAL = 60
 CHARACTER_JSON_PATH = "data/character.json"
 MODEL_NAME = "phi4-mini:latest"
+OPTIONS = {"temperature": 0.8, "num_predict": 60}
 
 PROMPT = """About {{agentName}} (@{{twitterUserName}}):
 {{bio}}
@@ -35,17 +42,6 @@ it kills
 
 Now write the tweet. Output ONLY the tweet text, nothing else."""
 
-def mustache(template: str, data: dict) -> str:
-    for k, v in data.items():
-        template = template.replace("{{" + k + "}}", str(v))
-    return template
-
-def pick(items, k=1):
-    items = list(items or [])
-    if not items or k <= 0: return []
-    k = min(k, len(items))
-    return random.sample(items, k)
-
 def setup_db():
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
@@ -53,7 +49,8 @@ def setup_db():
     CREATE TABLE IF NOT EXISTS posts(
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         timestamp TEXT,
-        text TEXT
+        text TEXT,
+        ts INTEGER
     )""")
     cur.execute("""
     CREATE TABLE IF NOT EXISTS engagements(
@@ -66,53 +63,112 @@ def setup_db():
     conn.commit()
     conn.close()
 
-def generate_post(char):
-    char = json.loads(pathlib.Path("data/character.json").read_text(encoding="utf-8"))
-    name = char.get("name") or char.get("id") or "agent"
-    handle = char.get("twitter", name)
-
-    bio = " • ".join(pick(char.get("bio"), k=3))
-    lore = " • ".join(pick(char.get("lore"), k=3))
-    recent_posts = "\n".join(f"- {p}" for p in pick(char.get("postExamples"), k=5))
-    adjective = random.choice(char.get("adjectives", ["laconic","direct","teasing"]))
-    topic = random.choice(char.get("topics", ["cigarettes","romance","nighttime"]))
-
-    prompt = mustache(PROMPT, {
-        "agentName": name,
-        "twitterUserName": handle,
-        "bio": bio,
-        "lore": lore,
-        "recentPosts": recent_posts,
-        "adjective": adjective,
-        "topic": topic
-    })
-
-    resp = chat(
-        model=MODEL_NAME,
-        messages=[{"role": "user", "content": prompt}],
-        options={"temperature": 0.8, "num_predict": 60}
-    )
-
-    return resp.message.content.strip()[:280]
-
-def store_post(text):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO posts (timestamp, text) VALUES (?, ?)",
-        (datetime.utcnow().isoformat(), text)
-    )
-    conn.commit()
-    conn.close()
+def messages_for(prompt):
+    return [{"role": "user", "content": prompt}]
+
+async def generate_posts(pool, prompts, n, window, samples=1):
+    # Yields (index, [tweets] or None, latency, error) per prompt as each finishes, `samples` tweets per
+    # prompt, with at most `window` requests in flight
+    async def one(i, prompt):
+        start = time.monotonic()
+        try:
+            messages = messages_for(prompt)
+            if samples == 1:
+                texts = [await pool.asubmit(messages, options=OPTIONS)]
+            else:
+                texts = await pool.amap([messages] * samples, concurrency=samples, options=OPTIONS)
+            return i, [t.strip()[:280] for t in texts], time.monotonic() - start, None
+        except Exception as e:
+            return i, None, time.monotonic() - start, e
+
+    window = max(1, window // samples)
+    pending = set()
+    queued = []
+    next_i = 0
+    try:
+        while next_i < n or pending:
+            while next_i < n and len(pending) < window:
+                if not queued:
+                    queued = prompts.batch(min(window, n - next_i))
+                pending.add(asyncio.create_task(one(next_i, queued.pop(0))))
+                next_i += 1
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+def percentile(samples, p):
+    if not samples: return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+async def run(pool, prompts, n, window, store, novelty=None, samples=1, keep=1, reward=None):
+    sink = PostSink(DB_PATH) if store else None
+    latencies, errors, repeats, posted = [], 0, 0, 0
+    started = time.monotonic()
+    next_refresh = started + REWARD_REFRESH_INTERVAL
+    try:
+        async for i, texts, latency, error in generate_posts(pool, prompts, n, window, samples):
+            if error is not None:
+                errors += 1
+                print(f"[{i+1}/{n}] failed after {latency:.1f}s: {error}")
+                continue
+            latencies.append(latency)
+            kept, dropped = top_k(texts, keep, reward, novelty.check_and_add if novelty is not None else None)
+            repeats += dropped
+            for score, tweet in kept:
+                if sink:
+                    sink.add(tweet)
+                posted += 1
+                print(f"[{i+1}/{n}] " + (f"({score:+.2f}) " if score is not None else "") + tweet)
+            if reward is not None and time.monotonic() >= next_refresh:
+                reward.refresh(DB_PATH)
+                next_refresh = time.monotonic() + REWARD_REFRESH_INTERVAL
+    finally:
+        if sink:
+            sink.close()
+        if novelty is not None and novelty.path:
+            novelty.sync(DB_PATH)
+            novelty.save()
+        if reward is not None and reward.path:
+            reward.save()
+    elapsed = time.monotonic() - started
+
+    print(f"\n{posted} tweets from {len(latencies)} prompts x {samples} samples in {elapsed:.1f}s "
+          f"({posted / elapsed:.2f} tweets/s, {len(pool.replicas)} replicas, window {window}); "
+          f"latency p50 {percentile(latencies, 50):.2f}s p95 {percentile(latencies, 95):.2f}s; "
+          f"{errors} failed, {repeats} dropped as near-duplicates")
+    return latencies, errors
 
 def main():
-    setup_db()
-    char = json.loads(pathlib.Path(CHARACTER_JSON_PATH).read_text(encoding="utf-8"))
+    parser = argparse.ArgumentParser(description="Generate tweets in the character's voice")
+    parser.add_argument("-n", "--count", type=int, default=1000)
+    parser.add_argument("--replicas", type=int, default=4)
+    parser.add_argument("--base-port", type=int, default=11500)
+    parser.add_argument("--window", type=int, help="max requests in flight (default: 2 per replica)")
+    parser.add_argument("--store", action="store_true", help="insert tweets into the posts table")
+    parser.add_argument("--novelty", type=float, default=0.5,
+                        help="drop tweets at least this similar to an existing post (0 disables)")
+    parser.add_argument("--best-of", type=int, default=1,
+                        help="samples per prompt, ranked by the engagement model (data/tweets.db.reward)")
+    parser.add_argument("--keep", type=int, default=1, help="tweets kept per prompt with --best-of")
+    parser.add_argument("--seed", type=int, help="seed the prompt RNG for a reproducible prompt set")
+    args = parser.parse_args()
+    if not 1 <= args.keep <= args.best_of:
+        parser.error("--keep must be between 1 and --best-of")
 
-    for i in range(1000):
-        tweet = generate_post(char)
-        # store_post(tweet)
-        print(f"[{i+1}/1000] {tweet}")
+    setup_db()
+    prompts = PromptBuilder(PROMPT, Character(CHARACTER_JSON_PATH), seed=args.seed)
+    novelty = NoveltyIndex.open(NOVELTY_INDEX_PATH, DB_PATH, threshold=args.novelty) if args.novelty > 0 else None
+    reward = RewardModel.open(REWARD_MODEL_PATH, DB_PATH) if args.best_of > 1 else None
+    pool = OllamaPool(model=MODEL_NAME, replicas=args.replicas, base_port=args.base_port)
+    try:
+        asyncio.run(run(pool, prompts, args.count, args.window or 2 * args.replicas, args.store, novelty,
+                        args.best_of, args.keep, reward))
+    finally:
+        pool.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Minimal asyncio HTTP/1.1 client with keep-alive connection pooling, for
+talking to local `ollama serve` daemons.
+
+It only does what the replica pool needs (JSON POST/GET, Content-Length and
+chunked responses, line streaming) and is several times cheaper per request
+than a general purpose client, which matters when one event loop drives
+dozens of concurrent generations.
+"""
+
+import asyncio, json
+from collections import deque
+
+class HTTPError(Exception):
+    """Connection failed, was dropped, or the response was malformed"""
+
+class HTTPTimeout(HTTPError):
+    pass
+
+class HTTPStatusError(HTTPError):
+    def __init__(self, status_code, body):
+        super().__init__(f"HTTP {status_code}: {body[:200]!r}")
+        self.status_code = status_code
+        self.body = body
+
+
+class KeepAliveClient:
+    def __init__(self, host, port, max_connections=16, timeout=600.0, connect_timeout=5.0):
+        self.host = host
+        self.port = int(port)
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self._slots = asyncio.Semaphore(max_connections)
+        self._idle = deque()
+        self._closed = False
+
+    async def _connect(self):
+        try:
+            return await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.connect_timeout)
+        except asyncio.TimeoutError:
+            raise HTTPTimeout(f"connect to {self.host}:{self.port} timed out")
+        except OSError as e:
+            raise HTTPError(f"connect to {self.host}:{self.port} failed: {e}")
+
+    def _encode(self, method, path, body):
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nConnection: keep-alive\r\n"
+        if body is None:
+            return (head + "\r\n").encode()
+        data = json.dumps(body).encode()
+        return (head + f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n").encode() + data
+
+    async def _read_head(self, reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed before response")
+        status = int(status_line.split(b" ", 2)[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return status, headers
+
+    async def _read_chunks(self, reader):
+        while True:
+            size = int((await reader.readline()).split(b";", 1)[0], 16)
+            if size == 0:
+                await reader.readline()  # Trailing CRLF (no trailers)
+                return
+            yield await reader.readexactly(size)
+            await reader.readexactly(2)
+
+    async def _open(self, method, path, body):
+        # Send a request, reusing an idle connection when possible; a stale
+        # keep-alive connection (closed by the server) is retried once on a new one
+        payload = self._encode(method, path, body)
+        while True:
+            reused = bool(self._idle)
+            reader, writer = self._idle.pop() if reused else await self._connect()
+            try:
+                writer.write(payload)
+                await writer.drain()
+                status, headers = await self._read_head(reader)
+                return reader, writer, status, headers
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+                writer.close()
+                if not reused:
+                    raise HTTPError(f"{method} {path} on {self.host}:{self.port} failed: {e!r}")
+
+    def _finish(self, reader, writer, headers, ok):
+        # Put the connection back if the exchange completed cleanly
+        if ok and not self._closed and headers.get("connection", "").lower() != "close":
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+
+    async def _exchange(self, method, path, body, conn):
+        reader, writer, status, headers = await self._open(method, path, body)
+        conn[:] = [reader, writer, headers]
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            data = b"".join([chunk async for chunk in self._read_chunks(reader)])
+        else:
+            data = await reader.readexactly(int(headers.get("content-length", 0)))
+        return status, data
+
+    async def request(self, method, path, body=None):
+        """Send a request and return the decoded JSON response"""
+        async with self._slots:
+            conn = []
+            ok = False
+            try:
+                status, data = await asyncio.wait_for(self._exchange(method, path, body, conn), self.timeout)
+                ok = True
+            except asyncio.TimeoutError:
+                raise HTTPTimeout(f"{method} {path} on {self.host}:{self.port} timed out")
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+                raise HTTPError(f"{method} {path} on {self.host}:{self.port} failed: {e!r}")
+            finally:
+                if conn:
+                    self._finish(*conn, ok)
+        if status >= 400:
+            raise HTTPStatusError(status, data)
+        return json.loads(data)
+
+    async def stream_lines(self, method, path, body=None):
+        """Send a request and yield the response body line by line as it arrives.
+
+        `timeout` bounds the wait for the response headers, not the whole stream.
+        """
+        async with self._slots:
+            conn = []
+            ok = False
+            try:
+                reader, writer, status, headers = await asyncio.wait_for(self._open(method, path, body), self.timeout)
+                conn[:] = [reader, writer, headers]
+                if status >= 400:
+                    raise HTTPStatusError(status, await reader.read(65536))
+
+                if headers.get("transfer-encoding", "").lower() == "chunked":
+                    pending = b""
+                    async for chunk in self._read_chunks(reader):
+                        pending += chunk
+                        *lines, pending = pending.split(b"\n")
+                        for line in lines:
+                            yield line
+                    if pending:
+                        yield pending
+                else:
+                    remaining = int(headers.get("content-length", 0))
+                    while remaining > 0:
+                        line = await reader.readline()
+                        if not line:
+                            raise asyncio.IncompleteReadError(b"", remaining)
+                        remaining -= len(line)
+                        yield line.rstrip(b"\n")
+                ok = True
+            except asyncio.TimeoutError:
+                raise HTTPTimeout(f"{method} {path} on {self.host}:{self.port} timed out")
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+                raise HTTPError(f"{method} {path} on {self.host}:{self.port} failed: {e!r}")
+            finally:
+                if conn:
+                    self._finish(*conn, ok)
+
+    async def aclose(self):
+        self._closed = True
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import time, random, sqlite3
+from collections import Counter
+
+class StrategyBandit:
+    """
+    Thompson sampling over posting strategies. Each arm's engagement rate is
+    the share of its posts that ended up with net positive engagement
+    (likes + replies - clanks > 0, from post_stats), with a Beta(1, 1) prior.
+
+    refresh() recounts from posts.strategy, using only posts between
+    `min_age` seconds old (they've had time to collect engagement) and
+    `horizon` seconds old (the model keeps changing, so old results say
+    less about an arm today). allocate(n) draws from every arm's posterior n
+    times and hands each post to the arm with the highest draw, so arms that
+    do well get most of the traffic while uncertain ones still get tried.
+    """
+
+    def __init__(self, arms, user=None, min_age=3600, horizon=86400, seed=None, rng=None):
+        self.arms = list(arms)
+        self.user = user
+        self.min_age = min_age
+        self.horizon = horizon
+        self.rng = rng or random.Random(seed)
+        self.posts = dict.fromkeys(self.arms, 0)
+        self.wins = dict.fromkeys(self.arms, 0)
+
+    def refresh(self, db_path):
+        now = int(time.time())
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute('''
+                SELECT p.strategy, COUNT(*),
+                       SUM(COALESCE(s.like_count, 0) + COALESCE(s.reply_count, 0) - COALESCE(s.clanked_count, 0) > 0)
+                FROM posts p
+                LEFT JOIN post_stats s ON s.post_id = p.id
+                WHERE p.strategy IS NOT NULL
+                  AND (? IS NULL OR p.user_lc = ?)
+                  AND p.ts BETWEEN ? AND ?
+                GROUP BY p.strategy
+            ''', (self.user, self.user, now - self.horizon, now - self.min_age)).fetchall()
+        finally:
+            conn.close()
+        self.posts = dict.fromkeys(self.arms, 0)
+        self.wins = dict.fromkeys(self.arms, 0)
+        for arm, posts, wins in rows:
+            if arm in self.posts:
+                self.posts[arm] = posts
+                self.wins[arm] = wins
+
+    def draw(self):
+        """One posterior sample per arm; returns the arm with the highest"""
+        beta = self.rng.betavariate
+        return max(self.arms, key=lambda a: beta(1 + self.wins[a], 1 + self.posts[a] - self.wins[a]))
+
+    def allocate(self, n):
+        """{arm: number of the next n posts it should generate}"""
+        return Counter(self.draw() for _ in range(n))
+
+    def stats(self):
+        """{arm: (posts, wins, posterior mean)}"""
+        return {a: (self.posts[a], self.wins[a], (1 + self.wins[a]) / (2 + self.posts[a])) for a in self.arms}
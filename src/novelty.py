@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+import gc, os, re, zlib, pickle, sqlite3, operator
+from array import array
+from contextlib import contextmanager
+
+WHITESPACE = re.compile(r"\s+")
+EMPTY = 0xFFFFFFFF
+
+def normalize(text):
+    return WHITESPACE.sub(" ", text.lower().strip(" \n\t\"'"))
+
+@contextmanager
+def gc_paused():
+    # Bulk loads allocate ~20 tuples per post; cyclic GC passes over them roughly double the time
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+class NoveltyIndex:
+    """
+    Near-duplicate filter over post texts: MinHash signatures of character
+    n-grams, bucketed with LSH so a check only compares against posts that
+    share a band.
+
+    Signatures use one-permutation hashing (each n-gram is hashed once and
+    lands in one of `num_hashes` bins; a bin keeps its minimum, empty bins
+    borrow from the next full one) so building one is a single pass over the
+    text. With the defaults (64 bins, bands of 3) a pair at Jaccard 0.5 shares
+    a band ~94% of the time.
+
+    The index is pickled to `path` together with the highest posts.id it has
+    seen, so sync() after a restart only reads newer rows.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path=None, ngram=5, num_hashes=64, band_rows=3, threshold=0.5):
+        self.path = path
+        self.ngram = ngram
+        self.num_hashes = num_hashes
+        self.band_rows = band_rows
+        self.threshold = threshold
+        self.bits = num_hashes.bit_length() - 1
+        if 1 << self.bits != num_hashes:
+            raise ValueError("num_hashes must be a power of two")
+        self.last_id = 0
+        self.keys = []  # post id (None for candidates accepted this session)
+        self.signatures = []
+        self.buckets = [{} for _ in range(num_hashes // band_rows)]
+        self._provisional = {}  # signature -> slot, for candidates not yet seen in the posts table
+
+    def params(self):
+        return (self.ngram, self.num_hashes, self.band_rows)
+
+    def signature(self, text):
+        data = normalize(text).encode("utf-8")
+        n, k, shift = self.ngram, self.num_hashes, 32 - self.bits
+        low = (1 << shift) - 1
+        mins = [EMPTY] * k
+        for i in range(max(len(data) - n + 1, 1)):
+            h = (zlib.crc32(data[i:i + n]) * 0x9E3779B1) & 0xFFFFFFFF
+            b, v = h >> shift, h & low
+            if v < mins[b]:
+                mins[b] = v
+        # Densify: an empty bin takes the next full bin's value, offset by the distance
+        if EMPTY in mins:
+            full = mins[:]
+            for b in range(k):
+                if full[b] == EMPTY:
+                    t = 1
+                    while full[(b + t) % k] == EMPTY:
+                        t += 1
+                    mins[b] = full[(b + t) % k] + (t << shift)
+        return tuple(mins)
+
+    def _bands(self, sig):
+        r = self.band_rows
+        return [sig[i:i + r] for i in range(0, len(self.buckets) * r, r)]
+
+    def _insert(self, key, sig):
+        slot = len(self.signatures)
+        self.keys.append(key)
+        self.signatures.append(sig)
+        r = self.band_rows
+        for i, bucket in enumerate(self.buckets):
+            band = sig[i * r:i * r + r]
+            slots = bucket.get(band)
+            if slots is None:
+                bucket[band] = [slot]
+            else:
+                slots.append(slot)
+
+    def similar(self, text, sig=None):
+        """Best match for `text`: (estimated Jaccard similarity, post id), or (0.0, None)"""
+        sig = sig or self.signature(text)
+        seen = set()
+        for bucket, band in zip(self.buckets, self._bands(sig)):
+            seen.update(bucket.get(band, ()))
+        best, best_slot = 0, None
+        for slot in seen:
+            matches = sum(map(operator.eq, sig, self.signatures[slot]))
+            if matches > best:
+                best, best_slot = matches, slot
+        if best_slot is None:
+            return 0.0, None
+        return best / self.num_hashes, self.keys[best_slot]
+
+    def is_novel(self, text):
+        return self.similar(text)[0] < self.threshold
+
+    def check_and_add(self, text):
+        # True (and indexed, so later candidates in the same batch are compared to it) if novel
+        sig = self.signature(text)
+        if self.similar(text, sig)[0] >= self.threshold:
+            return False
+        self._provisional[sig] = len(self.signatures)
+        self._insert(None, sig)
+        return True
+
+    def sync(self, db_path):
+        """Index posts added since the last sync; returns how many"""
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute("SELECT id, text FROM posts WHERE id > ? ORDER BY id", (self.last_id,)).fetchall()
+        finally:
+            conn.close()
+        with gc_paused():
+            self._add_rows(rows)
+        return len(rows)
+
+    def _add_rows(self, rows):
+        for post_id, text in rows:
+            if text:
+                sig = self.signature(text)
+                slot = self._provisional.pop(sig, None)
+                if slot is not None:
+                    self.keys[slot] = post_id  # A candidate we accepted earlier, now stored
+                else:
+                    self._insert(post_id, sig)
+            self.last_id = post_id
+
+    def save(self, path=None):
+        # Candidates accepted this session aren't saved; they come back from the posts table on the next sync
+        path = path or self.path
+        kept = [i for i, key in enumerate(self.keys) if key is not None]
+        flat = array("I")
+        for i in kept:
+            flat.extend(self.signatures[i])
+        state = {"version": self.VERSION, "params": self.params(), "last_id": self.last_id,
+                 "keys": array("q", (self.keys[i] for i in kept)), "signatures": flat}
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def open(cls, path, db_path=None, **kwargs):
+        """Load the index at `path` (empty if missing or built with other parameters), then sync it with db_path"""
+        index = cls(path, **kwargs)
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            state = None
+        if state and state.get("version") == cls.VERSION and tuple(state["params"]) == index.params():
+            k = index.num_hashes
+            sigs = state["signatures"]
+            with gc_paused():
+                for i, key in enumerate(state["keys"]):
+                    index._insert(key, tuple(sigs[i * k:(i + 1) * k]))
+            index.last_id = state["last_id"]
+        if db_path is not None and index.sync(db_path):
+            index.save()
+        return index
+
+    def __len__(self):
+        return len(self.signatures)
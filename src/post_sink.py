@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+import time, random, sqlite3, threading
+from collections import deque
+
+BUSY_CODES = (5, 6)  # SQLITE_BUSY, SQLITE_LOCKED
+
+def is_busy(e):
+    code = getattr(e, "sqlite_errorcode", None)  # Python 3.11+
+    if code is not None:
+        return code in BUSY_CODES
+    msg = str(e).lower()
+    return "locked" in msg or "busy" in msg
+
+def is_transient(e):
+    return isinstance(e, sqlite3.OperationalError) and is_busy(e)
+
+class PostSink:
+    """
+    Buffers generated posts and writes them to the posts table in batches:
+    one BEGIN IMMEDIATE ... executemany ... COMMIT per flush, whenever
+    `batch_size` posts are waiting or every `flush_interval` seconds.
+
+    add() never touches the database, so generation never waits on the
+    Flask app's writes. A flush that hits SQLITE_BUSY (the app holding the
+    write lock past `busy_timeout`) backs off and retries up to `retries`
+    times; rows that still couldn't be written stay buffered for the next
+    flush. Any other error means some row can't be written at all: the batch
+    is retried a row at a time, and the rows that fail on their own are
+    logged and set aside in `rejected` instead of blocking every flush after.
+
+    With `user` set, rows go in as (text, user, user_lc, timestamp, ts) like
+    the blog's own posts; without it as (text, timestamp, ts). With `tagged`
+    they also carry the strategy passed to add().
+    """
+
+    def __init__(self, db_path, user=None, batch_size=50, flush_interval=1.0, busy_timeout=2.0, retries=5,
+                 tagged=False):
+        self.db_path = str(db_path)
+        self.user = user
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.busy_timeout = busy_timeout
+        self.retries = retries
+        self.tagged = tagged
+        columns = ["text", "user", "user_lc", "timestamp", "ts"] if user else ["text", "timestamp", "ts"]
+        if tagged:
+            columns.append("strategy")
+        self.sql = f"INSERT INTO posts ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        self.written = 0
+        self.flushes = 0
+        self.busy_retries = 0
+        self.rejected = deque(maxlen=100)  # (row, error) for rows that could not be written
+        self._buffer = []
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._conn = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="post-sink", daemon=True)
+        self._thread.start()
+
+    def add(self, text, ts=None, strategy=None):
+        ts = int(time.time() if ts is None else ts)
+        row = (text, self.user, self.user.lower(), str(ts), ts) if self.user else (text, str(ts), ts)
+        if self.tagged:
+            row += (strategy,)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("PostSink is closed")
+            self._buffer.append(row)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return len(self._buffer)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or len(self._buffer) >= self.batch_size,
+                                    timeout=self.flush_interval)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"PostSink: flush failed, {self.pending()} posts kept for retry: {e}")
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout,
+                                         isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        return self._conn
+
+    def flush(self):
+        """Write everything buffered so far in one transaction; returns the number of rows written"""
+        with self._write_lock:
+            with self._cond:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            try:
+                self._write(rows)
+                written = len(rows)
+            except Exception as e:
+                if is_transient(e):
+                    self._requeue(rows)
+                    raise
+                written = self._write_each(rows)
+            except BaseException:
+                self._requeue(rows)
+                raise
+            self.written += written
+            self.flushes += 1
+            return written
+
+    def _requeue(self, rows):
+        with self._cond:
+            self._buffer[:0] = rows
+
+    def _write_each(self, rows):
+        # One transaction per row, to write the good ones and set aside the ones that fail on their own
+        written = 0
+        for i, row in enumerate(rows):
+            try:
+                self._write([row])
+                written += 1
+            except Exception as e:
+                if is_transient(e):
+                    self._requeue(rows[i:])
+                    self.written += written
+                    raise
+                self.rejected.append((row, str(e)))
+                print(f"PostSink: dropped post {str(row[0])[:40]!r}: {e}")
+            except BaseException:
+                self._requeue(rows[i:])
+                self.written += written
+                raise
+        return written
+
+    def _write(self, rows):
+        for attempt in range(self.retries + 1):
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(self.sql, rows)
+                conn.execute("COMMIT")
+                return
+            except BaseException as e:
+                # Never leave the cached connection inside a transaction, whatever failed
+                if conn.in_transaction:
+                    try:
+                        conn.execute("ROLLBACK")
+                    except sqlite3.Error:
+                        conn.close()
+                        self._conn = None
+                if not is_transient(e) or attempt == self.retries:
+                    raise
+                self.busy_retries += 1
+                time.sleep(min(0.05 * 2 ** attempt, 1.0) * random.uniform(0.5, 1.0))
+
+    def stats(self):
+        return {"written": self.written, "flushes": self.flushes, "busy_retries": self.busy_retries,
+                "pending": self.pending(), "rejected": len(self.rejected)}
+
+    def close(self):
+        # Stop the flusher and write whatever is left
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        try:
+            self.flush()
+        finally:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+import os, re, json, random, threading
+from pathlib import Path
+
+CHARACTER_JSON_PATH = Path(__file__).resolve().parent.parent / "data" / "character.json"
+
+LIST_FIELDS = ("bio", "lore", "postExamples", "adjectives", "topics")
+DEFAULT_ADJECTIVES = ("laconic", "direct", "teasing")
+DEFAULT_TOPICS = ("cigarettes", "romance", "nighttime")
+
+PLACEHOLDER = re.compile(r"\{\{(\w+)\}\}")
+
+class Template:
+    """
+    A {{key}} template split once into literal and key segments, so render()
+    is a single join instead of one str.replace pass per key. Keys missing
+    from the data are left as {{key}}, like the old mustache().
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.segments = []  # (is_key, literal or key name)
+        pos = 0
+        for m in PLACEHOLDER.finditer(text):
+            if m.start() > pos:
+                self.segments.append((False, text[pos:m.start()]))
+            self.segments.append((True, m.group(1)))
+            pos = m.end()
+        if pos < len(text):
+            self.segments.append((False, text[pos:]))
+        self.keys = {s for is_key, s in self.segments if is_key}
+        self._parts = [None if is_key else s for is_key, s in self.segments]
+        self._slots = [(i, s) for i, (is_key, s) in enumerate(self.segments) if is_key]
+
+    def render(self, data):
+        parts = self._parts.copy()
+        for i, key in self._slots:
+            parts[i] = str(data[key]) if key in data else "{{" + key + "}}"
+        return "".join(parts)
+
+
+class Character:
+    """
+    character.json, parsed and validated once. get() re-stats the file and
+    reloads only when its mtime changes; if the file can't be read or the new
+    version doesn't parse or validate, the last good one is kept.
+    """
+
+    def __init__(self, path=CHARACTER_JSON_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.mtime = None
+        self.data = None
+        self.reloads = 0
+        self.get()
+
+    @staticmethod
+    def validate(char):
+        if not isinstance(char, dict):
+            raise ValueError("character must be a JSON object")
+        for field in LIST_FIELDS:
+            items = char.get(field)
+            if items is not None and not (isinstance(items, list) and all(isinstance(i, str) for i in items)):
+                raise ValueError(f"character.{field} must be a list of strings")
+        name = char.get("name") or char.get("id") or "agent"
+        return {
+            "name": name,
+            "handle": char.get("twitter", name),
+            # Tuples, built once, so sampling never copies the lists
+            **{field: tuple(char.get(field) or ()) for field in LIST_FIELDS},
+            "raw": char,
+        }
+
+    def get(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            # Missing for a moment (e.g. mid-replace by an editor); retried on the next call
+            if self.data is None:
+                raise
+            return self.data
+        if mtime == self.mtime:
+            return self.data
+        with self._lock:
+            if mtime != self.mtime:
+                try:
+                    self.data = self.validate(json.loads(self.path.read_text(encoding="utf-8")))
+                    self.reloads += 1
+                except OSError as e:
+                    # Not recorded as seen, so the next call tries again
+                    if self.data is None:
+                        raise
+                    print(f"Keeping previous character; can't read {self.path}: {e}")
+                    return self.data
+                except ValueError as e:  # Includes JSONDecodeError
+                    if self.data is None:
+                        raise
+                    print(f"Keeping previous character; {self.path} is invalid: {e}")
+                self.mtime = mtime
+        return self.data
+
+
+class PromptBuilder:
+    """
+    Randomized tweet prompts from a Template and a Character. Pass `seed` (or
+    an `rng`) to get the same prompt sequence every run.
+    """
+
+    def __init__(self, template, character=None, seed=None, rng=None):
+        self.template = template if isinstance(template, Template) else Template(template)
+        self.character = character if character is not None else Character()
+        self.rng = rng or random.Random(seed)
+
+    def pick(self, items, k=1):
+        if not items or k <= 0: return []
+        return self.rng.sample(items, min(k, len(items)))
+
+    def variables(self, char):
+        rng = self.rng
+        return {
+            "agentName": char["name"],
+            "twitterUserName": char["handle"],
+            "bio": " • ".join(self.pick(char["bio"], k=3)),
+            "lore": " • ".join(self.pick(char["lore"], k=3)),
+            "recentPosts": "\n".join(f"- {p}" for p in self.pick(char["postExamples"], k=5)),
+            "adjective": rng.choice(char["adjectives"] or DEFAULT_ADJECTIVES),
+            "topic": rng.choice(char["topics"] or DEFAULT_TOPICS),
+        }
+
+    def build(self, **extra):
+        # `extra` fills or overrides template keys, e.g. a per-strategy instruction
+        variables = self.variables(self.character.get())
+        variables.update(extra)
+        return self.template.render(variables)
+
+    def variants(self, extras):
+        # One draw of the variables rendered once per dict in `extras`, so the prompts share
+        # everything before the first key that differs
+        variables = self.variables(self.character.get())
+        return [self.template.render({**variables, **extra}) for extra in extras]
+
+    def batch(self, n, **extra):
+        # One character check for the whole batch
+        char = self.character.get()
+        out = []
+        for _ in range(n):
+            variables = self.variables(char)
+            variables.update(extra)
+            out.append(self.template.render(variables))
+        return out
@@ -1,85 +1,465 @@
 #!/usr/bin/env python3
-import os, time, json, atexit, shutil, tempfile, subprocess, itertools, threading, queue, requests
-from concurrent.futures import ThreadPoolExecutor
+import os, time, json, atexit, asyncio, subprocess, threading, requests
+from aio_http import KeepAliveClient, HTTPError, HTTPStatusError
+
+SERVE_CMD = ("ollama", "serve")
+
+def default_models_dir():
+    # Same place `ollama serve` uses by default, so pulled models survive restarts
+    return os.environ.get("OLLAMA_MODELS") or os.path.expanduser("~/.ollama/models")
 
 class OllamaReplica:
-    def __init__(self, model, port, models_dir=None):
+    # Lifecycle: stopped -> starting -> ready <-> ejected (circuit open); failed = couldn't start
+    def __init__(self, model, port, models_dir, serve_cmd=SERVE_CMD):
         self.model = model
         self.port = int(port)
-        self.models_dir = models_dir or tempfile.mkdtemp(prefix=f"ollama_models_{self.port}_")
+        self.models_dir = models_dir
+        self.serve_cmd = list(serve_cmd)
         self.proc = None
         self.base = f"http://127.0.0.1:{self.port}"
-        self._start()
+        self.state = "stopped"
+        self.error = None
+        # Load balancing / circuit breaker bookkeeping, guarded by the pool's lock
+        self.inflight = 0
+        self.ewma = None  # Smoothed request latency in seconds
+        self.requests = 0
+        self.failures = 0  # Consecutive
+        self.retry_at = 0.0
+        self.backoff = 0.0
+        # Keep-alive HTTP client for requests, owned by the pool's event loop
+        self.client = None
+        self.generation = 0  # Bumped on every (re)launch so stale connections get dropped
+        self.client_generation = -1
+
+    @property
+    def ready(self):
+        return self.state == "ready"
 
-    def _start(self):
+    def launch(self):
         env = os.environ.copy()
+        env["OLLAMA_HOST"] = f"127.0.0.1:{self.port}"
         env["OLLAMA_PORT"] = str(self.port)
         env["OLLAMA_MODELS"] = self.models_dir
-        # Launch daemon
-        self.proc = subprocess.Popen(["ollama", "serve"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        # Wait for server
-        for _ in range(100):
-            try:
-                requests.get(self.base, timeout=0.25)
-                break
-            except Exception:
-                time.sleep(0.05)
-        # Pull + warm (keeps model resident)
-        requests.post(f"{self.base}/api/pull", json={"name": self.model}, timeout=120)
-        requests.post(f"{self.base}/api/generate",
-                      json={"model": self.model, "prompt": "warmup", "keep_alive": "24h"},
-                      timeout=120)
-
-    def chat(self, messages, **kwargs):
+        # Launch daemon; returns immediately so all replicas boot in parallel
+        self.generation += 1
+        self.proc = subprocess.Popen(self.serve_cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def probe(self, timeout=0.5):
+        # Health check: the daemon process is up and answering its API
+        if not self.alive():
+            return False
+        try:
+            return requests.get(f"{self.base}/api/version", timeout=timeout).ok
+        except requests.RequestException:
+            return False
+
+    def wait_healthy(self, deadline):
+        while time.monotonic() < deadline:
+            if self.probe():
+                return
+            if not self.alive():
+                raise RuntimeError(f"ollama serve on port {self.port} exited with code {self.proc.returncode}")
+            time.sleep(0.05)
+        raise TimeoutError(f"ollama serve on port {self.port} not healthy before the startup deadline")
+
+    def has_model(self):
+        r = requests.get(f"{self.base}/api/tags", timeout=5)
+        r.raise_for_status()
+        names = {m.get("name") for m in r.json().get("models", [])} | {m.get("model") for m in r.json().get("models", [])}
+        return self.model in names
+
+    def pull(self, deadline):
+        r = requests.post(f"{self.base}/api/pull", json={"name": self.model, "stream": False},
+                          timeout=max(deadline - time.monotonic(), 1))
+        r.raise_for_status()
+
+    def warm(self, deadline):
+        # An empty prompt just loads the model (keeps it resident)
+        r = requests.post(f"{self.base}/api/generate",
+                          json={"model": self.model, "prompt": "", "keep_alive": "24h"},
+                          timeout=max(deadline - time.monotonic(), 1))
+        r.raise_for_status()
+
+    async def achat(self, messages, **kwargs):
         payload = {"model": self.model, "messages": messages, "stream": False, "keep_alive": "24h"}
         payload.update(kwargs)
-        r = requests.post(f"{self.base}/api/chat", json=payload, timeout=600)
-        r.raise_for_status()
-        return r.json()["message"]["content"]
+        return (await self.client.request("POST", "/api/chat", payload))["message"]["content"]
+
+    async def astream(self, messages, **kwargs):
+        # Yields content pieces as Ollama produces them (NDJSON lines)
+        payload = {"model": self.model, "messages": messages, "stream": True, "keep_alive": "24h"}
+        payload.update(kwargs)
+        # Read to the end of the body after "done" so the connection can be reused
+        async for line in self.client.stream_lines("POST", "/api/chat", payload):
+            if not line.strip():
+                continue
+            chunk = json.loads(line)
+            if "error" in chunk:
+                raise RuntimeError(f"Ollama :{self.port}: {chunk['error']}")
+            content = chunk.get("message", {}).get("content")
+            if content:
+                yield content
 
     def stop(self):
-        try:
-            if self.proc and self.proc.poll() is None:
-                self.proc.terminate()
-                try:
-                    self.proc.wait(timeout=3)
-                except subprocess.TimeoutExpired:
-                    self.proc.kill()
-        finally:
-            shutil.rmtree(self.models_dir, ignore_errors=True)
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=3)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+
+def is_replica_failure(e):
+    # Connection errors, timeouts and 5xx count against a replica; 4xx means a bad request
+    if isinstance(e, HTTPStatusError):
+        return e.status_code >= 500
+    return isinstance(e, (HTTPError, RuntimeError, KeyError, ValueError))
 
 
 class OllamaPool:
-    def __init__(self, model: str, replicas: int = 4, base_port: int = 11500):
-        self.replicas = [OllamaReplica(model, base_port + i) for i in range(replicas)]
-        self._rr = itertools.cycle(self.replicas)
-        self._lock = threading.Lock()
+    """
+    N `ollama serve` daemons for one model, sharing a single models directory.
+
+    All daemons are launched at once and brought up in parallel: health probe,
+    a single pull (by whichever replica is healthy first, skipped if the model
+    is already on disk), then a warm load. The constructor returns as soon as
+    `wait_for` replicas are ready (default 1); the rest join as they finish.
+    Raises if none is ready within `startup_timeout` seconds.
+
+    Requests go to the ready replica with the lowest (in-flight + 1) x EWMA
+    latency, so a slow or busy replica gets proportionally less traffic, and
+    fail over to a different replica up to `retries` times. After
+    `failure_threshold` consecutive failures a replica is ejected (circuit
+    open); a monitor thread re-probes it with exponential backoff and lets it
+    back in on probation, and respawns `ollama serve` processes that died.
+
+    Requests run on the pool's own asyncio loop over one keep-alive
+    connection pool per replica. `asubmit`, `amap` and `astream` are the
+    async API (usable from any event loop); `submit` and `map` are blocking
+    wrappers around them.
+
+    `serve_cmd` replaces `ollama serve`, e.g. with bench/fake_ollama.py.
+    """
+
+    EWMA_ALPHA = 0.3
+
+    def __init__(self, model: str, replicas: int = 4, base_port: int = 11500, models_dir: str = None,
+                 serve_cmd=SERVE_CMD, startup_timeout: float = 600.0, wait_for: int = 1,
+                 retries: int = 2, failure_threshold: int = 3, probe_interval: float = 1.0,
+                 min_backoff: float = 1.0, max_backoff: float = 60.0, connections_per_replica: int = 16,
+                 request_timeout: float = 600.0):
+        self.model = model
+        self.models_dir = models_dir or default_models_dir()
+        os.makedirs(self.models_dir, exist_ok=True)
+        self.replicas = [OllamaReplica(model, base_port + i, self.models_dir, serve_cmd) for i in range(replicas)]
+        self.startup_timeout = startup_timeout
+        self.retries = retries
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.connections_per_replica = connections_per_replica
+        self.request_timeout = request_timeout
+        self._pull_lock = threading.Lock()
+        self._model_present = False
+        self._changed = threading.Condition()  # Guards replica state and balancing counters
+        self._closed = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="ollama-pool-loop", daemon=True).start()
         atexit.register(self.close)
 
-    def submit(self, messages, **kwargs):
-        # Round-robin selection
-        with self._lock:
-            r = next(self._rr)
+        self.started_at = time.monotonic()
+        self.deadline = self.started_at + startup_timeout
+        for r in self.replicas:
+            self._spawn(r, self.deadline)
+
+        if not self.wait_ready(min(wait_for, replicas)):
+            errors = "; ".join(str(r.error) for r in self.replicas if r.error)
+            self.close()
+            raise RuntimeError(f"No Ollama replica ready within {startup_timeout}s ({errors or 'timed out'})")
+
+        threading.Thread(target=self._monitor, daemon=True).start()
+
+    def _set_state(self, replica, state):
+        with self._changed:
+            replica.state = state
+            self._changed.notify_all()
+
+    def _spawn(self, replica, deadline):
+        if self._closed.is_set():
+            return
+        self._set_state(replica, "starting")
+        replica.launch()
+        threading.Thread(target=self._bring_up, args=(replica, deadline), daemon=True).start()
+
+    def _bring_up(self, replica, deadline):
+        try:
+            replica.wait_healthy(deadline)
+            self._ensure_model(replica, deadline)
+            replica.warm(deadline)
+        except Exception as e:
+            replica.error = e
+            replica.stop()
+            with self._changed:
+                replica.backoff = min(max(replica.backoff * 2, self.min_backoff), self.max_backoff)
+                replica.retry_at = time.monotonic() + replica.backoff
+                self._set_state(replica, "failed")
+            print(f"Replica :{replica.port} failed to start: {e}")
+            return
+
+        with self._changed:
+            replica.failures = 0
+            replica.backoff = 0.0
+            replica.error = None
+            self._set_state(replica, "ready")
+        print(f"Replica :{replica.port} ready after {time.monotonic() - self.started_at:.1f}s")
+
+    def _ensure_model(self, replica, deadline):
+        # Pull once into the shared models dir; everyone else only reads it
+        with self._pull_lock:
+            if not self._model_present:
+                if not replica.has_model():
+                    replica.pull(deadline)
+                self._model_present = True
+
+    def _monitor(self):
+        while not self._closed.wait(self.probe_interval):
+            now = time.monotonic()
+            for r in self.replicas:
+                if self._closed.is_set():
+                    return
+                if r.state in ("ready", "ejected") and not r.alive():
+                    print(f"Replica :{r.port} exited (code {r.proc.returncode}); respawning")
+                    self._spawn(r, now + self.startup_timeout)
+                elif r.state == "ejected" and now >= r.retry_at:
+                    if r.probe():
+                        # Half-open: back in rotation, but one more failure ejects it again
+                        with self._changed:
+                            r.failures = self.failure_threshold - 1
+                            self._set_state(r, "ready")
+                        print(f"Replica :{r.port} passed its health probe; back on probation")
+                    else:
+                        print(f"Replica :{r.port} failed its health probe; restarting")
+                        r.stop()
+                        self._spawn(r, now + self.startup_timeout)
+                elif r.state == "failed" and now >= r.retry_at:
+                    self._spawn(r, now + self.startup_timeout)
+
+    def ready_replicas(self):
+        return [r for r in self.replicas if r.ready]
+
+    def wait_ready(self, n=None, timeout=None):
+        # Block until n replicas (default: all) are ready; False if that can no longer happen in time
+        n = len(self.replicas) if n is None else n
+        deadline = self.deadline if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            while len(self.ready_replicas()) < n:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not any(r.state == "starting" for r in self.replicas):
+                    return False
+                self._changed.wait(remaining)
+        return True
+
+    def _acquire(self, exclude=()):
+        # Least outstanding requests, weighted by how fast each replica has been
+        with self._changed:
+            ready = [r for r in self.replicas if r.ready and r not in exclude]
+            if not ready:
+                raise RuntimeError("No Ollama replica is ready")
+            known = [r.ewma for r in ready if r.ewma is not None]
+            default = sum(known) / len(known) if known else 1.0
+            r = min(ready, key=lambda r: ((r.inflight + 1) * (r.ewma if r.ewma is not None else default), r.inflight))
+            r.inflight += 1
+            return r
+
+    def _release(self, replica, elapsed=None, failed=False):
+        with self._changed:
+            replica.inflight -= 1
+            if failed:
+                replica.failures += 1
+                if replica.failures >= self.failure_threshold and replica.state == "ready":
+                    replica.backoff = min(max(replica.backoff * 2, self.min_backoff), self.max_backoff)
+                    replica.retry_at = time.monotonic() + replica.backoff
+                    self._set_state(replica, "ejected")
+                    print(f"Replica :{replica.port} ejected after {replica.failures} failures; "
+                          f"re-probing in {replica.backoff:.0f}s")
+            elif elapsed is not None:
+                replica.requests += 1
+                replica.failures = 0
+                replica.backoff = 0.0
+                a = self.EWMA_ALPHA
+                replica.ewma = elapsed if replica.ewma is None else a * elapsed + (1 - a) * replica.ewma
+
+    def _client(self, replica):
+        # Runs on the pool loop; a respawned daemon gets a fresh client
+        if replica.client_generation != replica.generation:
+            if replica.client is not None:
+                self._loop.create_task(replica.client.aclose())
+            replica.client = KeepAliveClient("127.0.0.1", replica.port, max_connections=self.connections_per_replica,
+                                             timeout=self.request_timeout)
+            replica.client_generation = replica.generation
+        return replica.client
+
+    async def _submit(self, messages, **kwargs):
+        tried = []
+        error = None
+        for _ in range(self.retries + 1):
+            try:
+                r = self._acquire(exclude=tried)
+            except RuntimeError:
+                if error is not None:
+                    break
+                raise
+            start = time.monotonic()
+            try:
+                self._client(r)
+                out = await r.achat(messages, **kwargs)
+            except Exception as e:
+                failed = is_replica_failure(e)
+                self._release(r, failed=failed)
+                if not failed:
+                    raise
+                # Fail over to a replica we haven't tried yet
+                tried.append(r)
+                error = e
+                continue
+            except BaseException:
+                self._release(r)  # Cancelled
+                raise
+            self._release(r, elapsed=time.monotonic() - start)
+            return out
+        raise error
+
+    async def _map(self, list_of_messages, concurrency=None, **kwargs):
+        limit = asyncio.Semaphore(concurrency or len(self.replicas))
+        async def one(messages):
+            async with limit:
+                return await self._submit(messages, **kwargs)
+        return await asyncio.gather(*(one(m) for m in list_of_messages))
+
+    async def _stream(self, messages, **kwargs):
+        tried = []
+        error = None
+        for _ in range(self.retries + 1):
+            try:
+                r = self._acquire(exclude=tried)
+            except RuntimeError:
+                if error is not None:
+                    break
+                raise
+            start = time.monotonic()
+            started = False
+            try:
+                self._client(r)
+                async for piece in r.astream(messages, **kwargs):
+                    started = True
+                    yield piece
+            except Exception as e:
+                failed = is_replica_failure(e)
+                self._release(r, failed=failed)
+                # Only fail over if nothing has been handed to the caller yet
+                if not failed or started:
+                    raise
+                tried.append(r)
+                error = e
+                continue
+            except BaseException:
+                self._release(r)  # Cancelled or closed early by the caller
+                raise
+            self._release(r, elapsed=time.monotonic() - start)
+            return
+        raise error
+
+    def _on_loop(self):
         try:
-            return r.chat(messages, **kwargs)
-        except Exception:
-            # simple failover: try the next replica once
-            with self._lock:
-                r2 = next(self._rr)
-            return r2.chat(messages, **kwargs)
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    async def asubmit(self, messages, **kwargs):
+        if self._on_loop():
+            return await self._submit(messages, **kwargs)
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._submit(messages, **kwargs), self._loop))
+
+    async def amap(self, list_of_messages, concurrency=None, **kwargs):
+        # Results in input order; at most `concurrency` requests in flight (default: one per replica)
+        coro = self._map(list_of_messages, concurrency, **kwargs)
+        if self._on_loop():
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._loop))
+
+    async def astream(self, messages, **kwargs):
+        if self._on_loop():
+            async for piece in self._stream(messages, **kwargs):
+                yield piece
+            return
+
+        # Called from another event loop: pump the stream on the pool loop into a local queue
+        caller = asyncio.get_running_loop()
+        pieces = asyncio.Queue()
+        done = object()
+        def deliver(item):
+            try:
+                caller.call_soon_threadsafe(pieces.put_nowait, item)
+            except RuntimeError:
+                pass  # The caller's loop has already closed
+        async def pump():
+            try:
+                async for piece in self._stream(messages, **kwargs):
+                    deliver((piece, None))
+                deliver((done, None))
+            except BaseException as e:
+                deliver((done, e))
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        try:
+            while True:
+                piece, error = await pieces.get()
+                if piece is done:
+                    if error is not None and not isinstance(error, asyncio.CancelledError):
+                        raise error
+                    return
+                yield piece
+        finally:
+            future.cancel()
+
+    def _run(self, coro):
+        if self._on_loop():
+            coro.close()
+            raise RuntimeError("Blocking OllamaPool call from its own event loop; use the async API")
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def submit(self, messages, **kwargs):
+        return self._run(self._submit(messages, **kwargs))
 
     def map(self, list_of_messages, max_workers=None, **kwargs):
-        results = [None] * len(list_of_messages)
-        def work(ix_msgs):
-            i, msgs = ix_msgs
-            results[i] = self.submit(msgs, **kwargs)
-        with ThreadPoolExecutor(max_workers=max_workers or len(self.replicas)) as ex:
-            ex.map(work, enumerate(list_of_messages))
-        return results
+        return self._run(self._map(list_of_messages, max_workers, **kwargs))
+
+    def stats(self):
+        with self._changed:
+            return [{"port": r.port, "state": r.state, "inflight": r.inflight, "requests": r.requests,
+                     "ewma_ms": round(r.ewma * 1000, 1) if r.ewma is not None else None,
+                     "failures": r.failures} for r in self.replicas]
 
     def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        async def close_clients():
+            for r in self.replicas:
+                if r.client is not None:
+                    await r.client.aclose()
+        if self._loop.is_running():
+            try:
+                asyncio.run_coroutine_threadsafe(close_clients(), self._loop).result(timeout=5)
+            except Exception:
+                pass
+            self._loop.call_soon_threadsafe(self._loop.stop)
         for r in self.replicas:
             r.stop()
+            r.state = "stopped"
 
 
 MODEL_NAME = "phi4-mini:latest"
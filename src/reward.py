@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+import os, re, time, math, zlib, random, pickle, sqlite3
+from array import array
+
+WHITESPACE = re.compile(r"\s+")
+
+# crc32 start values, so words, word pairs and character n-grams hash into separate streams
+WORD, PAIR, CHARS = 1, 2, 3
+
+def target(likes, replies, clanks):
+    # likes + replies - clanks, log-squashed so one viral post doesn't dominate
+    raw = likes + replies - clanks
+    return math.copysign(math.log1p(abs(raw)), raw)
+
+def top_k(candidates, k, model=None, accept=None):
+    """
+    The best k distinct candidates by predicted engagement, as [(score, text)]
+    (score None without a model), skipping any that `accept` rejects (e.g. a
+    novelty check). Returns (kept, number rejected).
+    """
+    candidates = list(dict.fromkeys(t for t in candidates if t))
+    ranked = model.rank(candidates) if model is not None else [(None, t) for t in candidates]
+    kept, rejected = [], 0
+    for score, text in ranked:
+        if len(kept) == k:
+            break
+        if accept is not None and not accept(text):
+            rejected += 1
+            continue
+        kept.append((score, text))
+    return kept, rejected
+
+class RewardModel:
+    """
+    Predicts a post's engagement (likes + replies - clanks, log-scaled) from
+    its text: a linear model over signed, hashed features (words, word pairs
+    and character 4-grams), trained with SGD on posts and their
+    new_engagements rows.
+
+    refresh() is incremental: it only reads posts that are new or have new
+    engagements since the last call (by id high-water marks), updates their
+    labels, and runs a few SGD epochs over them plus a random replay sample
+    of older examples. Posts younger than `min_age` seconds aren't used yet,
+    since they haven't had a chance to collect engagement. Deleted
+    engagements are only picked up when the post gets a new one.
+
+    `user` limits training to one author's posts (user_lc); None uses all.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path=None, bits=18, ngram=4, lr=0.05, l2=1e-6, user=None, min_age=3600):
+        self.path = path
+        self.bits = bits
+        self.mask = (1 << bits) - 1
+        self.ngram = ngram
+        self.lr = lr
+        self.l2 = l2
+        self.user = user
+        self.min_age = min_age
+        self.weights = array("d", bytes(8 << bits))
+        self.bias = 0.0
+        self.examples = {}  # post id -> (text, target)
+        self.last_post_id = 0
+        self.last_engagement_id = 0
+
+    def params(self):
+        return (self.bits, self.ngram, self.user)
+
+    def features(self, text):
+        """[(index, value)] for a text; values are ±1/sqrt(n) so long posts don't score higher by default"""
+        text = WHITESPACE.sub(" ", text.lower()).strip()
+        words = text.split(" ")
+        data = text.encode("utf-8")
+        crc, n = zlib.crc32, self.ngram
+        hashes = [crc(w.encode("utf-8"), WORD) for w in words]
+        hashes += [crc(f"{a} {b}".encode("utf-8"), PAIR) for a, b in zip(words, words[1:])]
+        hashes += [crc(data[i:i + n], CHARS) for i in range(max(len(data) - n + 1, 1))]
+        scale = 1.0 / math.sqrt(len(hashes))
+        mask = self.mask
+        return [(h & mask, -scale if h & 0x80000000 else scale) for h in hashes]
+
+    def predict(self, feats):
+        w = self.weights
+        return self.bias + sum(w[i] * v for i, v in feats)
+
+    def score(self, text):
+        return self.predict(self.features(text))
+
+    def score_many(self, texts):
+        return [self.predict(self.features(t)) for t in texts]
+
+    def rank(self, texts):
+        """texts sorted best first, as (score, text)"""
+        return sorted(zip(self.score_many(texts), texts), key=lambda p: p[0], reverse=True)
+
+    def _step(self, feats, y):
+        w, lr, l2 = self.weights, self.lr, self.l2
+        err = self.predict(feats) - y
+        for i, v in feats:
+            w[i] -= lr * (err * v + l2 * w[i])
+        self.bias -= lr * err
+        return err * err
+
+    def train(self, examples, epochs=3, rng=None):
+        """SGD over (text, target) pairs; returns the last epoch's mean squared error"""
+        rng = rng or random.Random(0)
+        examples = [(self.features(text), y) for text, y in examples]
+        loss = 0.0
+        for _ in range(epochs):
+            rng.shuffle(examples)
+            loss = sum(self._step(f, y) for f, y in examples) / max(len(examples), 1)
+        return loss
+
+    def refresh(self, db_path, epochs=3, replay=256):
+        """Pull new labels from the database and train on them; returns the number of posts updated"""
+        cutoff = int(time.time()) - self.min_age
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            has_engagements = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'new_engagements'"
+            ).fetchone()
+            if not has_engagements:
+                return 0
+            last_engagement_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM new_engagements").fetchone()[0]
+            rows = conn.execute('''
+                SELECT p.id, p.text,
+                       COUNT(CASE WHEN e.type = 'like' THEN 1 END),
+                       COUNT(CASE WHEN e.type = 'reply' THEN 1 END),
+                       COUNT(CASE WHEN e.type = 'clanked' THEN 1 END)
+                FROM posts p
+                LEFT JOIN new_engagements e ON e.post_id = p.id
+                WHERE p.ts <= ?
+                  AND (? IS NULL OR p.user_lc = ?)
+                  AND (p.id > ? OR p.id IN (SELECT post_id FROM new_engagements WHERE id > ?))
+                GROUP BY p.id
+            ''', (cutoff, self.user, self.user, self.last_post_id, self.last_engagement_id)).fetchall()
+        finally:
+            conn.close()
+
+        changed = []
+        for post_id, text, likes, replies, clanks in rows:
+            if not text:
+                continue
+            self.examples[post_id] = (text, target(likes, replies, clanks))
+            changed.append(post_id)
+            self.last_post_id = max(self.last_post_id, post_id)
+        self.last_engagement_id = last_engagement_id
+        if changed:
+            fresh = set(changed)
+            older = [p for p in self.examples if p not in fresh]
+            sample = random.sample(older, min(replay, len(older)))
+            self.train([self.examples[p] for p in changed + sample], epochs)
+        return len(changed)
+
+    def save(self, path=None):
+        path = path or self.path
+        state = {"version": self.VERSION, "params": self.params(), "weights": self.weights, "bias": self.bias,
+                 "examples": self.examples, "last_post_id": self.last_post_id,
+                 "last_engagement_id": self.last_engagement_id}
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def open(cls, path, db_path=None, **kwargs):
+        """Load the model at `path` (untrained if missing or built with other parameters), then refresh it from db_path"""
+        model = cls(path, **kwargs)
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            state = None
+        if state and state.get("version") == cls.VERSION and tuple(state["params"]) == model.params():
+            model.weights = state["weights"]
+            model.bias = state["bias"]
+            model.examples = state["examples"]
+            model.last_post_id = state["last_post_id"]
+            model.last_engagement_id = state["last_engagement_id"]
+        if db_path is not None and model.refresh(db_path):
+            model.save()
+        return model
@@ -1,10 +1,12 @@
-from transformers import AutoModelForCausalLM, AutoTokenizer
-import os
+import os, sys
+import torch
+from pathlib import Path
 os.environ["CUDA_VISIBLE_DEVICES"] = "0"  # or "0,1" for multiple GPUs
 
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from src.tune.loader import load_model
 
-model = AutoModelForCausalLM.from_pretrained("microsoft/Phi-3-mini-4k-instruct")
-tokenizer = AutoTokenizer.from_pretrained("microsoft/Phi-3-mini-4k-instruct")
+model, tokenizer = load_model("microsoft/Phi-3-mini-4k-instruct", torch.float32)
 
 messages = [{"role": "user", "content": "Can you provide ways to eat combinations of bananas and dragonfruits?"}]
 inputs = tokenizer.apply_chat_template(messages, add_generation_prompt=True, return_tensors="pt")
@@ -1,5 +1,8 @@
-import os, gc, random, torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
+import os, gc, sys, random, torch
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from src.tune.loader import load_model
 
 os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True")
 torch.backends.cuda.matmul.allow_tf32 = True
@@ -8,15 +11,8 @@ device = "cuda"
 MODEL = "microsoft/Phi-3-mini-4k-instruct"
 SAVE_DIR = "./phi3_full_ft_fp16"
 
-tok = AutoTokenizer.from_pretrained(MODEL)
-
-# Load once on CPU, clone fresh fp16 model, then move to GPU (avoid two GPU copies)
-base = AutoModelForCausalLM.from_pretrained(MODEL, torch_dtype=torch.float16, device_map=None)
-model = AutoModelForCausalLM.from_config(base.config).to(dtype=torch.float16)
-model.load_state_dict(base.state_dict(), strict=True)
-del base; gc.collect(); torch.cuda.empty_cache()
-
-model = model.to(device)
+# One copy: weights are mapped from the fp16 cache and copied straight to the GPU
+model, tok = load_model(MODEL, torch.float16, device)
 model.gradient_checkpointing_enable()
 model.config.use_cache = False
 model.train()
@@ -52,8 +48,8 @@ print(f"Saved to {SAVE_DIR}")
 
 # ---- test: 10 generations using the saved model ----
 del model; gc.collect(); torch.cuda.empty_cache()
-model = AutoModelForCausalLM.from_pretrained(SAVE_DIR, torch_dtype=torch.float16).to(device)
-tok = AutoTokenizer.from_pretrained(SAVE_DIR)
+# Already fp16 safetensors, so it's mapped in place rather than converted
+model, tok = load_model(SAVE_DIR, torch.float16, device)
 model.eval()
 
 prompts = [
@@ -1,20 +1,25 @@
 #!/usr/bin/env python3
-import torch, gc
-from transformers import AutoModelForCausalLM, AutoTokenizer
+import os, sys, torch
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from src.tune.loader import load_model
+from src.tune.cpu_infer import load_cpu_model, chat_generate
 
 MODEL_DIR = "./phi3_full_ft_fp16"
 device = "cuda" if torch.cuda.is_available() else "cpu"
+# CPU weights: int8 (default), int4 or fp32; CPU_THREADS defaults to the physical core count
+CPU_QUANT = os.environ.get("CPU_QUANT", "int8")
+CPU_THREADS = int(os.environ["CPU_THREADS"]) if os.environ.get("CPU_THREADS") else None
 
-tok = AutoTokenizer.from_pretrained(MODEL_DIR)
+if device == "cuda":
+    model, tok = load_model(MODEL_DIR, torch.float16, device)
+    model.eval()
+else:
+    model, tok = load_cpu_model(MODEL_DIR, CPU_QUANT, CPU_THREADS)
 if tok.pad_token_id is None:
     tok.pad_token_id = tok.eos_token_id
 
-model = AutoModelForCausalLM.from_pretrained(
-    MODEL_DIR,
-    torch_dtype=torch.float16 if device == "cuda" else torch.float32
-).to(device)
-model.eval()
-
 prompts = [
     "Write a two-sentence idea for a sci-fi short.",
     "Give a quirky startup concept involving fruit.",
@@ -28,24 +33,17 @@ prompts = [
     "Tell a one-paragraph folk tale."
 ]
 
-@torch.inference_mode()
 def generate(prompt):
-    msgs = [{"role": "user", "content": prompt}]
-    inputs = tok.apply_chat_template(
-        msgs, add_generation_prompt=True, return_tensors="pt"
-    ).to(device)
-
-    out = model.generate(
-        inputs,
+    text, _ = chat_generate(
+        model, tok, prompt, device,
         max_new_tokens=96,
         do_sample=True,
         temperature=0.8,
         top_p=0.95,
         repetition_penalty=1.1,
-        pad_token_id=tok.pad_token_id,
-        eos_token_id=tok.eos_token_id
     )
-    return tok.batch_decode(out, skip_special_tokens=True)[0]
+    return text
 
-for i, p in enumerate(prompts, 1):
-    print(f"\n=== Sample {i} ===\n{generate(p)}\n")
+if __name__ == "__main__":
+    for i, p in enumerate(prompts, 1):
+        print(f"\n=== Sample {i} ===\n{generate(p)}\n")
@@ -1,46 +1,47 @@
 #!/usr/bin/env python3
+"""
+Online training loop for @averagefrench, as two processes:
+
+    python src/tune/4_online.py            # both, as subprocesses
+    python src/tune/4_online.py train      # trainer only
+    python src/tune/4_online.py generate   # generator only
+
+The trainer fine-tunes a LoRA adapter on newly engaged posts and publishes
+each generation's adapter to CHECKPOINT_DIR (see checkpoints.py). The
+generator keeps sampling and posting, and at the start of every round
+switches to whatever the trainer has published since, without reloading
+the base model, so posting never waits on a training step. Rounds are
+ONLINE_ROUND_DELAY seconds apart (default 60). Each process holds its own
+copy of the base weights.
+"""
 
+import os
 import sqlite3
+import subprocess
 import time
-from datetime import datetime, timedelta
+import argparse
 from pathlib import Path
 import sys
 
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
-from transformers import AutoTokenizer, AutoModelForCausalLM
-from peft import LoraConfig, get_peft_model, TaskType
 import torch
-import json
-import random
-import gc
-
-
-def mustache(template: str, data: dict) -> str:
-    for k, v in data.items():
-        template = template.replace("{{" + k + "}}", str(v))
-    return template
-
-def pick(items, k=1):
-    items = list(items or [])
-    if not items or k <= 0: return []
-    k = min(k, len(items))
-    return random.sample(items, k)
-
-def gen_inference_prompt():
-    char_path = Path(__file__).parent.parent.parent / "data" / "character.json"
-    char = json.loads(char_path.read_text(encoding="utf-8"))
-    name = char.get("name") or char.get("id") or "agent"
-    handle = char.get("twitter", name)
-
-    bio = " • ".join(pick(char.get("bio"), k=3))
-    lore = " • ".join(pick(char.get("lore"), k=3))
-    recent_posts = "\n".join(f"- {p}" for p in pick(char.get("postExamples"), k=5))
-    adjective = random.choice(char.get("adjectives", ["laconic","direct","teasing"]))
-    topic = random.choice(char.get("topics", ["cigarettes","romance","nighttime"]))
-
-    PROMPT = """You are {{agentName}} (@{{twitterUserName}}).
+
+from src.post_sink import PostSink
+from src.prompts import Character, PromptBuilder
+from src.novelty import NoveltyIndex
+from src.reward import RewardModel, top_k
+from src.bandit import StrategyBandit
+from src.tune.sampling import sample_batch
+from src.tune.trainer import OnlineTrainer
+from src.tune.checkpoints import checkpoint_lock, latest_checkpoint, lineage
+from src.tune.adapters import TRAINABLE, AdapterSwitcher, attach_lora
+from src.tune.loader import load_model
+
+
+
+PROMPT = """You are {{agentName}} (@{{twitterUserName}}).
 {{bio}}
 {{lore}}
 
@@ -49,7 +50,7 @@ Write exactly ONE tweet in the voice and style of {{agentName}}.
 - Max 280 characters.
 - One to three short lines only.
 - No hashtags unless natural.
-- No questions.
+{{style}}
 - Lowercase english unless a french phrase is natural.
 - Brief, concise, and completely in-character.
 - Never acknowledge this request.
@@ -66,228 +67,216 @@ it kills"
 Output:
 """
 
-    prompt = mustache(PROMPT, {
-        "agentName": name,
-        "twitterUserName": handle,
-        "bio": bio,
-        "lore": lore,
-        "recentPosts": recent_posts,
-        "adjective": adjective,
-        "topic": topic
-    })
-
-    return prompt
-gen_inference_prompt()
-
+prompts = PromptBuilder(PROMPT, Character(Path(__file__).parent.parent.parent / "data" / "character.json"))
 
+# Posting strategies the bandit splits samples between: a style line for the prompt, and the adapter
+# that writes it (None: the latest published, n: its ancestor n generations back)
+STRATEGIES = {
+    "observations": ("- A small observation. No questions.", None),
+    "poetry": ("- A tiny poem in short broken lines. No questions.", None),
+    "questions": ("- End on a question to the reader.", None),
+    "confessions": ("- A small private confession. No questions.", None),
+    "observations-5gen": ("- A small observation. No questions.", 5),
+}
 
+def gen_inference_prompts(strategies):
+    # One character draw per round, so the prompts only differ from the style line on and
+    # sample_batch() runs everything before it through the model once
+    return prompts.variants([{"style": STRATEGIES[s][0]} for s in strategies])
 
-
-
-
-
-# Load base Qwen model
-print("Loading base Qwen model...")
 model_name = "microsoft/Phi-3-mini-4k-instruct"
 device = "cuda" if torch.cuda.is_available() else "cpu"
-
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-# base = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.float16, device_map=None)
-model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.float16).to(device)
-# model = AutoModelForCausalLM.from_config(base.config).to(dtype=torch.float16)
-# model.load_state_dict(base.state_dict(), strict=True)
-# del base; gc.collect(); torch.cuda.empty_cache()
-
-# model = model.to(device)
-model.gradient_checkpointing_enable()
-# model.config.use_cache = False
-model.train()
-
-if tokenizer.pad_token is None:
-    tokenizer.pad_token = tokenizer.eos_token
-    print(f"Set pad_token to eos_token: {tokenizer.pad_token}")
-
-print("Model loaded successfully!")
-
-# Initialize generation counter
-generation = 0
-
-print("Entering training loop...")
-print("Press Ctrl+C to stop")
-
-while True:
-    print(f"\n{'='*50}")
-    print(f"ONLINE TRAIN GENERATION {generation}")
-    print(f"{'='*50}")
-    
-    # Get recent engaging tweets
-    print("Fetching recent engaging tweets...")
-    
-    db_path = Path(__file__).parent.parent.parent / "data" / "tweets.db"
-    conn = sqlite3.connect(str(db_path))
-    cursor = conn.cursor()
-    
-    cutoff_time = int((datetime.now() - timedelta(hours=2)).timestamp())
-    
-    cursor.execute('''
-        SELECT p.id, p.text, p.timestamp,
-               COUNT(DISTINCT CASE WHEN e.type = 'like' THEN e.id END) as like_count,
-               COUNT(DISTINCT CASE WHEN e.type = 'reply' THEN e.id END) as reply_count,
-               COUNT(DISTINCT CASE WHEN e.type = 'clanked' THEN e.id END) as clanked_count
-        FROM posts p
-        LEFT JOIN new_engagements e ON p.id = e.post_id
-        WHERE p.user = 'AverageFrench' 
-          AND p.timestamp > ?
-        GROUP BY p.id
-        HAVING (like_count + reply_count + clanked_count) > 0
-        ORDER BY p.timestamp DESC
-        LIMIT 15
-    ''', (cutoff_time,))
-    
-    tweets = []
-    for row in cursor.fetchall():
-        likes = row[3]
-        replies = row[4]
-        clanks = row[5]
-        total_engagements = likes + replies - clanks
-        tweets.append({
-            'text': row[1],
-            'total_engagements': total_engagements
-        })
-    
-    conn.close()
-    
-    if not tweets:
-        print("No engaging tweets found in the past 2 hours")
-        print("Waiting 1 minute before next iteration...")
-        time.sleep(60)
-        generation += 1
-        continue
-    
-    print(f"Found {len(tweets)} engaging tweets")
-    
-    # Create fine-tuning prompt
-    best_tweets = sorted(tweets, key=lambda x: x['total_engagements'], reverse=True)[:5]
-    bad_tweets = sorted(tweets, key=lambda x: x['total_engagements'])[:3]
-    
-    fine_tune_prompt = "You are @averagefrench.\n\n"
-    fine_tune_prompt += "Best tweets:\n"
-    for tweet in best_tweets:
-        fine_tune_prompt += f"- {tweet['text']}\n"
-    
-    fine_tune_prompt += "Worst tweets:\n"
-    for tweet in bad_tweets:
-        fine_tune_prompt += f"- {tweet['text']}\n"
-    
-        
-    print("Fine-tuning prompt created")
-    
-    # Fine-tune model
-    print("Starting fine-tuning...")
-    
-    
-    
-    # Prepare training data - simple text format, no chat template
-    inputs = tokenizer(fine_tune_prompt, return_tensors="pt", truncation=True, max_length=512).to(device)
-    
-    # Set model to training mode
-    model.gradient_checkpointing_enable()
-    model.config.use_cache = False
-    model.train()
-
-    # 8-bit Adam to keep optimizer memory low
-    import bitsandbytes as bnb
-    opt = bnb.optim.Adam8bit(model.parameters(), lr=1e-5)  # Lower learning rate
-
-    for step in range(10):
-        opt.zero_grad(set_to_none=True)
-        out = model(inputs.input_ids, labels=inputs.input_ids)  # Use input_ids for both
-        loss = out.loss
-        
-        # Check for NaN loss
-        if torch.isnan(loss):
-            print(f"NaN loss detected at step {step}, skipping...")
+db_path = Path(__file__).parent.parent.parent / "data" / "tweets.db"
+CHECKPOINT_DIR = str(Path(__file__).parent.parent.parent / "data" / "online_adapters")
+# Every training generation's adapter is published; the last KEEP_ADAPTERS of the served lineage stay
+# on disk for rollback
+KEEP_ADAPTERS = 10
+NUM_SAMPLES = 10
+KEEP_TOP_K = 3
+# Seconds the generator waits between rounds, so it posts at a steady pace (0 to go flat out)
+ROUND_DELAY = float(os.environ.get("ONLINE_ROUND_DELAY", 60))
+
+def load_base():
+    print(f"Loading base model {model_name}...")
+    # Both processes map the same fp16 cache, so on CPU they share its pages
+    base, tokenizer = load_model(model_name, torch.float16, device)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+        print(f"Set pad_token to eos_token: {tokenizer.pad_token}")
+    return base, tokenizer
+
+def train():
+    base, tokenizer = load_base()
+    # Only a LoRA adapter is trained; continue the last published one if there is one, or roll back
+    # to an older one by pointing ONLINE_ADAPTER at its directory
+    resume_from = os.environ.get("ONLINE_ADAPTER") or latest_checkpoint(CHECKPOINT_DIR)
+    if resume_from:
+        print(f"Resuming adapter from {resume_from}")
+    model = attach_lora(base, resume_from)
+    model.eval()
+    model.print_trainable_parameters()
+
+    # Optimizer state, engagement high-water mark and generation counter live here across generations
+    trainer = OnlineTrainer(model, tokenizer, device, user='averagefrench', lr=2e-4,
+                            checkpoint_dir=CHECKPOINT_DIR, keep=KEEP_ADAPTERS, adapter=TRAINABLE)
+    if resume_from:
+        trainer.resume(resume_from)
+
+    print("Entering training loop...")
+    print("Press Ctrl+C to stop")
+
+    while True:
+        print(f"\n{'='*50}")
+        print(f"ONLINE TRAIN GENERATION {trainer.generation}")
+        print(f"{'='*50}")
+
+        # Posts engaged with since the last generation
+        print("Fetching newly engaged tweets...")
+        tweets = trainer.fetch_examples(db_path)
+
+        if not tweets:
+            print("No new engagement since the last generation")
+            print("Waiting 1 minute before next iteration...")
+            time.sleep(60)
             continue
-            
-        loss.backward()
-        
-        # Gradient clipping to prevent explosion
-        torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=1.0)
-        
-        opt.step()
-        
-        print(f"step {step} loss {loss.item():.4f}")
-
-    # ---- save for later inference ----
-    model.gradient_checkpointing_disable()
-    model.config.use_cache = True
+
+        print(f"Found {len(tweets)} engaging tweets")
+
+        # Fine-tune model, padded batches of tweets with the optimizer state carried over
+        print("Starting fine-tuning...")
+        start = time.perf_counter()
+        loss = trainer.train([text for text, _ in tweets])
+        if loss is not None:
+            print(f"generation {trainer.generation} mean loss {loss:.4f}")
+        print(f"Published {trainer.save()} after {time.perf_counter() - start:.1f}s")
+        trainer.generation += 1
+
+def generate():
+    base, tokenizer = load_base()
+    # The wrapper's own adapter is freshly initialised (a no-op) and only used until the trainer publishes
+    model = attach_lora(base)
     model.eval()
 
-    
-    # Generate completions
-    print("Generating completions...")
-    
-    inference_prompt = gen_inference_prompt()
-
-    completions = []
-    
-    for i in range(10):
-        # Simple text encoding without chat template
-        inputs = tokenizer(inference_prompt, return_tensors="pt", truncation=True, max_length=512).to(device)
-        
-        with torch.no_grad():
-            outputs = model.generate(
-                inputs.input_ids,
-                attention_mask=inputs.attention_mask,
-                temperature=0.9,
-                do_sample=True,
-                num_return_sequences=1,
-                max_new_tokens=64,  # Shorter to avoid empty outputs
-                top_p=0.9,
-                repetition_penalty=1.1,
-                pad_token_id=tokenizer.eos_token_id,  # Use eos as pad
-                eos_token_id=tokenizer.eos_token_id,
-                bos_token_id=tokenizer.bos_token_id if tokenizer.bos_token_id else None
-            )
-        
-        # Decode the full output and extract just the new part
-        full_output = tokenizer.decode(outputs[0], skip_special_tokens=True)
-        # Remove the input prompt to get just the generated part
-        if full_output.startswith(inference_prompt):
-            generated_text = full_output[len(inference_prompt):].strip()
+    sink = PostSink(db_path, user='AverageFrench', tagged=True)
+    # Near-duplicates of existing posts (or of each other) are dropped
+    novelty = NoveltyIndex.open(str(db_path) + ".novelty", db_path)
+    # Engagement predictor, retrained incrementally each round; only the best samples get posted
+    reward = RewardModel.open(str(db_path) + ".reward", db_path, user='averagefrench')
+    # Thompson sampling over each strategy's share of posts with net positive engagement
+    bandit = StrategyBandit(STRATEGIES, user='averagefrench')
+    # Published adapters are loaded next to each other, never by reloading the base
+    switcher = AdapterSwitcher(model, max_loaded=len(STRATEGIES))
+
+    def adapter_for(strategy, chain):
+        # chain is the published lineage, newest first; a rolled back branch is not in it
+        if not chain:
+            return TRAINABLE
+        back = STRATEGIES[strategy][1] or 0
+        return switcher.load(chain[min(back, len(chain) - 1)])
+
+    print("Entering generation loop...")
+    print("Press Ctrl+C to stop")
+
+    serving = None
+    round_ = 0
+    while True:
+        print(f"\n{'='*50}")
+        print(f"ONLINE GENERATE ROUND {round_}")
+        print(f"{'='*50}")
+
+        bandit.refresh(db_path)
+        for strategy, (posts, wins, mean) in bandit.stats().items():
+            print(f"  {strategy:<20} {wins}/{posts} engaged, posterior mean {mean:.2f}")
+        strategies = [s for s, n in bandit.allocate(NUM_SAMPLES).items() for _ in range(n)]
+        print("Strategies this round: " + ", ".join(f"{s} x{strategies.count(s)}" for s in dict.fromkeys(strategies)))
+
+        # Pick up whatever the trainer has published since the last round; the shared lock keeps it
+        # from pruning a checkpoint while it's being loaded
+        with checkpoint_lock(CHECKPOINT_DIR, shared=True):
+            chain = lineage(CHECKPOINT_DIR)
+            adapters = {s: adapter_for(s, chain) for s in set(strategies)}
+        if chain and chain[0] != serving:
+            serving = chain[0]
+            print(f"Now serving {os.path.basename(serving)}")
+
+        # One generate() call for every strategy; rows are grouped by adapter and each row uses its own
+        print("Generating completions...")
+        samples, stats = sample_batch(
+            model, tokenizer, gen_inference_prompts(strategies), device,
+            adapter_names=[adapters[s] for s in strategies],
+            temperature=0.9,
+            do_sample=True,
+            max_new_tokens=64,  # Shorter to avoid empty outputs
+            top_p=0.9,
+            repetition_penalty=1.1,
+            pad_token_id=tokenizer.eos_token_id,  # Use eos as pad
+            eos_token_id=tokenizer.eos_token_id,
+            bos_token_id=tokenizer.bos_token_id if tokenizer.bos_token_id else None,
+            use_cache=True
+        )
+        print(f"Sampled {stats['samples']} completions, {stats['new_tokens']} tokens in {stats['seconds']:.2f}s "
+              f"({stats['tokens_per_sec']:.1f} tokens/s, {stats['prefix_tokens']} prompt tokens shared)")
+
+        candidates = []
+        strategy_of = {}
+        for i, (strategy, generated_text) in enumerate(zip(strategies, samples)):
+            print(f"Generated {i+1} ({strategy}): '{generated_text}'")
+            strategy_of.setdefault(generated_text, strategy)
+
+            if generated_text and len(generated_text) <= 280 and len(generated_text) > 5:  # Ensure it's not too short
+                candidates.append(generated_text)
+
+        if reward.refresh(db_path):
+            reward.save()
+        kept, repeats = top_k(candidates, KEEP_TOP_K, reward, novelty.check_and_add)
+        for score, text in kept:
+            print(f"Keeping ({score:+.2f}, {strategy_of[text]}): '{text}'")
+        if repeats:
+            print(f"Dropped {repeats} candidates too close to earlier posts")
+        completions = [text for _, text in kept]
+
+        # Insert generated tweets
+        if completions:
+            print("Inserting generated tweets...")
+
+            current_time = int(time.time())
+            for text in completions:
+                sink.add(text, ts=current_time, strategy=strategy_of[text])
+            try:
+                sink.flush()
+                novelty.sync(db_path)
+                novelty.save()
+                print(f"Inserted {len(completions)} generated tweets for round {round_}")
+            except sqlite3.Error as e:
+                print(f"Insert failed ({e}); {sink.pending()} tweets kept for the next flush")
         else:
-            generated_text = full_output.strip()
-
-        print(f"Generated {i+1}: '{generated_text}'")
-        
-        if generated_text and len(generated_text) <= 280 and len(generated_text) > 5:  # Ensure it's not too short
-            completions.append(generated_text)
-            
-    
-    # Insert generated tweets
-    if completions:
-        print("Inserting generated tweets...")
-        
-        conn = sqlite3.connect(str(db_path))
-        cursor = conn.cursor()
-        
-        current_time = datetime.now().isoformat()
-        
-        for i, text in enumerate(completions):
-            cursor.execute('''
-                INSERT INTO posts (text, user, timestamp)
-                VALUES (?, ?, ?)
-            ''', (text, 'AverageFrench', current_time))
-        
-        conn.commit()
-        conn.close()
-        
-        print(f"Inserted {len(completions)} generated tweets for generation {generation}")
+            print("No valid completions generated")
+
+        round_ += 1
+        if ROUND_DELAY > 0:
+            print(f"Waiting {ROUND_DELAY:g}s before the next round...")
+            time.sleep(ROUND_DELAY)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("role", nargs="?", choices=["train", "generate", "all"], default="all")
+    args = parser.parse_args()
+    if args.role == "train":
+        train()
+    elif args.role == "generate":
+        generate()
     else:
-        print("No valid completions generated")
-    
-    # Wait 1 minute
-    print("Waiting 1 minute before next generation...")
-    # time.sleep(60)
-    
-    generation += 1
+        procs = [subprocess.Popen([sys.executable, __file__, role]) for role in ("train", "generate")]
+        try:
+            # If either one exits, stop the other
+            while all(p.poll() is None for p in procs):
+                time.sleep(1)
+        finally:
+            for p in procs:
+                if p.poll() is None:
+                    p.terminate()
+            for p in procs:
+                p.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+LoRA adapters for the online loop. The base weights are loaded once and
+stay frozen; every generation keeps training the same small adapter and
+the trainer saves a snapshot of it (adapter weights + optimizer state) to
+its own directory. Any saved snapshot can be switched in for inference by
+loading it next to the trainable adapter, without reloading the base.
+"""
+
+import os
+from collections import OrderedDict
+from contextlib import contextmanager
+from peft import LoraConfig, PeftModel, TaskType, get_peft_model
+
+# Name of the adapter being trained; snapshots are loaded under other names
+TRAINABLE = "default"
+
+def lora_config(**overrides):
+    kwargs = dict(task_type=TaskType.CAUSAL_LM, r=8, lora_alpha=16, lora_dropout=0.05,
+                  target_modules="all-linear")
+    kwargs.update(overrides)
+    return LoraConfig(**kwargs)
+
+def attach_lora(base, resume_from=None, **overrides):
+    """The base model wrapped with a trainable adapter: a fresh one, or the snapshot at resume_from"""
+    # With a frozen base, gradient checkpointing only reaches the adapter if the inputs require grad
+    base.enable_input_require_grads()
+    if resume_from:
+        return PeftModel.from_pretrained(base, resume_from, adapter_name=TRAINABLE, is_trainable=True)
+    return get_peft_model(base, lora_config(**overrides), adapter_name=TRAINABLE)
+
+class AdapterSwitcher:
+    """
+    Switches a PeftModel between its trainable adapter and saved snapshots
+    (by directory). Snapshots are loaded on first use and the `max_loaded`
+    most recently used stay resident; older ones are deleted from the model.
+    Switching between resident adapters only changes which LoRA weights the
+    layers apply.
+    """
+
+    def __init__(self, model, max_loaded=4):
+        self.model = model
+        self.max_loaded = max_loaded
+        # snapshot path -> adapter name; checkpoint paths are never reused, so a path's weights never change
+        self.loaded = OrderedDict()
+        self.count = 0
+
+    def load(self, path):
+        path = os.path.abspath(path)
+        name = self.loaded.get(path)
+        if name is not None:
+            self.loaded.move_to_end(path)
+            return name
+        name = f"snapshot{self.count}"
+        self.count += 1
+        self.model.load_adapter(path, adapter_name=name, is_trainable=False)
+        self.loaded[path] = name
+        while len(self.loaded) > self.max_loaded:
+            _, old = self.loaded.popitem(last=False)
+            self.model.delete_adapter(old)
+        return name
+
+    def use(self, path=None):
+        """Make the snapshot at `path` the active adapter (None: the trainable one); returns its name"""
+        name = TRAINABLE if path is None else self.load(path)
+        self.model.set_adapter(name)
+        return name
+
+    @contextmanager
+    def using(self, path):
+        """Generate with a snapshot, switching back to the trainable adapter afterwards"""
+        self.use(path)
+        try:
+            yield self.model
+        finally:
+            self.use(None)
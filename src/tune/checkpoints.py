@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Versioned checkpoints shared between the online trainer and generator
+processes.
+
+A checkpoint is a directory `gen-NNNNNN` under the checkpoint directory,
+numbered in publish order. Numbers are never reused, so a path always
+means the same weights. Each checkpoint records the one it was trained
+from in a `parent` file, and `latest` names the one to serve; following
+parents from it gives the published lineage, newest first. Rolling back
+(resuming from an older checkpoint) publishes the next number with the
+older one as its parent, and the abandoned branch falls out of the
+lineage.
+
+publish() has the writer fill a temp directory, then, holding an
+exclusive flock on `.lock`, renames it into place, points `latest` at it
+(written to a temp file and renamed, so readers never see a partial name)
+and prunes everything but the newest `keep` of the lineage. Readers hold a
+shared lock while they resolve and load checkpoints, so nothing they
+picked is pruned halfway through a load. The lock is only taken for the
+rename and for loads, never while the trainer is writing.
+"""
+
+import os
+import re
+import fcntl
+import shutil
+from contextlib import contextmanager
+
+NAME = re.compile(r"gen-(\d{6})$")
+
+def checkpoints(checkpoint_dir):
+    """Complete checkpoint paths, in publish order"""
+    try:
+        names = os.listdir(checkpoint_dir)
+    except OSError:
+        return []
+    return [os.path.join(checkpoint_dir, n) for n in sorted(names) if NAME.match(n)]
+
+def read_name(path):
+    try:
+        with open(path) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def latest_checkpoint(checkpoint_dir):
+    """Path of the checkpoint `latest` points at, or None"""
+    name = read_name(os.path.join(checkpoint_dir, "latest"))
+    path = name and os.path.join(checkpoint_dir, name)
+    return path if path and os.path.isdir(path) else None
+
+def lineage(checkpoint_dir, start=None):
+    """Paths from `start` (default: latest) back through its parents still on disk, newest first"""
+    path = start or latest_checkpoint(checkpoint_dir)
+    chain = []
+    while path and os.path.isdir(path) and path not in chain:
+        chain.append(path)
+        parent = read_name(os.path.join(path, "parent"))
+        path = parent and os.path.join(checkpoint_dir, parent)
+    return chain
+
+@contextmanager
+def checkpoint_lock(checkpoint_dir, shared=False):
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    with open(os.path.join(checkpoint_dir, ".lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def publish(checkpoint_dir, write, parent=None, keep=2):
+    """
+    Write a checkpoint with write(tmp_dir) as the child of `parent` (a
+    checkpoint path or None), make it the latest and keep the newest `keep`
+    of its lineage; returns its path.
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    tmp = os.path.join(checkpoint_dir, f"publish-{os.getpid()}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    write(tmp)
+    if parent:
+        with open(os.path.join(tmp, "parent"), "w") as f:
+            f.write(os.path.basename(os.path.normpath(parent)))
+    with checkpoint_lock(checkpoint_dir):
+        # The newest checkpoint is never pruned, so the next number is always unused
+        existing = [int(NAME.match(os.path.basename(p)).group(1)) for p in checkpoints(checkpoint_dir)]
+        name = f"gen-{max(existing, default=-1) + 1:06d}"
+        path = os.path.join(checkpoint_dir, name)
+        os.replace(tmp, path)
+        pointer = os.path.join(checkpoint_dir, "latest")
+        with open(pointer + ".tmp", "w") as f:
+            f.write(name)
+        os.replace(pointer + ".tmp", pointer)
+        kept = set(lineage(checkpoint_dir, path)[:keep])
+        for old in checkpoints(checkpoint_dir):
+            if old not in kept:
+                shutil.rmtree(old, ignore_errors=True)
+    return path
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+CPU inference for the tune scripts: quantized weights and thread tuning.
+
+- "int8": dynamic quantization of the Linear layers (int8 weights,
+  activations quantized per call), the fastest on most x86 CPUs.
+- "int4": weight-only int4 in groups of 64 along the input dimension, half
+  the weight memory of int8. Uses torch's packed int4 CPU matmul when this
+  build has it, otherwise dequantizes each layer's weights per call, which
+  is slower but still small in memory.
+- "fp32": unquantized, the reference.
+
+The model is read from its float16 safetensors (the directory itself, or
+loader.py's fp16 cache) through the memory-mapped path, and each Linear is
+upcast and quantized one at a time, so no float32 copy of the whole model
+is ever written to disk or held in memory; only what stays unquantized is
+upcast. lm_head and the embeddings stay in float32; they matter most for
+the output distribution. Threads default to the number of physical cores with
+a single inter-op thread, since generate() is one stream of ops and
+hyperthreads mostly contend for the same vector units.
+"""
+
+import os
+import warnings
+import torch
+import torch.nn.functional as F
+
+from src.tune.loader import load_model
+
+QUANT_MODES = ("int8", "int4", "fp32")
+SKIP = ("lm_head",)
+
+def physical_cores():
+    cores = set()
+    try:
+        with open("/proc/cpuinfo") as f:
+            physical = None
+            for line in f:
+                key, _, value = line.partition(":")
+                key = key.strip()
+                if key == "physical id":
+                    physical = value.strip()
+                elif key == "core id":
+                    cores.add((physical, value.strip()))
+    except OSError:
+        pass
+    available = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    return min(len(cores), available) if cores else available
+
+def tune_threads(threads=None):
+    threads = threads or physical_cores()
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # Only settable before the first parallel op
+    return threads
+
+def linear_layers(model, skip=SKIP):
+    return [(name, m) for name, m in model.named_modules()
+            if isinstance(m, torch.nn.Linear) and name.split(".")[-1] not in skip]
+
+def replace_module(model, name, module):
+    parent_name, _, child = name.rpartition(".")
+    parent = model.get_submodule(parent_name) if parent_name else model
+    setattr(parent, child, module)
+
+def as_float32(t):
+    return None if t is None else torch.nn.Parameter(t.detach().float(), requires_grad=False)
+
+def upcast(model):
+    """Float32 copies of every floating point parameter and buffer still in another float dtype, tied ones once"""
+    done = {}
+    for module in model.modules():
+        if isinstance(module, Int4Linear):
+            continue  # fp16 scales and zeros are part of its format
+        for store in (module._parameters, module._buffers):
+            for key, t in store.items():
+                if t is None or not t.is_floating_point() or t.dtype == torch.float32:
+                    continue
+                if id(t) not in done:
+                    done[id(t)] = as_float32(t) if isinstance(t, torch.nn.Parameter) else t.float()
+                store[key] = done[id(t)]
+    return model
+
+def quantize_int8(model, skip=SKIP):
+    # One layer at a time: upcast its weights, quantize, drop the float copy
+    qconfig = torch.ao.quantization.default_dynamic_qconfig
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)  # torch.ao.quantization is moving to torchao
+        for name, linear in linear_layers(model, skip):
+            fp32 = torch.nn.Linear(linear.in_features, linear.out_features, bias=linear.bias is not None,
+                                   device="meta")
+            fp32.weight, fp32.bias = as_float32(linear.weight), as_float32(linear.bias)
+            fp32.qconfig = qconfig
+            replace_module(model, name, torch.ao.nn.quantized.dynamic.Linear.from_float(fp32))
+    return model
+
+class Int4Linear(torch.nn.Module):
+    """
+    Weight-only int4 stand-in for nn.Linear. Each group of `group_size`
+    input weights gets its own scale and zero point; the values are stored
+    two per byte and dequantize as (q - 8) * scale + zero.
+    """
+
+    def __init__(self, linear, group_size=64):
+        super().__init__()
+        w = linear.weight.detach().float()
+        self.out_features, self.in_features = w.shape
+        self.group_size = group_size
+        groups = w.view(self.out_features, -1, group_size)
+        lo, hi = groups.amin(-1), groups.amax(-1)
+        scale = (hi - lo).clamp(min=1e-6) / 15
+        zero = lo + 8 * scale
+        q = ((groups - lo.unsqueeze(-1)) / scale.unsqueeze(-1)).round().clamp(0, 15).to(torch.uint8)
+        q = q.view(self.out_features, self.in_features)
+        self.bias = as_float32(linear.bias)
+        self.register_buffer("scale", scale.to(torch.float16))
+        self.register_buffer("zero", zero.to(torch.float16))
+        self.fast = self.pack_fast(q)
+        if self.fast is None:
+            self.register_buffer("packed", q[:, 0::2] | (q[:, 1::2] << 4))
+
+    def pack_fast(self, q):
+        # torch's packed int4 kernel; kept only if it matches the reference on a probe input
+        if not hasattr(torch.ops.aten, "_weight_int4pack_mm_for_cpu"):
+            return None
+        try:
+            weight = torch.ops.aten._convert_weight_to_int4pack_for_cpu(q.to(torch.int32), 1)
+            scales_and_zeros = torch.stack((self.scale, self.zero), -1).transpose(0, 1).contiguous().to(torch.bfloat16)
+            probe = torch.randn(2, self.in_features)
+            got = torch.ops.aten._weight_int4pack_mm_for_cpu(probe.to(torch.bfloat16), weight, self.group_size,
+                                                             scales_and_zeros).float()
+            want = probe @ self.dequantize(q).t()
+        except RuntimeError:
+            return None
+        if (got - want).abs().max() > 2e-2 * want.abs().max().clamp(min=1.0):
+            return None
+        return weight, scales_and_zeros
+
+    def dequantize(self, q=None):
+        if q is None:
+            q = torch.stack((self.packed & 0xF, self.packed >> 4), -1).view(self.out_features, self.in_features)
+        groups = q.view(self.out_features, -1, self.group_size).float() - 8
+        w = groups * self.scale.float().unsqueeze(-1) + self.zero.float().unsqueeze(-1)
+        return w.view(self.out_features, self.in_features)
+
+    def forward(self, x):
+        if self.fast is not None:
+            weight, scales_and_zeros = self.fast
+            flat = x.reshape(-1, self.in_features).to(torch.bfloat16)
+            out = torch.ops.aten._weight_int4pack_mm_for_cpu(flat, weight, self.group_size, scales_and_zeros)
+            out = out.to(x.dtype).view(*x.shape[:-1], self.out_features)
+            return out + self.bias if self.bias is not None else out
+        return F.linear(x, self.dequantize().to(x.dtype), self.bias)
+
+def quantize_int4(model, group_size=64, skip=SKIP):
+    for name, linear in linear_layers(model, skip):
+        if linear.in_features % group_size == 0:
+            replace_module(model, name, Int4Linear(linear, group_size))
+    return model
+
+def model_bytes(model):
+    """Bytes of weights held by the model, counting int8 and int4 packed weights at their real size"""
+    size = lambda t: t.numel() * t.element_size()
+    total = sum(size(p) for p in model.parameters()) + sum(size(b) for b in model.buffers())
+    for m in model.modules():
+        if isinstance(m, Int4Linear) and m.fast is not None:
+            total += sum(size(t) for t in m.fast)
+        elif isinstance(m, torch.ao.nn.quantized.dynamic.Linear):
+            weight, bias = m._weight_bias()
+            total += weight.numel() + (size(bias) if bias is not None else 0)
+    return total
+
+def load_cpu_model(model_dir, quant="int8", threads=None, **load_kwargs):
+    """(model, tokenizer) in eval mode with `quant` weights on CPU"""
+    if quant not in QUANT_MODES:
+        raise ValueError(f"quant must be one of {', '.join(QUANT_MODES)}, not {quant!r}")
+    threads = tune_threads(threads)
+    # The fp16 weights, mapped rather than read; whatever isn't quantized is upcast afterwards
+    model, tok = load_model(model_dir, torch.float16, "cpu", **load_kwargs)
+    model.eval()
+    if quant == "int8":
+        model = quantize_int8(model)
+    elif quant == "int4":
+        model = quantize_int4(model)
+    upcast(model)
+    print(f"CPU inference: {quant} weights ({model_bytes(model) / 1e6:.0f} MB), {threads} threads")
+    return model, tok
+
+def chat_inputs(tok, prompt):
+    # input_ids and attention_mask of one user message; return_dict is what newer transformers default to
+    msgs = [{"role": "user", "content": prompt}]
+    return tok.apply_chat_template(msgs, add_generation_prompt=True, return_tensors="pt", return_dict=True)
+
+@torch.inference_mode()
+def chat_generate(model, tok, prompt, device="cpu", **generate_kwargs):
+    """The model's reply to one user message, as 3_infer.py's generate() does it; returns (text, new tokens)"""
+    inputs = chat_inputs(tok, prompt).to(device)
+    kwargs = dict(pad_token_id=tok.pad_token_id, eos_token_id=tok.eos_token_id)
+    kwargs.update(generate_kwargs)
+    out = model.generate(**inputs, **kwargs)
+    return tok.batch_decode(out, skip_special_tokens=True)[0], out[0, inputs["input_ids"].shape[1]:]
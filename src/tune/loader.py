@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Shared model loading for the tune scripts.
+
+The first load of a (model, dtype) pair converts it once into a local
+safetensors cache of that dtype, tokenizer included, under data/model_cache/.
+A local model directory that is already safetensors in the requested
+dtype is used as is, and a cache made from one is rebuilt when the
+directory changes.
+
+Loads then build the model skeleton on the meta device (no allocation, no
+random init), rebuild the few non-persistent buffers the files don't hold,
+and assign each one a view into a
+memory-mapped copy-on-write mapping of the cached files. Nothing is
+deserialized or copied: pages are read from disk the first time a weight
+is used, and processes loading the same cache share them through the page
+cache. Moving the model to a GPU copies straight out of the mapping.
+"""
+
+import os
+import json
+import hashlib
+import time
+import shutil
+import struct
+import resource
+from pathlib import Path
+import torch
+from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer, GenerationConfig
+
+MODEL_NAME = "microsoft/Phi-3-mini-4k-instruct"
+CACHE_DIR = Path(__file__).resolve().parent.parent.parent / "data" / "model_cache"
+
+# safetensors header dtype -> torch dtype
+DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8, "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+def dtype_name(dtype):
+    return str(dtype).split(".")[-1]
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def read_header(path):
+    with open(path, "rb") as f:
+        (size,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(size))
+    header.pop("__metadata__", None)
+    return 8 + size, header
+
+def stored_dtype(model_dir):
+    """The one floating point dtype of a directory's safetensors weights, or None"""
+    files = sorted(Path(model_dir).glob("*.safetensors"))
+    dtypes = {DTYPES[info["dtype"]] for f in files for info in read_header(f)[1].values()}
+    floats = {d for d in dtypes if d.is_floating_point}
+    return floats.pop() if len(floats) == 1 else None
+
+def mmap_tensors(path):
+    """{name: tensor} for a .safetensors file, every tensor a view of one copy-on-write mapping of it"""
+    data_start, header = read_header(path)
+    storage = torch.UntypedStorage.from_file(str(path), shared=False, nbytes=os.path.getsize(path))
+    tensors = {}
+    for name, info in header.items():
+        dtype = DTYPES[info["dtype"]]
+        begin, end = info["data_offsets"]
+        offset = data_start + begin
+        t = torch.empty(0, dtype=dtype)
+        itemsize = t.element_size()
+        if offset % itemsize == 0:
+            t.set_(storage, offset // itemsize, info["shape"])
+        else:
+            # Misaligned for its dtype (not written by save_pretrained); copy just this one
+            raw = torch.empty(0, dtype=torch.uint8).set_(storage, offset, (end - begin,))
+            t = raw.clone().view(dtype).reshape(info["shape"])
+        tensors[name] = t
+    return tensors
+
+def restore_buffers(model):
+    # Non-persistent buffers like rotary inv_freq aren't in the weights files, so the modules holding
+    # them (small, parameterless ones) are built again for real from the config
+    for name, module in model.named_modules():
+        meta = [k for k, b in module.named_buffers(recurse=False) if b.is_meta]
+        if not meta:
+            continue
+        try:
+            fresh = type(module)(model.config)
+        except TypeError as e:
+            raise ValueError(f"Can't rebuild buffers {', '.join(meta)} of {name or type(model).__name__}: {e}")
+        for key in meta:
+            module.register_buffer(key, getattr(fresh, key), persistent=False)
+
+def source_mtime(name):
+    path = Path(name)
+    if not path.is_dir():
+        return None
+    return max(f.stat().st_mtime_ns for f in path.iterdir())
+
+def cache_path(name, dtype, cache_dir=CACHE_DIR):
+    if Path(name).is_dir():
+        # Directory name plus a hash of its full path, so same-named directories get their own caches
+        resolved = Path(name).resolve()
+        key = f"{resolved.name}-{hashlib.sha256(str(resolved).encode()).hexdigest()[:8]}"
+    else:
+        key = name.replace("/", "--")
+    return Path(cache_dir) / f"{key}-{dtype_name(dtype)}"
+
+def ensure_cache(name, dtype, cache_dir=CACHE_DIR):
+    """Path of the safetensors cache for (name, dtype), converting it first if missing or stale"""
+    path = cache_path(name, dtype, cache_dir)
+    source = {"name": str(name), "mtime": source_mtime(name)}
+    try:
+        with open(path / "source.json") as f:
+            if json.load(f) == source:
+                return path
+    except (OSError, ValueError):
+        pass
+    print(f"Converting {name} to a {dtype_name(dtype)} safetensors cache at {path} (one-time)...")
+    start = time.perf_counter()
+    tmp = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    model = AutoModelForCausalLM.from_pretrained(name, torch_dtype=dtype, low_cpu_mem_usage=True)
+    model.save_pretrained(tmp, safe_serialization=True)
+    del model
+    try:
+        AutoTokenizer.from_pretrained(name).save_pretrained(tmp)
+    except (OSError, ValueError) as e:
+        print(f"No tokenizer cached for {name}: {e}")
+    with open(tmp / "source.json", "w") as f:
+        json.dump(source, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    print(f"Converted in {time.perf_counter() - start:.1f}s")
+    return path
+
+def load_dir(path, dtype):
+    """A model from a directory of `dtype` safetensors weights, its parameters mapped rather than read"""
+    config = AutoConfig.from_pretrained(path)
+    # A skeleton on the meta device: nothing allocated or initialised. torch.device is a thread-local
+    # mode, so modules other threads build meanwhile are unaffected.
+    with torch.device("meta"):
+        model = AutoModelForCausalLM.from_config(config, torch_dtype=dtype)
+    state = {}
+    for f in sorted(Path(path).glob("*.safetensors")):
+        state.update(mmap_tensors(f))
+    model.load_state_dict(state, strict=False, assign=True)
+    model.tie_weights()
+    restore_buffers(model)
+    missing = [n for n, p in model.named_parameters() if p.is_meta]
+    if missing:
+        raise ValueError(f"{path} has no weights for {', '.join(missing[:5])}{' ...' if len(missing) > 5 else ''}")
+    try:
+        model.generation_config = GenerationConfig.from_pretrained(path)
+    except OSError:
+        pass
+    return model
+
+def load_model(name=MODEL_NAME, dtype=torch.float16, device="cpu", cache_dir=CACHE_DIR):
+    """
+    (model, tokenizer) for a hub name or local directory in `dtype` on
+    `device`, loaded from the memory-mapped cache; prints load time and
+    peak RSS.
+    """
+    start = time.perf_counter()
+    path = Path(name)
+    if not (path.is_dir() and stored_dtype(path) == dtype):
+        path = ensure_cache(name, dtype, cache_dir)
+    model = load_dir(path, dtype)
+    if device != "cpu":
+        model = model.to(device)
+    tokenizer = AutoTokenizer.from_pretrained(path)
+    print(f"Loaded {name} ({dtype_name(dtype)}, {device}) from {path} in {time.perf_counter() - start:.2f}s, "
+          f"peak RSS {peak_rss_mb():.0f} MB")
+    return model, tokenizer
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Batched sampling for the online trainer: N completions of one prompt from a
+single tokenization and a single generate() call (sample_completions), or
+one completion each for a batch of prompts (sample_batch).
+
+The prompt (all but its last token) is run through the model once and its
+KV cache is repeated N times, so generate() only has to process the last
+prompt token per sample instead of the whole prompt N times over.
+sample_batch() does the same with whatever prefix its prompts share, e.g.
+one character draw rendered with a different style line per strategy.
+"""
+
+import time
+import torch
+
+def expand_cache(cache, n):
+    # DynamicCache (transformers >= 4.36) repeats in place; older versions return tuples of (key, value)
+    if hasattr(cache, "batch_repeat_interleave"):
+        cache.batch_repeat_interleave(n)
+        return cache
+    return tuple((k.repeat_interleave(n, dim=0), v.repeat_interleave(n, dim=0)) for k, v in cache)
+
+def count_new_tokens(new_tokens, eos_token_id, pad_token_id):
+    # Tokens up to and including the first EOS in each row; the rest is padding
+    stop = {t for t in (eos_token_id, pad_token_id) if t is not None}
+    total = 0
+    for row in new_tokens.tolist():
+        for j, token in enumerate(row):
+            if token in stop:
+                total += j + 1 if token == eos_token_id else j
+                break
+        else:
+            total += len(row)
+    return total
+
+@torch.inference_mode()
+def sample_completions(model, tokenizer, prompt, n, device, reuse_prefix=True, max_length=512, **generate_kwargs):
+    """
+    Returns ([n completions], stats). Completions are decoded from the
+    generated token offsets, not by stripping the prompt text back off.
+    """
+    start = time.perf_counter()
+    inputs = tokenizer(prompt, return_tensors="pt", truncation=True, max_length=max_length).to(device)
+    input_ids, attention_mask = inputs.input_ids, inputs.attention_mask
+    prompt_len = input_ids.shape[1]
+
+    kwargs = dict(generate_kwargs)
+    kwargs.setdefault("pad_token_id", tokenizer.pad_token_id if tokenizer.pad_token_id is not None
+                      else tokenizer.eos_token_id)
+    kwargs.setdefault("eos_token_id", tokenizer.eos_token_id)
+
+    if reuse_prefix and prompt_len > 1:
+        prefix = model(input_ids[:, :-1], attention_mask=attention_mask[:, :-1], use_cache=True)
+        outputs = model.generate(
+            input_ids.repeat(n, 1),
+            attention_mask=attention_mask.repeat(n, 1),
+            past_key_values=expand_cache(prefix.past_key_values, n),
+            num_return_sequences=1,
+            **kwargs
+        )
+    else:
+        outputs = model.generate(input_ids, attention_mask=attention_mask, num_return_sequences=n, **kwargs)
+
+    new_tokens = outputs[:, prompt_len:]
+    completions = [t.strip() for t in tokenizer.batch_decode(new_tokens, skip_special_tokens=True)]
+    elapsed = time.perf_counter() - start
+    tokens = count_new_tokens(new_tokens, kwargs["eos_token_id"], kwargs["pad_token_id"])
+    return completions, {"samples": n, "prompt_tokens": prompt_len, "new_tokens": tokens,
+                         "seconds": elapsed, "tokens_per_sec": tokens / elapsed if elapsed else 0.0}
+
+def select_cache(cache, index):
+    # Rows of a KV cache by index (repeats allowed), DynamicCache or the older tuple format
+    if hasattr(cache, "batch_select_indices"):
+        cache.batch_select_indices(index)
+        return cache
+    return tuple((k.index_select(0, index), v.index_select(0, index)) for k, v in cache)
+
+def common_prefix_len(rows):
+    n = min(len(r) for r in rows)
+    for j in range(n):
+        token = rows[0][j]
+        if any(r[j] != token for r in rows):
+            return j
+    return n
+
+@torch.inference_mode()
+def sample_batch(model, tokenizer, prompts, device, adapter_names=None, reuse_prefix=True, max_length=512,
+                 **generate_kwargs):
+    """
+    One completion per prompt from a single generate() call.
+    With a PeftModel, adapter_names gives each row's LoRA adapter, so rows for
+    different adapters share the forward passes; rows are grouped by adapter
+    for the call and returned in the original order.
+
+    The tokens every prompt starts with are run through the model once per
+    adapter and their KV cache shared by that adapter's rows; each row is
+    laid out as [shared prefix][left padding][rest of its prompt], so only
+    the rest is processed per row.
+    """
+    start = time.perf_counter()
+    order = list(range(len(prompts)))
+    if adapter_names is not None:
+        order.sort(key=lambda i: adapter_names[i])
+        generate_kwargs["adapter_names"] = [adapter_names[i] for i in order]
+
+    rows = tokenizer([prompts[i] for i in order], truncation=True, max_length=max_length).input_ids
+    # Leave every row at least one token past the prefix for generate() to process
+    prefix_len = max(min(common_prefix_len(rows), min(len(r) for r in rows) - 1), 0) if reuse_prefix else 0
+    pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+    width = max(len(r) for r in rows)
+    input_ids = torch.full((len(rows), width), pad_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(rows), width), dtype=torch.long)
+    for row, ids in enumerate(rows):
+        # Padding goes after the shared prefix, so the prefix sits in the same positions in every row
+        rest = ids[prefix_len:]
+        input_ids[row, :prefix_len] = torch.tensor(ids[:prefix_len], dtype=torch.long)
+        input_ids[row, width - len(rest):] = torch.tensor(rest, dtype=torch.long)
+        attention_mask[row, :prefix_len] = 1
+        attention_mask[row, width - len(rest):] = 1
+    input_ids, attention_mask = input_ids.to(device), attention_mask.to(device)
+
+    kwargs = dict(generate_kwargs)
+    kwargs.setdefault("pad_token_id", pad_id)
+    kwargs.setdefault("eos_token_id", tokenizer.eos_token_id)
+    if prefix_len > 0:
+        # One prefix row per adapter, each repeated for that adapter's rows
+        names = kwargs.get("adapter_names") or [None] * len(rows)
+        groups = list(dict.fromkeys(names))
+        prefix_kwargs = {"adapter_names": groups} if "adapter_names" in kwargs else {}
+        prefix = model(input_ids[:1, :prefix_len].repeat(len(groups), 1),
+                       attention_mask=attention_mask[:1, :prefix_len].repeat(len(groups), 1),
+                       use_cache=True, **prefix_kwargs)
+        index = torch.tensor([groups.index(name) for name in names], device=device)
+        kwargs["past_key_values"] = select_cache(prefix.past_key_values, index)
+    outputs = model.generate(input_ids, attention_mask=attention_mask, **kwargs)
+
+    new_tokens = outputs[:, width:]
+    decoded = [t.strip() for t in tokenizer.batch_decode(new_tokens, skip_special_tokens=True)]
+    completions = [None] * len(prompts)
+    for row, i in enumerate(order):
+        completions[i] = decoded[row]
+    elapsed = time.perf_counter() - start
+    tokens = count_new_tokens(new_tokens, kwargs["eos_token_id"], kwargs["pad_token_id"])
+    return completions, {"samples": len(prompts), "prompt_tokens": sum(len(r) for r in rows),
+                         "prefix_tokens": prefix_len, "new_tokens": tokens, "seconds": elapsed,
+                         "tokens_per_sec": tokens / elapsed if elapsed else 0.0}
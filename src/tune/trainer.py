@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Long-lived training state for the online loop.
+
+OnlineTrainer keeps one optimizer (and its moments) for the life of the
+process instead of rebuilding it every generation. Gradient checkpointing
+is switched on once; it only applies in train mode, so generation just
+needs model.eval() and use_cache=True on the call.
+
+Training data comes from new_engagements rows past a high-water mark:
+each generation reads only the posts that were engaged with since the last
+one, with their current counts from post_stats, and trains on the ones
+with net positive engagement in padded batches.
+
+save() publishes the model (just the adapter, for a PeftModel), optimizer
+state and counters as a new versioned checkpoint under checkpoint_dir
+(see checkpoints.py), as the child of the checkpoint it resumed from or
+last published, so a crash mid-save leaves the previous one intact and a
+generator process picks the new one up. The newest `keep` of that lineage
+are kept.
+"""
+
+import os
+import json
+import sqlite3
+import torch
+
+from src.tune.checkpoints import publish
+
+PREFIX = "You are @averagefrench.\n\n"
+
+def make_optimizer(model, lr):
+    params = [p for p in model.parameters() if p.requires_grad]
+    # 8-bit Adam keeps optimizer memory low; bitsandbytes only has GPU kernels
+    if params and params[0].is_cuda:
+        try:
+            import bitsandbytes as bnb
+            return bnb.optim.Adam8bit(params, lr=lr)
+        except ImportError:
+            pass
+    return torch.optim.AdamW(params, lr=lr)
+
+class OnlineTrainer:
+    def __init__(self, model, tokenizer, device, user="averagefrench", lr=1e-5, batch_size=4,
+                 max_length=128, epochs=2, max_examples=32, checkpoint_dir=None, keep=2, adapter=None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.user = user
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.epochs = epochs
+        self.max_examples = max_examples
+        self.checkpoint_dir = checkpoint_dir
+        self.keep = keep
+        # With several adapters loaded, only the one being trained is checkpointed
+        self.save_kwargs = {"selected_adapters": [adapter]} if adapter else {}
+        self.generation = 0
+        self.step = 0
+        self.last_engagement_id = 0
+        # The checkpoint these weights continue from; the next one published is its child
+        self.parent = None
+
+        model.gradient_checkpointing_enable()
+        model.config.use_cache = False
+        self.optimizer = make_optimizer(model, lr)
+
+    def fetch_examples(self, db_path):
+        """
+        [(text, likes + replies - clanks)] for our posts engaged with since
+        the last call, best first, positives only. Advances the high-water
+        mark.
+        """
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            last = conn.execute("SELECT COALESCE(MAX(id), 0) FROM new_engagements").fetchone()[0]
+            rows = conn.execute('''
+                SELECT p.text,
+                       COALESCE(s.like_count, 0) + COALESCE(s.reply_count, 0) - COALESCE(s.clanked_count, 0)
+                FROM posts p
+                LEFT JOIN post_stats s ON s.post_id = p.id
+                WHERE p.user_lc = ?
+                  AND p.id IN (SELECT post_id FROM new_engagements WHERE id > ? AND id <= ?)
+            ''', (self.user, self.last_engagement_id, last)).fetchall()
+        finally:
+            conn.close()
+        self.last_engagement_id = last
+        examples = sorted(((text, score) for text, score in rows if text and score > 0),
+                          key=lambda e: e[1], reverse=True)
+        return examples[:self.max_examples]
+
+    def batches(self, texts):
+        tokenizer = self.tokenizer
+        for i in range(0, len(texts), self.batch_size):
+            chunk = [PREFIX + t + tokenizer.eos_token for t in texts[i:i + self.batch_size]]
+            enc = tokenizer(chunk, return_tensors="pt", padding=True, truncation=True,
+                            max_length=self.max_length).to(self.device)
+            labels = enc.input_ids.masked_fill(enc.attention_mask == 0, -100)
+            yield enc.input_ids, enc.attention_mask, labels
+
+    def train(self, texts):
+        """A few epochs over the texts; returns the mean loss of the last epoch (None if every step was skipped)"""
+        model, opt = self.model, self.optimizer
+        model.train()
+        losses = []
+        try:
+            for _ in range(self.epochs):
+                losses = []
+                for input_ids, attention_mask, labels in self.batches(texts):
+                    opt.zero_grad(set_to_none=True)
+                    loss = model(input_ids, attention_mask=attention_mask, labels=labels).loss
+                    if torch.isnan(loss):
+                        print(f"NaN loss at step {self.step}, skipping...")
+                        continue
+                    loss.backward()
+                    # Gradient clipping to prevent explosion
+                    torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=1.0)
+                    opt.step()
+                    losses.append(loss.item())
+                    print(f"step {self.step} loss {losses[-1]:.4f}")
+                    self.step += 1
+        finally:
+            opt.zero_grad(set_to_none=True)
+            model.eval()
+        return sum(losses) / len(losses) if losses else None
+
+    def state(self):
+        return {"generation": self.generation, "step": self.step, "last_engagement_id": self.last_engagement_id}
+
+    def save(self):
+        """Publish the model, optimizer and counters as a new checkpoint; returns its path"""
+        def write(tmp):
+            self.model.save_pretrained(tmp, safe_serialization=True, **self.save_kwargs)
+            torch.save(self.optimizer.state_dict(), os.path.join(tmp, "optimizer.pt"))
+            with open(os.path.join(tmp, "trainer.json"), "w") as f:
+                json.dump(self.state(), f)
+        self.parent = publish(self.checkpoint_dir, write, self.parent, self.keep)
+        return self.parent
+
+    def resume(self, path):
+        """Restore optimizer state and counters from a checkpoint whose weights the model was loaded from"""
+        opt_path = os.path.join(path, "optimizer.pt")
+        if os.path.exists(opt_path):
+            self.optimizer.load_state_dict(torch.load(opt_path, map_location=self.device))
+        with open(os.path.join(path, "trainer.json")) as f:
+            state = json.load(f)
+        self.generation = state["generation"] + 1
+        self.step = state["step"]
+        self.last_engagement_id = state["last_engagement_id"]
+        self.parent = path